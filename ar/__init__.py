@@ -212,12 +212,13 @@ ArweaveTransactionException = ArweaveException
 
 from .peer import Peer
 from .wallet import Wallet
-from .transaction import Transaction
+from .transaction import Transaction, TxOracle, TxHeader
 from .block import Block
+from .block_index import BlockIndex
 from .chunk import Chunk
-from .stream import PeerStream, GatewayStream
+from .stream import PeerStream, GatewayStream, SubStream
 from .arweave_lib import arql
 from .manifest import Manifest
-from .bundle import Bundle, DataItem, ANS104BundleHeader, ANS104DataItemHeader
+from .bundle import Bundle, DataItem, ANS104BundleHeader, ANS104DataItemHeader, BundleIndex, LazyDataItem, BundleWriter, BulkSigner
 from .utils import transaction_uploader
 
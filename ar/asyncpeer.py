@@ -0,0 +1,555 @@
+
+from . import DEFAULT_API_URL, DEFAULT_REQUESTS_PER_MINUTE_LIMIT, logger, ArweaveException, ArweaveNetworkException
+from .peer import HTTPClient, binary_to_term, _decode_tags, _parse_data_sync_record, _data_sync_record_params, _chunk_headers, _parse_tx_offset
+
+import asyncio
+import json
+
+import aiohttp
+
+# asyncio counterparts of HTTPClient and Peer.
+# a single event loop can keep thousands of requests in flight to many peers,
+# where the blocking clients would need a thread per outstanding request.
+#
+#   async with AsyncPeer() as peer:
+#       chunks = await asyncio.gather(*[peer.chunk2(offset) for offset in offsets])
+
+class _Response:
+    '''The subset of requests.Response used when handling replies, over a fully read aiohttp reply.'''
+    def __init__(self, raw, content):
+        self.raw = raw
+        self.url = str(raw.url)
+        self.status_code = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+        self.content = content
+    @property
+    def text(self):
+        return self.content.decode(self.raw.get_encoding() if self.content else 'utf-8', errors='replace')
+    def json(self):
+        return json.loads(self.content)
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise aiohttp.ClientResponseError(
+                self.raw.request_info,
+                self.raw.history,
+                status = self.status_code,
+                message = self.reason,
+                headers = self.headers,
+            )
+
+class AsyncHTTPClient(HTTPClient):
+    # statuses retried with backoff before they reach the error handling, like urllib3's Retry in HTTPClient
+    RETRY_STATUSES = (500, 503, 504)
+
+    def __init__(self, api_url, timeout = None, retries = 10, outgoing_connections = 256, requests_per_period = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, period_sec = 60, extra_headers = {}, cert_fingerprint = None, limiter = None, coalesce_gets = False):
+        super().__init__(api_url, timeout, retries, outgoing_connections, requests_per_period, period_sec, extra_headers, cert_fingerprint, limiter = limiter, coalesce_gets = coalesce_gets)
+    def _init_session(self, outgoing_connections, retries, cert_fingerprint, resolved_ips):
+        # the session is bound to an event loop, so it is made on first use
+        self.session = None
+        self._session_loop = None
+        self.outgoing_connection_semaphore = asyncio.Semaphore(outgoing_connections)
+        assert cert_fingerprint is None or not self.api_url.startswith('http:')
+        if cert_fingerprint is not None:
+            self._ssl = aiohttp.Fingerprint(bytes.fromhex(cert_fingerprint.replace(':','')))
+        else:
+            self._ssl = True
+    def __del__(self):
+        pass
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self._session_loop = None
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *params):
+        await self.close()
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self.session is None or self._session_loop is not loop or self.session.closed:
+            # like the ip resolution in HTTPClient, the dns cache keeps
+            # lookups from happening per request
+            connector = aiohttp.TCPConnector(
+                limit = self.max_outgoing_connections,
+                ttl_dns_cache = 300,
+                ssl = self._ssl,
+            )
+            self.session = aiohttp.ClientSession(connector = connector)
+            self._session_loop = loop
+        return self.session
+
+    async def _ratelimit_prologue(self):
+        while True:
+            duration = self._ratelimit_acquire()
+            if duration is None:
+                return
+            if duration > 0:
+                logger.info(f'Sleeping for {int(duration*100)/100}s to respect ratelimit of {self.requests_per_period}req/{self.period_sec}s ...')
+            await asyncio.sleep(duration)
+
+    async def _request(self, *params, **request_kwparams):
+        key = self._coalesce_key(self._url(*params), request_kwparams)
+        if key is None:
+            return await self._request_uncoalesced(*params, **request_kwparams)
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._request_uncoalesced(*params, **request_kwparams))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda future: self._in_flight.pop(key, None))
+        # shielded so one waiter being cancelled does not cancel the others
+        return await asyncio.shield(in_flight)
+
+    async def _request_uncoalesced(self, *params, **request_kwparams):
+        url = self._url(*params)
+
+        headers = {**self.extra_headers, **request_kwparams.pop('headers', {})}
+        method = request_kwparams.pop('method')
+        # replies are always read in full
+        request_kwparams.pop('stream', None)
+        if self.timeout is not None:
+            request_kwparams.setdefault('timeout', aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout))
+
+        session = self._get_session()
+        retries = 0
+        while True:
+            await self._ratelimit_prologue()
+            response = None
+            try:
+                if self.outgoing_connection_semaphore.locked():
+                    self.on_too_many_connections()
+                    logger.info(f'Waiting for connection count limit semaphore to drain...')
+                try:
+                    async with self.outgoing_connection_semaphore:
+                        async with session.request(method, url, headers=headers, **request_kwparams) as raw:
+                            response = _Response(raw, await raw.read())
+                    if response.status_code in self.RETRY_STATUSES and retries < self.retries:
+                        raise aiohttp.ServerConnectionError(response.status_code)
+                except (aiohttp.ServerConnectionError, aiohttp.ClientConnectorError):
+                    if retries >= self.retries:
+                        raise
+                    await asyncio.sleep(0.1 * 2 ** retries)
+                    retries += 1
+                    self._ratelimit_epilogue(True)
+                    continue
+
+                self._check_response(response, url)
+                self._ratelimit_epilogue(True)
+                return response
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                text = '' if response is None else response.text
+                status_code = 0 if response is None else response.status_code
+                logger.info(f'exception of type {type(exc)} args={[type(a) for a in exc.args]}')
+                action = self._classify_status(status_code)
+                if action == 'ratelimited':
+                    # too many requests
+                    self._ratelimit_epilogue(False)
+                    self.on_too_many_requests()
+                    continue
+                if type(exc) is aiohttp.ClientPayloadError:
+                    logger.info('{}\n{}\nretrying'.format(text, request_kwparams), exc_info=True)
+                    self._ratelimit_epilogue(False)
+                    continue
+                if isinstance(exc, asyncio.TimeoutError) or status_code == 404:
+                    if status_code == 0:
+                        status_code = 598
+                    logger.info('{}\n{}'.format(text, request_kwparams), exc_info=True)
+                else:
+                    logger.error('{}\n{}'.format(text, request_kwparams), exc_info=True)
+                if action == 'retry':
+                    self._ratelimit_epilogue(True)
+                    continue
+                self.on_network_exception(text, status_code, exc, response)
+                raise ArweaveNetworkException(text or repr(type(exc)), status_code, exc, response)
+            except:
+                self._ratelimit_epilogue(True)
+                raise
+
+    async def _get(self, *params, **request_kwparams):
+        return await self._request(*params, **{'method': 'GET', **request_kwparams})
+
+    async def _get_json(self, *params, **request_kwparams):
+        response = await self._get(*params, **request_kwparams)
+        try:
+            return response.json()
+        except:
+            raise ArweaveException(response.text)
+
+    async def _post(self, data, *params, headers = {}, **request_kwparams):
+        headers = {**headers}
+
+        if type(data) is dict:
+            headers.setdefault('Content-Type', 'application/json')
+            data = json.dumps(data, separators=',:')
+        elif isinstance(data, (bytes, bytearray)):
+            headers.setdefault('Content-Type', 'application/octet-stream')
+        else:
+            headers.setdefault('Content-Type', 'text/plain')
+
+        return await self._request(*params, **{'method': 'POST', 'headers': headers, 'data': data, **request_kwparams})
+
+    async def _post_json(self, data, *params, **request_kwparams):
+        response = await self._post(data, *params, **request_kwparams)
+        try:
+            return response.json()
+        except json.decoder.JSONDecodeError:
+            raise ArweaveException(response.text)
+
+class AsyncPeer(AsyncHTTPClient):
+    '''
+    The asyncio version of Peer. Every api method is a coroutine with the same
+    parameters and return value as the Peer method of the same name.
+    '''
+    def __init__(self, api_url = DEFAULT_API_URL, timeout = None, retries = 5, outgoing_connections = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, requests_per_period = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, period_sec = 60, incoming_port = None, limiter = None, coalesce_gets = False):
+        super().__init__(
+            api_url, timeout, retries, outgoing_connections, requests_per_period, period_sec,
+            extra_headers = {'X-P2p-Port':str(incoming_port)} if incoming_port is not None else {},
+            limiter = limiter,
+            coalesce_gets = coalesce_gets,
+        )
+
+    async def info(self):
+        '''Get the current network information.'''
+        return await self._get_json('info')
+
+    async def time(self):
+        '''Return the current universal time in seconds.'''
+        response = await self._get('time')
+        return int(response.text)
+
+    async def tx_pending(self):
+        '''Return all mempool transactions.'''
+        return await self._get_json('tx/pending')
+
+    async def queue(self):
+        '''Return outgoing transaction priority queue.'''
+        return await self._get_json('queue')
+
+    async def tx_status(self, hash):
+        '''Return additional information about the transaction with the given identifier (hash).'''
+        return await self._get_json('tx', hash, 'status')
+
+    async def tx(self, txid):
+        '''Return a JSON-encoded transaction.'''
+        tx = await self._get_json('tx', txid)
+        _decode_tags(tx['tags'])
+        return tx
+
+    async def tx2(self, txid):
+        '''Return a binary-encoded transaction.'''
+        response = await self._get('tx2', txid)
+        return response.content
+
+    async def unconfirmed_tx(self, txid):
+        '''Return a possibly unconfirmed JSON-encoded transaction.'''
+        tx = await self._get_json('unconfirmed_tx', txid)
+        _decode_tags(tx['tags'])
+        return tx
+
+    async def unconfirmed_tx2(self, txid):
+        '''Return a possibly unconfirmed binary-encoded transaction.'''
+        response = await self._get('unconfirmed_tx2', txid)
+        return response.content
+
+    async def arql(self, logical_expression):
+        '''Return the transaction IDs of all txs where the tags match the logical expression.'''
+        return await self._post_json(logical_expression, 'arql')
+
+    async def tx_data_html(self, txid):
+        '''Return the data field of the transaction served as HTML.'''
+        response = await self._get('tx', txid, 'data.html')
+        return response.content
+
+    async def sync_buckets(self):
+        '''Return a compact but imprecise representation of the synced data.'''
+        response = await self._get('sync_buckets')
+        return binary_to_term(response.content)
+
+    async def data_sync_record(self, start = None, limit = None, format = 'etf'):
+        '''Return a high-to-low list of intervals of synced data ranges.'''
+        params, headers = _data_sync_record_params(start, limit, format)
+        response = await self._get(*params, headers=headers)
+        return _parse_data_sync_record(response, format)
+
+    async def chunk(self, offset, packing = 'unpacked', bucket_based_offset = False):
+        '''Returns the json data chunk containing 1-based offset.'''
+        headers = _chunk_headers(packing, bucket_based_offset)
+        return await self._get_json('chunk', str(offset), headers=headers)
+
+    async def chunk2(self, offset, packing = 'unpacked', bucket_based_offset = False):
+        '''Returns the binary data chunk containing 1-based offset.'''
+        headers = _chunk_headers(packing, bucket_based_offset)
+        response = await self._get('chunk2', str(offset), headers=headers)
+        return response.content
+
+    async def chunk_size(self, offset, packing = 'unpacked', bucket_based_offset = False):
+        '''Returns the size of the data chunk containing 1-based offset.'''
+        headers = _chunk_headers(packing, bucket_based_offset)
+        headers['Range'] = 'bytes=0-2'
+        response = await self._get('chunk2', str(offset), headers=headers)
+        return int.from_bytes(response.content[:3], 'big')
+
+    async def tx_offset(self, hash):
+        '''Get the absolute end offset and size of the transaction.'''
+        response = await self._get_json('tx', hash, 'offset')
+        return _parse_tx_offset(response)
+
+    async def send_chunk(self, json_data):
+        '''Upload a json data chunk.'''
+        response = await self._post(
+            json_data,
+            'chunk',
+            headers={
+                'arweave-data-root': json_data['data_root'],
+                'arweave-data-size': str(json_data['data_size'])
+            }
+        )
+        return response.text # OK
+
+    async def block_announcement(self, block_announcement):
+        '''Accept an announcement of a block. Returns optional missing transactions and chunk.'''
+        return await self._post_json(block_announcement, 'block_announcement')
+
+    async def send_block(self, block, arweave_recall_byte : int = None):
+        '''Accept a JSON-encoded block with Base64Url encoded fields.'''
+        headers = {}
+        if arweave_recall_byte is not None:
+            headers['arweave-recall-byte'] = str(arweave_recall_byte)
+        response = await self._post(block, 'block', headers=headers)
+        return response.text # OK
+
+    async def send_block2(self, block, arweave_recall_byte : int = None):
+        '''Accept a binary-encoded block.'''
+        headers = {}
+        if arweave_recall_byte is not None:
+            headers['arweave-recall-byte'] = str(arweave_recall_byte)
+        response = await self._post(block, 'block2', headers=headers)
+        return response.text # OK
+
+    async def wallet(self, secret):
+        '''Generate a wallet and receive a secret key identifying it.'''
+        return await self._post_json(secret, 'wallet')
+
+    async def send_tx(self, json_data):
+        '''Submit a new transaction to the network.'''
+        response = await self._post(json_data, 'tx')
+        return response.text # OK
+
+    async def send_tx2(self, binary_data):
+        '''Submit a new binary-encoded transaction to the network.'''
+        response = await self._post(binary_data, 'tx2')
+        return response.text # OK
+
+    async def unsigned_tx(self, secret):
+        '''Sign and send a tx to the network.'''
+        return await self._post_json(secret, 'unsigned_tx')
+
+    async def peers(self):
+        '''Get the list of peers from the node.'''
+        return await self._get_json('peers')
+
+    async def price(self, bytes=0, target_address=None):
+        '''Return the estimated transaction fee not including a new wallet fee.'''
+        if target_address is not None:
+            response = await self._get('price', str(bytes), target_address)
+        else:
+            response = await self._get('price', str(bytes))
+        return response.text
+
+    async def hash_list(self, from_height = None, to_height = None, as_hash_list = True):
+        '''Return the current JSON-encoded hash list held by the node.'''
+        kwparams = {}
+        if as_hash_list:
+            kwparams['headers'] = {'x-block-format': '2'}
+        if from_height is not None or to_height is not None:
+            return await self._get_json('hash_list', str(from_height), str(to_height), **kwparams)
+        else:
+            return await self._get_json('hash_list', **kwparams)
+
+    async def block_index(self, from_height = None, to_height = None, as_hash_list = False):
+        '''Return the current JSON-encoded block index held by the node.'''
+        kwparams = {}
+        if as_hash_list:
+            kwparams['headers'] = {'x-block-format': '2'}
+        if from_height is not None or to_height is not None:
+            return await self._get_json('block_index', str(from_height), str(to_height), **kwparams)
+        else:
+            return await self._get_json('block_index', **kwparams)
+
+    async def block_index2(self):
+        '''Return the current binary-encoded block index held by the node.'''
+        response = await self._get('block_index2')
+        return response.content
+
+    async def recent_hash_list(self):
+        return await self._get_json('recent_hash_list')
+
+    async def recent_hash_list_diff(self, hash_list_binary):
+        '''Return the deviation of the node's hash list from the given one.'''
+        return await self._post_json(hash_list_binary, 'recent_hash_list_diff', method='GET')
+
+    async def wallet_list(self, encoded_root_hash = None, encoded_cursor = None, wallet_list_chunk_size = None):
+        '''Return the current wallet list held by the node, or a bunch of wallets from the given tree.'''
+        if wallet_list_chunk_size is not None:
+            wallet_list_chunk_size = f'?{wallet_list_chunk_size}'
+        else:
+            wallet_list_chunk_size = ''
+        if encoded_cursor is not None:
+            return await self._get_json('wallet_list', encoded_root_hash, encoded_cursor, wallet_list_chunk_size)
+        elif encoded_root_hash is not None:
+            return await self._get_json('wallet_list', encoded_root_hash, wallet_list_chunk_size)
+        else:
+            return await self._get_json('wallet_list')
+
+    async def wallet_list_balance(self, encoded_root_hash, encoded_addr):
+        '''Return the balance of the given address from the wallet tree with the given root hash.'''
+        response = await self._get('wallet_list', encoded_root_hash, encoded_addr, 'balance')
+        return int(response.text)
+
+    async def wallet_balance(self, wallet_address):
+        '''Return the balance of the wallet specified via wallet_address.'''
+        response = await self._get('wallet', wallet_address, 'balance')
+        return int(response.text)
+
+    async def wallet_last_tx(self, wallet_address):
+        '''Return the last outgoing transaction ID (hash) for the wallet.'''
+        response = await self._get('wallet', wallet_address, 'last_tx')
+        return response.text
+
+    async def tx_anchor(self):
+        '''Return a block anchor to use for building transactions.'''
+        response = await self._get('tx_anchor')
+        return response.text
+
+    async def wallet_txs(self, wallet_address, earliest_tx = None):
+        '''Return transaction identifiers (hashes) for the wallet specified via wallet_address.'''
+        if earliest_tx is not None:
+            return await self._get_json('wallet', wallet_address, 'txs', earliest_tx)
+        else:
+            return await self._get_json('wallet', wallet_address, 'txs')
+
+    async def wallet_deposits(self, wallet_address, earliest_deposit = None):
+        '''Return identifiers (hashes) of transfer transactions depositing to the given wallet_address.'''
+        if earliest_deposit is not None:
+            return await self._get_json('wallet', wallet_address, 'deposits', earliest_deposit)
+        else:
+            return await self._get_json('wallet', wallet_address, 'deposits')
+
+    async def block_hash(self, hash, field = None):
+        '''Return the JSON-encoded block or field of a block with the given hash.'''
+        if field is not None:
+            return await self._get_json('block/hash', hash, field)
+        else:
+            return await self._get_json('block/hash', hash)
+
+    async def block_height(self, height, field = None):
+        '''Return the JSON-encoded block or field of a block with the given height.'''
+        if field is not None:
+            return await self._get_json('block/height', str(height), field)
+        else:
+            return await self._get_json('block/height', str(height))
+
+    async def block2_hash(self, hash, encoded_transaction_indices = None):
+        '''Return the binary-encoded block with the given hash.'''
+        if encoded_transaction_indices is not None:
+            response = await self._post(encoded_transaction_indices, 'block2/hash', hash, method = 'GET')
+        else:
+            response = await self._get('block2/hash', hash)
+        return response.content
+
+    async def block2_height(self, height, encoded_transaction_indices = None):
+        '''Return the binary-encoded block with the given height.'''
+        if encoded_transaction_indices is not None:
+            response = await self._post(encoded_transaction_indices, 'block2/height', str(height), method = 'GET')
+        else:
+            response = await self._get('block2/height', str(height))
+        return response.content
+
+    async def block_current(self):
+        '''Return the current block.'''
+        return await self._get_json('block/current')
+
+    async def block(self, height_or_hash):
+        '''A convenience method that hands off to block_height or block_hash.'''
+        if type(height_or_hash) is int:
+            return await self.block_height(height_or_hash)
+        elif not height_or_hash:
+            return await self.block_current()
+        else:
+            return await self.block_hash(height_or_hash)
+
+    async def block2(self, height_or_hash):
+        '''A convenience method that hands off to block2_height or block2_hash.'''
+        if type(height_or_hash) is int:
+            return await self.block2_height(height_or_hash)
+        else:
+            return await self.block2_hash(height_or_hash)
+
+    async def tx_field(self, hash, field):
+        '''Return a given field of the transaction specified by the transaction ID (hash).'''
+        if field == 'data':
+            response = await self._get('tx', hash, 'data.')
+            return response.content
+        elif field == 'data_root':
+            response = await self._get('tx', hash, 'data_root')
+            return response.text
+        else:
+            response = await self._get_json('tx', hash, field)
+            if field == 'tags':
+                _decode_tags(response)
+            return response
+
+    async def tx_data(self, hash):
+        '''Return transaction data.'''
+        return await self.tx_field(hash, 'data')
+
+    async def tx_data_root(self, hash):
+        '''Return transaction data root.'''
+        return await self.tx_field(hash, 'data_root')
+
+    async def tx_tags(self, hash):
+        '''Return transaction tags.'''
+        return await self.tx_field(hash, 'tags')
+
+    async def height(self):
+        '''Return the current block height.'''
+        response = await self._get('height')
+        return int(response.text)
+
+    async def data(self, txid, ext = '', range = None):
+        '''Get the decoded data from a transaction.'''
+        if range is not None:
+            headers = {'Range':f'bytes={range[0]}-{range[1]}'}
+        else:
+            headers = {}
+        response = await self._get(txid + ext, headers = headers)
+        return response.content
+
+    # below are used with https://github.com/ar-io/arweave-gateway
+
+    async def graphql(self, query):
+        return await self._post_json({
+            'operationName': None,
+            'query': query,
+            'variables': {}
+        }, 'graphql')
+
+    async def health(self):
+        '''Returns information on the connected peers and database.'''
+        return await self._get_json('health')
+
+    # below are used with https://github.com/everFinance/arseeding
+
+    async def send_job_broadcast(self, txid):
+        '''Register a tx to be broadcast to all nodes.'''
+        response = await self._get('job', 'broadcast', txid, method='POST')
+        return response.text
+
+    async def send_job_sync(self, txid):
+        response = await self._get('job', 'sync', txid, method='POST')
+        return response.text
+
+    async def job(self, txid, type):
+        '''Get the status of a job.'''
+        return await self._get_json('job', txid, type)
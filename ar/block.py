@@ -5,17 +5,20 @@ from ar.utils import (
     erlintdec, arbindec, arintdec,
     int_if_not_none,
     b64enc_if_not_str, b64dec_if_not_bytes,
-    b64enc, b64dec, AutoRaw
+    b64enc, b64dec, b64_fields, b64_slots,
+    Cursor,
 )
 from ar.utils.deep_hash import deep_hash
+from ar.utils.merkle import MerkleBuilder, compute_chunk_tree_root
 from .chunk import Chunk
-from .transaction import Transaction
+from .transaction import Transaction, TxHeader
 from . import (
     FORK_1_6, FORK_1_8,
     FORK_2_0, FORK_2_4, FORK_2_5,
     FORK_2_6, FORK_2_7, FORK_2_8,
     FORK_2_9
 )
+from . import ArweaveException, DATA_CHUNK_SIZE
 from . import (
     ECDSA_PUB_KEY_SIZE, ECDSA_KEY_TYPE,
     RSA_KEY_TYPE,
@@ -40,7 +43,127 @@ from Crypto.Hash import SHA256, SHA384
 
 TIMESTAMP_FIELD_SIZE_LIMIT = 12
 
-class Block(AutoRaw):
+# The binary block layout. Each entry is (name, Cursor method or function,
+# *params); a dotted name is a field of poa, poa2 or nonce_limiter_info.
+
+def _read_rate(cursor):
+    return [cursor.arint(8), cursor.arint(8)]
+
+def _read_tags(cursor):
+    return cursor.bins(16, 16)[::-1]
+
+def _read_txs(cursor):
+    # either 32-byte txids or complete txs
+    return [
+        TxHeader.fromcursor(cursor)
+        for idx in range(cursor.erlint(16))
+    ][::-1]
+
+def _read_double_signing_proof(cursor):
+    flag = cursor.erlint(8)
+    if flag & 1 != flag:
+        raise ArweaveException('invalid double signing proof flag {}'.format(flag))
+    if not flag:
+        return None
+    return Block.DoubleSigningProof(**cursor.read_fields(DOUBLE_SIGNING_PROOF_FIELDS))
+
+BLOCK_FIELDS = (
+    ('indep_hash',                          'fixed', 48),
+    ('previous_block',                      'bin',    8),
+    ('timestamp',                           'arint',  8),
+    ('nonce',                               'bin',   16),
+    ('height',                              'arint',  8),
+    ('diff',                                'arint', 16),
+    ('cumulative_diff',                     'arint', 16),
+    ('last_retarget',                       'arint',  8),
+    ('hash',                                'bin',    8),
+    ('block_size',                          'arint', 16),
+    ('weave_size',                          'arint', 16),
+    ('reward_addr',                         'bin',    8),
+    ('tx_root',                             'bin',    8),
+    ('wallet_list',                         'bin',    8),
+    ('hash_list_merkle',                    'bin',    8),
+    ('reward_pool',                         'arint',  8),
+    ('packing_2_5_threshold',               'arint',  8),
+    ('strict_data_split_threshold',         'arint',  8),
+    ('usd_to_ar_rate',                      _read_rate),
+    ('scheduled_usd_to_ar_rate',            _read_rate),
+    ('poa.option',                          'arint',  8),
+    ('poa.chunk',                           'bin',   24),
+    ('poa.tx_path',                         'bin',   24),
+    ('poa.data_path',                       'bin',   24),
+    ('tags',                                _read_tags),
+    ('txs',                                 _read_txs),
+)
+
+# (first height, fields appended from that fork on)
+BLOCK_FORK_FIELDS = (
+    (FORK_2_6, (
+        ('hash_preimage',                   'bin',    8),
+        ('recall_byte',                     'arint', 16),
+        ('reward',                          'arint',  8),
+        ('signature',                       'bin',   16),
+        ('recall_byte2',                    'arint', 16),
+        ('previous_solution_hash',          'bin',    8),
+        ('partition_number',                'erlint', 256),
+        ('nonce_limiter_info.output',       'fixed', 32),
+        ('nonce_limiter_info.global_step_number', 'erlint', 64),
+        ('nonce_limiter_info.seed',         'fixed', 48),
+        ('nonce_limiter_info.next_seed',    'fixed', 48),
+        ('nonce_limiter_info.prev_output',  'bin',    8),
+        ('nonce_limiter_info.partition_upper_bound', 'erlint', 256),
+        ('nonce_limiter_info.next_partition_upper_bound', 'erlint', 256),
+        ('nonce_limiter_info.last_step_checkpoints', 'fixeds', 16, 32),
+        ('nonce_limiter_info.steps',        'fixeds', 16, 32),
+        ('poa2.chunk',                      'bin',   24),
+        ('reward_key',                      'bin',   16),
+        ('poa2.tx_path',                    'bin',   24),
+        ('poa2.data_path',                  'bin',   24),
+        ('price_per_gib_minute',            'arint',  8),
+        ('scheduled_price_per_gib_minute',  'arint',  8),
+        ('reward_history_hash',             'fixed', 32),
+        ('debt_supply',                     'arint',  8),
+        ('kryder_plus_rate_multiplier',     'erlint', 24),
+        ('kryder_plus_rate_multiplier_latch', 'erlint', 8),
+        ('denomination',                    'erlint', 24),
+        ('redenomination_height',           'arint',  8),
+        ('previous_cumulative_diff',        'arint', 16),
+        ('double_signing_proof',            _read_double_signing_proof),
+    )),
+    (FORK_2_7, (
+        ('merkle_rebase_support_threshold', 'arint', 16),
+        ('chunk_hash',                      'fixed', 32),
+        ('chunk2_hash',                     'bin',    8),
+        ('block_time_history_hash',         'fixed', 32),
+        ('nonce_limiter_info.vdf_difficulty', 'arint', 8),
+        ('nonce_limiter_info.next_vdf_difficulty', 'arint', 8),
+    )),
+    (FORK_2_8, (
+        ('packing_difficulty',              'erlint', 8),
+        ('unpacked_chunk_hash',             'bin',    8),
+        ('unpacked_chunk2_hash',            'bin',    8),
+        ('poa.unpacked_chunk',              'bin',   24),
+        ('poa2.unpacked_chunk',             'bin',   24),
+    )),
+    (FORK_2_9, (
+        ('replica_format',                  'erlint', 8),
+    )),
+)
+
+DOUBLE_SIGNING_PROOF_FIELDS = (
+    ('key',                                 'fixed', 512),
+    ('signature1',                          'fixed', 512),
+    ('cumulative_diff1',                    'arint', 16),
+    ('previous_cumulative_diff1',           'arint', 16),
+    ('preimage1',                           'fixed', 64),
+    ('signature2',                          'fixed', 512),
+    ('cumulative_diff2',                    'arint', 16),
+    ('previous_cumulative_diff2',           'arint', 16),
+    ('preimage2',                           'fixed', 64),
+)
+
+@b64_fields
+class Block:
     '''
         github.com/arweave
         apps/arweave/include/ar.hrl
@@ -334,6 +457,38 @@ class Block(AutoRaw):
 	next_vdf_difficulty
 }).
     '''
+    __slots__ = (
+        'timestamp', 'last_retarget', 'diff', 'height', 'txs',
+        'reward_addr_raw', 'tags', 'reward_pool', 'weave_size', 'block_size',
+        'cumulative_diff', 'poa', 'usd_to_ar_rate', 'scheduled_usd_to_ar_rate',
+        'packing_2_5_threshold', 'strict_data_split_threshold',
+        # 2.6
+        'recall_byte', 'reward', 'partition_number', 'nonce_limiter_info',
+        'poa2', 'recall_byte2', 'price_per_gib_minute',
+        'scheduled_price_per_gib_minute', 'debt_supply',
+        'kryder_plus_rate_multiplier', 'kryder_plus_rate_multiplier_latch',
+        'denomination', 'redenomination_height', 'double_signing_proof',
+        'previous_cumulative_diff',
+        # 2.7
+        'merkle_rebase_support_threshold',
+        # 2.8
+        'packing_difficulty',
+        # 2.9
+        'replica_format',
+        # each of these is also available as <name>_raw
+        *b64_slots(
+            'nonce', 'previous_block', 'hash', 'indep_hash', 'tx_root',
+            'hash_list_merkle', 'wallet_list',
+            # 2.6
+            'hash_preimage', 'previous_solution_hash', 'signature',
+            'reward_key', 'reward_history_hash',
+            # 2.7
+            'chunk_hash', 'chunk2_hash', 'block_time_history_hash',
+            # 2.8
+            'unpacked_chunk_hash', 'unpacked_chunk2_hash',
+        ),
+    )
+
     def __init__(
         self,
         nonce, previous_block, timestamp,
@@ -373,21 +528,21 @@ class Block(AutoRaw):
         replica_format = 0,
         # poa_cache, poa2_cache, receive_timestamp
     ):
-        self.nonce = b64enc_if_not_str(nonce)
-        self.previous_block = b64enc_if_not_str(previous_block)
+        self.nonce = nonce
+        self.previous_block = previous_block
         self.timestamp = int(timestamp)
         self.last_retarget = int(last_retarget)
         self.diff = int(diff)
         self.height = int(height)
-        self.hash = b64enc_if_not_str(hash)
-        self.indep_hash = b64enc_if_not_str(indep_hash)
-        if len(txs) and not isinstance(txs[0],Transaction):
+        self.hash = hash
+        self.indep_hash = indep_hash
+        if len(txs) and not isinstance(txs[0],(Transaction,TxHeader)):
             self.txs = [b64enc_if_not_str(tx) for tx in txs]
         else:
             self.txs = txs
-        self.tx_root = b64enc_if_not_str(tx_root)
-        self.hash_list_merkle = b64enc_if_not_str(hash_list_merkle)
-        self.wallet_list = b64enc_if_not_str(wallet_list)
+        self.tx_root = tx_root
+        self.hash_list_merkle = hash_list_merkle
+        self.wallet_list = wallet_list
         if reward_addr == 'unclaimed':
             self.reward_addr_raw = b''
         else:
@@ -412,10 +567,10 @@ class Block(AutoRaw):
 
         # 2.6
 
-        self.hash_preimage = b64enc_if_not_str(hash_preimage)
+        self.hash_preimage = hash_preimage
         self.recall_byte = int_if_not_none(recall_byte)
         self.reward = int_if_not_none(reward)
-        self.previous_solution_hash = b64enc_if_not_str(previous_solution_hash)
+        self.previous_solution_hash = previous_solution_hash
         self.partition_number = int_if_not_none(partition_number)
         if nonce_limiter_info is None:
             self.nonce_limiter_info = self.NonceLimiterInfo()
@@ -426,7 +581,7 @@ class Block(AutoRaw):
         else:
             self.poa2 = poa2
         self.recall_byte2 = int_if_not_none(recall_byte2)
-        self.signature = b64enc_if_not_str(signature)
+        self.signature = signature
         if type(reward_key) in [list, tuple]:
             assert len(reward_key) == 2
             self.reward_key_raw = b64dec_if_not_bytes(reward_key[1])
@@ -435,7 +590,7 @@ class Block(AutoRaw):
             self.reward_key_raw = b64dec_if_not_bytes(reward_key)
         self.price_per_gib_minute = int_if_not_none(price_per_gib_minute)
         self.scheduled_price_per_gib_minute = int_if_not_none(scheduled_price_per_gib_minute)
-        self.reward_history_hash = b64enc_if_not_str(reward_history_hash)
+        self.reward_history_hash = reward_history_hash
         self.debt_supply = int_if_not_none(debt_supply)
         self.kryder_plus_rate_multiplier = int_if_not_none(kryder_plus_rate_multiplier)
         self.kryder_plus_rate_multiplier_latch = int_if_not_none(kryder_plus_rate_multiplier_latch)
@@ -447,31 +602,39 @@ class Block(AutoRaw):
         # 2.7
         
         self.merkle_rebase_support_threshold = int_if_not_none(merkle_rebase_support_threshold)
-        self.chunk_hash = b64enc_if_not_str(chunk_hash)
-        self.chunk2_hash = b64enc_if_not_str(chunk2_hash)
-        self.block_time_history_hash = b64enc_if_not_str(block_time_history_hash)
+        self.chunk_hash = chunk_hash
+        self.chunk2_hash = chunk2_hash
+        self.block_time_history_hash = block_time_history_hash
         
         # 2.8
 
         self.packing_difficulty = int_if_not_none(packing_difficulty)
-        self.unpacked_chunk_hash = b64enc_if_not_str(unpacked_chunk_hash)
-        self.unpacked_chunk2_hash = b64enc_if_not_str(unpacked_chunk2_hash)
+        self.unpacked_chunk_hash = unpacked_chunk_hash
+        self.unpacked_chunk2_hash = unpacked_chunk2_hash
 
         # 2.9
         self.replica_format = int(replica_format) if replica_format else 0
 
-    class POA(AutoRaw):
+    @b64_fields
+    class POA:
+        __slots__ = ('option', *b64_slots('tx_path', 'data_path', 'chunk', 'unpacked_chunk'))
         def __init__(
             self, option = 1,
             tx_path = '', data_path = '',
             chunk = '', unpacked_chunk = '',
         ):
             self.option = int_if_not_none(option)
-            self.tx_path = b64enc_if_not_str(tx_path)
-            self.data_path = b64enc_if_not_str(data_path)
-            self.chunk = b64enc_if_not_str(chunk)
-            self.unpacked_chunk = b64enc_if_not_str(unpacked_chunk)
-    class NonceLimiterInfo(AutoRaw):
+            self.tx_path = tx_path
+            self.data_path = data_path
+            self.chunk = chunk
+            self.unpacked_chunk = unpacked_chunk
+    @b64_fields
+    class NonceLimiterInfo:
+        __slots__ = (
+            'partition_upper_bound', 'next_partition_upper_bound', 'global_step_number',
+            'vdf_difficulty', 'next_vdf_difficulty',
+            *b64_slots('output', 'prev_output', 'seed', 'next_seed', 'last_step_checkpoints', 'steps'),
+        )
         def __init__(
             self, output = '', prev_output = '', seed = '', next_seed = '',
             partition_upper_bound = 0, next_partition_upper_bound = 0,
@@ -480,27 +643,27 @@ class Block(AutoRaw):
             vdf_difficulty = INITIAL_VDF_DIFFICULTY,
             next_vdf_difficulty = INITIAL_VDF_DIFFICULTY,
         ):
-            self.output = b64enc_if_not_str(output)
-            self.prev_output = b64enc_if_not_str(prev_output)
-            self.seed = b64enc_if_not_str(seed)
-            self.next_seed = b64enc_if_not_str(next_seed)
+            self.output = output
+            self.prev_output = prev_output
+            self.seed = seed
+            self.next_seed = next_seed
             self.partition_upper_bound = int_if_not_none(partition_upper_bound)
             self.next_partition_upper_bound = int_if_not_none(next_partition_upper_bound)
             self.global_step_number = int_if_not_none(global_step_number)
-            if last_step_checkpoints and type(last_step_checkpoints[0]) is str:
-                self.last_step_checkpoints = last_step_checkpoints
-            else:
-                self.last_step_checkpoints_raw = last_step_checkpoints
-            if steps and type(steps[0]) is str:
-                self.steps = steps
-            else:
-                self.steps_raw = steps
+            self.last_step_checkpoints = last_step_checkpoints
+            self.steps = steps
 
             # 2.7
 
             self.vdf_difficulty = int_if_not_none(vdf_difficulty)
             self.next_vdf_difficulty = int_if_not_none(next_vdf_difficulty)
-    class DoubleSigningProof(list,AutoRaw):
+    @b64_fields
+    class DoubleSigningProof:
+        __slots__ = (
+            'cumulative_diff1', 'previous_cumulative_diff1',
+            'cumulative_diff2', 'previous_cumulative_diff2',
+            *b64_slots('key', 'signature1', 'preimage1', 'signature2', 'preimage2'),
+        )
         def __init__(
             self, key,
             signature1, cumulative_diff1,
@@ -508,22 +671,15 @@ class Block(AutoRaw):
             signature2, cumulative_diff2,
             previous_cumulative_diff2, preimage2,
         ):
-            self.key = b64enc_if_not_str(key)
-            self.signature1 = b64enc_if_not_str(signature1)
-            self.cumulative_diff1 = cumulative_diff1
-            self.previous_cumulative_diff1 = previous_cumulative_diff1
-            self.preimage1 = b64enc_if_not_str(preimage1)
-            self.signature2 = b64enc_if_not_str(signature2)
-            self.cumulative_diff2 = cumulative_diff2
-            self.previous_cumulative_diff2 = previous_cumulative_diff2
-            self.preimage2 = b64enc_if_not_str(preimage2)
-            super([
-                self.key,
-                self.signature1, self.cumulative_diff1,
-                self.previous_cumulative_diff1, self.preimage1,
-                self.signature2, self.cumulative_diff2,
-                self.previous_cumulative_diff2, self.preimage2,
-            ])
+            self.key = key
+            self.signature1 = signature1
+            self.cumulative_diff1 = int_if_not_none(cumulative_diff1)
+            self.previous_cumulative_diff1 = int_if_not_none(previous_cumulative_diff1)
+            self.preimage1 = preimage1
+            self.signature2 = signature2
+            self.cumulative_diff2 = int_if_not_none(cumulative_diff2)
+            self.previous_cumulative_diff2 = int_if_not_none(previous_cumulative_diff2)
+            self.preimage2 = preimage2
         def tobytes(self):
             stream = io.BytesIO()
             if self is None:
@@ -579,6 +735,8 @@ class Block(AutoRaw):
             dspkwparams = kwparams.get(param)
             if not dspkwparams:
                 kwparams[param] = None
+            else:
+                kwparams[param] = cls.DoubleSigningProof(**dspkwparams)
 
         # remove internal fields
         kwparams.pop('tx_tree', None)
@@ -587,134 +745,45 @@ class Block(AutoRaw):
 
     @classmethod
     def frombytes(cls, bytes):
-        stream = io.BytesIO(bytes)
-        block = cls.fromstream(stream)
-        assert stream.tell() == len(bytes)
+        cursor = Cursor(bytes)
+        block = cls.fromcursor(cursor)
+        assert cursor.remaining() == 0
         return block
 
     @classmethod
     def fromstream(cls, stream):
-        blk = cls(
-            indep_hash                   = stream.read(48),
-            previous_block               = arbindec(stream,  8),
-            timestamp                    = arintdec(stream,  8),
-            nonce                        = arbindec(stream, 16),
-            height                       = arintdec(stream,  8),
-            diff                         = arintdec(stream, 16),
-            cumulative_diff              = arintdec(stream, 16),
-            last_retarget                = arintdec(stream,  8),
-            hash                         = arbindec(stream,  8),
-            block_size                   = arintdec(stream, 16),
-            weave_size                   = arintdec(stream, 16),
-            reward_addr                  = arbindec(stream,  8),
-            tx_root                      = arbindec(stream,  8),
-            wallet_list                  = arbindec(stream,  8),
-            hash_list_merkle             = arbindec(stream,  8),
-            reward_pool                  = arintdec(stream,  8),
-            packing_2_5_threshold        = arintdec(stream,  8),
-            strict_data_split_threshold  = arintdec(stream,  8),
-            usd_to_ar_rate               =[arintdec(stream,  8),
-                                           arintdec(stream,  8)],
-            scheduled_usd_to_ar_rate     =[arintdec(stream,  8),
-                                           arintdec(stream,  8)],
-            poa = cls.POA(
-                option                   = arintdec(stream,  8),
-                chunk                    = arbindec(stream, 24),
-                tx_path                  = arbindec(stream, 24),
-                data_path                = arbindec(stream, 24),
-                unpacked_chunk           = None,
-            ),
-            tags = [
-                arbindec(stream, 16)
-                for idx in range(erlintdec(stream, 16))
-            ][::-1],
-            # either 32-byte txids or complete txs
-            txs = [
-                Transaction.fromstream(stream)
-                for idx in range(erlintdec(stream, 16))
-            ][::-1],
-        )
+        with Cursor.fromstream(stream) as cursor:
+            return cls.fromcursor(cursor)
 
-        if blk.height >= FORK_2_6:
-            blk.hash_preimage_raw          = arbindec(stream, 8)
-            blk.recall_byte                = arintdec(stream, 16)
-            blk.reward                     = arintdec(stream, 8)
-            blk.signature_raw              = arbindec(stream, 16)
-            blk.recall_byte2               = arintdec(stream, 16)
-            blk.previous_solution_hash_raw = arbindec(stream, 8)
-            blk.partition_number           = erlintdec(stream, 256)
-            blk.nonce_limiter_info = cls.NonceLimiterInfo(
-                output                     = stream.read(32),
-                global_step_number         = erlintdec(stream, 64),
-                seed                       = stream.read(48),
-                next_seed                  = stream.read(48),
-                prev_output                = arbindec(stream, 8),
-                partition_upper_bound      = erlintdec(stream, 256),
-                next_partition_upper_bound = erlintdec(stream, 256),
-                last_step_checkpoints      = [
-                    stream.read(32)
-                    for idx in range(erlintdec(stream,16))
-                ],
-                steps                      = [
-                    stream.read(32)
-                    for idx in range(erlintdec(stream,16))
-                ],
-                vdf_difficulty             = None,
-                next_vdf_difficulty        = None,
-            )
-            blk.poa2 = cls.POA(
-                option = 1,
-                tx_path = None,
-                data_path = None,
-                chunk            = arbindec(stream, 24),
-                unpacked_chunk = None,
-            )
-            blk.reward_key_raw             = arbindec(stream, 16)
-            blk.poa2.tx_path_raw           = arbindec(stream, 24)
-            blk.poa2.data_path_raw         = arbindec(stream, 24)
-            blk.price_per_gib_minute       = arintdec(stream, 8)
-            blk.scheduled_price_per_gib_minute = arintdec(stream, 8)
-            blk.reward_history_hash_raw    = stream.read(32)
-            blk.debt_supply                = arintdec(stream, 8)
-            blk.kryder_plus_rate_multiplier= erlintdec(stream, 24)
-            blk.kryder_plus_rate_multiplier_latch = erlintdec(stream, 8)
-            blk.denomination               = erlintdec(stream, 24)
-            blk.redenomination_height      = arintdec(stream, 8)
-            blk.previous_cumulative_diff   = arintdec(stream, 16)
-            double_signing_proof_flag  = erlintdec(stream, 8)
-            assert double_signing_proof_flag & 1 == double_signing_proof_flag
-            if double_signing_proof_flag:
-                blk.double_signing_proof = cls.DoubleSigningProof(
-                    key                       = stream.read(512),
-                    signature1                = stream.read(512),
-                    cumulative_diff1          = arintdec(stream, 16),
-                    previous_cumulative_diff1 = arintdec(stream, 16),
-                    preimage1                 = stream.read(64),
-                    signature2                = stream.read(512),
-                    cumulative_diff2          = arintdec(stream, 16),
-                    previous_cumulative_diff2 = arintdec(stream, 16),
-                    preimage2                 = stream.read(64),
-                )
-
-        if blk.height >= FORK_2_7:
-            blk.merkle_rebase_support_threshold        = arintdec(stream, 16)
-            blk.chunk_hash_raw                         = stream.read(32)
-            blk.chunk2_hash_raw                        = arbindec(stream, 8)
-            blk.block_time_history_hash_raw            = stream.read(32)
-            blk.nonce_limiter_info.vdf_difficulty      = arintdec(stream, 8)
-            blk.nonce_limiter_info.next_vdf_difficulty = arintdec(stream, 8)
-
-        if blk.height >= FORK_2_8:
-            blk.packing_difficulty       = erlintdec(stream, 8)
-            blk.unpacked_chunk_hash_raw  = arbindec(stream, 8)
-            blk.unpacked_chunk2_hash_raw = arbindec(stream, 8)
-            blk.poa.unpacked_chunk_raw   = arbindec(stream, 24)
-            blk.poa2.unpacked_chunk_raw  = arbindec(stream, 24)
-
-        if blk.height >= FORK_2_9:
-            blk.replica_format = erlintdec(stream, 8)
-
-        return blk
+    @classmethod
+    def fromcursor(cls, cursor):
+        values = cursor.read_fields(BLOCK_FIELDS)
+        height = values['height']
+        for fork, fields in BLOCK_FORK_FIELDS:
+            if height < fork:
+                break
+            cursor.read_fields(fields, values)
+
+        # fields that are absent before their fork
+        kwparams = {
+            'poa': {'unpacked_chunk': None},
+            'nonce_limiter_info': {'vdf_difficulty': None, 'next_vdf_difficulty': None},
+        }
+        if height >= FORK_2_6:
+            kwparams['poa2'] = {'unpacked_chunk': None}
+        for name, value in values.items():
+            name, dot, field = name.partition('.')
+            if dot:
+                kwparams[name][field] = value
+            else:
+                kwparams[name] = value
+        kwparams['poa'] = cls.POA(**kwparams['poa'])
+        if height >= FORK_2_6:
+            kwparams['poa2'] = cls.POA(**kwparams['poa2'])
+            kwparams['nonce_limiter_info'] = cls.NonceLimiterInfo(**kwparams['nonce_limiter_info'])
+        else:
+            del kwparams['nonce_limiter_info']
+        return cls(**kwparams)
 
     def tojson(self):
         json = {}
@@ -822,7 +891,7 @@ class Block(AutoRaw):
                 'height': self.height,
                 'hash': self.hash,
                 'indep_hash': self.indep_hash,
-                'txs': [tx.id if type(tx) is Transaction else tx for tx in self.txs],
+                'txs': [tx.id if isinstance(tx, (Transaction, TxHeader)) else tx for tx in self.txs],
                 'tx_root': self.tx_root,
                 'wallet_list': self.wallet_list,
                 'reward_addr': self.reward_addr,
@@ -839,7 +908,7 @@ class Block(AutoRaw):
                 'height': self.height,
                 'hash': self.hash,
                 'indep_hash': self.indep_hash,
-                'txs': [tx.id if type(tx) is Transaction else tx for tx in self.txs],
+                'txs': [tx.id if isinstance(tx, (Transaction, TxHeader)) else tx for tx in self.txs],
                 'tx_root': self.tx_root,
                 'tx_tree': [],
                 'wallet_list': self.wallet_list,
@@ -857,7 +926,7 @@ class Block(AutoRaw):
                 'height': self.height,
                 'hash': self.hash,
                 'indep_hash': self.indep_hash,
-                'txs': [tx.id if type(tx) is Transaction else tx for tx in self.txs],
+                'txs': [tx.id if isinstance(tx, (Transaction, TxHeader)) else tx for tx in self.txs],
                 'tx_root': self.tx_root,
                 'tx_tree': [],
                 'wallet_list': self.wallet_list,
@@ -875,7 +944,7 @@ class Block(AutoRaw):
                 'height': self.height,
                 'hash': self.hash,
                 'indep_hash': self.indep_hash,
-                'txs': [tx.id if type(tx) is Transaction else tx for tx in self.txs],
+                'txs': [tx.id if isinstance(tx, (Transaction, TxHeader)) else tx for tx in self.txs],
                 'tx_root': self.tx_root,
                 'tx_tree': [],
                 'wallet_list': self.wallet_list,
@@ -928,7 +997,7 @@ class Block(AutoRaw):
             stream.write(arbinenc(tag,                             16))
         stream.write(erlintenc(len(self.txs),                      16))
         for tx in self.txs[::-1]:
-            if type(tx) is Transaction:
+            if isinstance(tx, (Transaction, TxHeader)):
                 stream.write(tx.tobytes())
             else:
                 stream.write(arbinenc(b64dec(tx),                  24))
@@ -1039,6 +1108,81 @@ class Block(AutoRaw):
                 self._get_data_segment(),
                 self.hash_raw, self.nonce_raw,
             ])
+    # from ar_block.erl generate_size_tagged_list_from_txs
+    def size_tagged_txs(self):
+        '''
+        Return the ((txid, data_root_raw), end) pairs the tx_root is a merkle
+        tree of, with end the offset past the tx's data in the block. From
+        FORK_2_5, each tx's data is padded to a whole chunk by a
+        ((None, b''), end) entry. The txs are in the node's order, by format
+        and then id, not the block's.
+
+        The txs must be in full, not ids, as block2 sends them when asked
+        for every encoded_transaction_indices bit.
+        '''
+        padded = self.height >= FORK_2_5
+        txs = []
+        for tx in self.txs:
+            if type(tx) is str:
+                raise ArweaveException('block {} has only the id of tx {}'.format(self.height, tx))
+            if isinstance(tx, TxHeader):
+                txs.append((tx.format, tx.id_raw, tx.data_root_raw, tx.data_raw, tx.data_size))
+            else:
+                txs.append((tx.format, b64dec(tx.id), b64dec(tx.data_root), b64dec(tx.data), tx.data_size))
+        # the node sorts the tx records, which compare by format and then id
+        txs.sort(key = lambda tx: tx[:2])
+        size_tagged = []
+        end = 0
+        for format, txid, data_root, data, data_size in txs:
+            txid = b64enc(txid)
+            if format == 1:
+                # format 1 txs are rooted by their inline data
+                if len(data) != data_size:
+                    raise ArweaveException('block {} tx {} is missing its data'.format(self.height, txid))
+                data_root = compute_chunk_tree_root(data)
+            end += data_size
+            size_tagged.append(((txid, data_root), end))
+            if padded and data_size % DATA_CHUNK_SIZE:
+                end += DATA_CHUNK_SIZE - data_size % DATA_CHUNK_SIZE
+                size_tagged.append(((None, b''), end))
+        return size_tagged
+
+    def compute_tx_root_raw(self, size_tagged_txs = None):
+        if size_tagged_txs is None:
+            size_tagged_txs = self.size_tagged_txs()
+        if not size_tagged_txs:
+            return b''
+        builder = MerkleBuilder()
+        start = 0
+        for (txid, data_root), end in size_tagged_txs:
+            builder.add_chunk_hash(data_root, end - start)
+            start = end
+        return builder.root
+
+    def tx_offsets(self):
+        '''
+        Return a dict like Peer.tx_offset for each tx with data, in the
+        order the weave holds them, with its id and data_root added, so the block's data can be
+        read with PeerStream.from_tx_offset without asking after each tx.
+        The offsets are checked against tx_root.
+        '''
+        size_tagged = self.size_tagged_txs()
+        if self.compute_tx_root_raw(size_tagged) != self.tx_root_raw:
+            raise ArweaveException('block {} txs do not match its tx_root'.format(self.height))
+        block_start = self.weave_size - self.block_size
+        tx_offsets = []
+        start = 0
+        for (txid, data_root), end in size_tagged:
+            if txid is not None and end > start:
+                tx_offsets.append({
+                    'id': txid,
+                    'offset': block_start + end - 1,
+                    'size': end - start,
+                    'data_root': b64enc(data_root),
+                })
+            start = end
+        return tx_offsets
+
     def _get_signing_hash(self):
         ''' post 2.6 '''
         hash = SHA256.new(b''.join([
@@ -1067,7 +1211,7 @@ class Block(AutoRaw):
                 arbinenc(tag, 16) for tag in self.tags
             ]),
             erlintenc(len(self.txs), 16) + b''.join([
-                arbinenc(b64dec(tx.id if type(tx) is Transaction
+                arbinenc(b64dec(tx.id if isinstance(tx, (Transaction, TxHeader))
                                 else tx), 8) for tx in self.txs[::-1]
             ]),
 			arintenc(self.reward, 8),
@@ -1142,7 +1286,7 @@ class Block(AutoRaw):
                 self.previous_block_raw,
                 self.tx_root_raw,
                 [
-                    b64dec(tx.id if type(tx) is Transaction else tx)
+                    b64dec(tx.id if isinstance(tx, (Transaction, TxHeader)) else tx)
                     for tx in self.txs
                 ],
                 str(self.block_size).encode(),
@@ -1165,7 +1309,7 @@ class Block(AutoRaw):
             return deep_hash(props2)
         else:
             tx_list = [
-                    b64dec(tx.id if type(tx) is Transaction else tx)
+                    b64dec(tx.id if isinstance(tx, (Transaction, TxHeader)) else tx)
                     for tx in self.txs
             ]
             assert self.height >= FORK_2_0 # how is tx_root computed before 2.0
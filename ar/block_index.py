@@ -0,0 +1,288 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import array
+import bisect
+import mmap
+import os
+import threading
+
+from .block import Block
+from .utils import b64enc, b64dec_if_not_bytes, Cursor
+from . import ArweaveException, FORK_2_0
+
+INDEP_HASH_SIZE = 48
+TX_ROOT_SIZE = 32
+
+class BlockIndex:
+    '''
+    The indep_hash, weave_size and tx_root of every block, by height.
+
+    Each is a column of fixed-size entries: a bytearray of hashes, an
+    array('Q') of weave sizes and a bytearray of tx roots, so a height is an
+    index and the block holding a weave offset is a bisection of the weave
+    sizes. Blocks without a tx_root are stored as zeros and returned as b''.
+
+    With path, the columns are files in that directory, memory-mapped for
+    reading and appended to as the index grows, so a process can reopen the
+    index without fetching it again. The weave sizes are in native byte
+    order.
+
+        index = BlockIndex.frompeer(peer, path)
+        height, tx_root = index.find_offset(tx_offset['offset'])
+    '''
+    COLUMNS = (('indep_hash', INDEP_HASH_SIZE), ('weave_size', 8), ('tx_root', TX_ROOT_SIZE))
+
+    def __init__(self, path = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self._by_hash = None
+        self._files = None
+        self._maps = []
+        self._views = []
+        if path is None:
+            self._hashes = bytearray()
+            self._weave_sizes = array.array('Q')
+            self._tx_roots = bytearray()
+        else:
+            os.makedirs(path, exist_ok = True)
+            self._files = [
+                open(os.path.join(path, name), 'a+b')
+                for name, size in self.COLUMNS
+            ]
+            # drop a partly written last entry, as after a crash
+            count = min(
+                os.fstat(file.fileno()).st_size // size
+                for file, (name, size) in zip(self._files, self.COLUMNS)
+            )
+            for file, (name, size) in zip(self._files, self.COLUMNS):
+                file.truncate(count * size)
+            self._map()
+
+    @classmethod
+    def frompeer(cls, peer, path = None):
+        '''Open the index at path, loading it from peer's block_index2 if empty, and update it to peer's tip.'''
+        index = cls(path)
+        if not len(index):
+            index.load_binary(peer.block_index2())
+        index.update(peer)
+        return index
+
+    @classmethod
+    def frombinary(cls, data, path = None):
+        index = cls(path)
+        index.load_binary(data)
+        return index
+
+    @classmethod
+    def fromjson(cls, entries, path = None):
+        index = cls(path)
+        index.load_json(entries)
+        return index
+
+    def _map(self):
+        # views must be released before their maps can close
+        for view in self._views[::-1]:
+            view.release()
+        for mapping in self._maps:
+            mapping.close()
+        self._views = []
+        self._maps = []
+        columns = []
+        for file in self._files:
+            file.flush()
+            if os.fstat(file.fileno()).st_size:
+                mapping = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+                self._maps.append(mapping)
+                view = memoryview(mapping)
+            else:
+                view = memoryview(b'')
+            self._views.append(view)
+            columns.append(view)
+        weave_sizes = columns[1].cast('Q')
+        self._views.append(weave_sizes)
+        self._hashes, self._weave_sizes, self._tx_roots = columns[0], weave_sizes, columns[2]
+
+    def close(self):
+        if self._files is not None:
+            with self.lock:
+                for view in self._views[::-1]:
+                    view.release()
+                for mapping in self._maps:
+                    mapping.close()
+                for file in self._files:
+                    file.close()
+                self._files = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *params):
+        self.close()
+
+    # readers take the lock, as extending a file-backed index remaps it and
+    # releases the views they would read
+
+    def __len__(self):
+        with self.lock:
+            return len(self._weave_sizes)
+
+    @property
+    def height(self):
+        '''The height of the last block, or -1 when empty.'''
+        return len(self) - 1
+
+    def _check(self, height):
+        if not 0 <= height < len(self._weave_sizes):
+            raise IndexError(height)
+
+    def indep_hash_raw(self, height):
+        with self.lock:
+            self._check(height)
+            return bytes(self._hashes[height * INDEP_HASH_SIZE : (height + 1) * INDEP_HASH_SIZE])
+
+    def indep_hash(self, height):
+        return b64enc(self.indep_hash_raw(height))
+
+    def weave_size(self, height):
+        with self.lock:
+            self._check(height)
+            return self._weave_sizes[height]
+
+    def _tx_root_raw(self, height):
+        tx_root = bytes(self._tx_roots[height * TX_ROOT_SIZE : (height + 1) * TX_ROOT_SIZE])
+        if tx_root == bytes(TX_ROOT_SIZE):
+            return b''
+        return tx_root
+
+    def tx_root_raw(self, height):
+        with self.lock:
+            self._check(height)
+            return self._tx_root_raw(height)
+
+    def tx_root(self, height):
+        return b64enc(self.tx_root_raw(height))
+
+    def find_offset(self, offset):
+        '''
+        Return (height, tx_root) of the block holding the absolute weave
+        byte at offset, as given by tx_offset. Raises IndexError past the
+        last block.
+        '''
+        with self.lock:
+            # a block holds the bytes from the previous weave_size up to its own
+            height = bisect.bisect_right(self._weave_sizes, offset)
+            if height == len(self._weave_sizes):
+                raise IndexError(offset)
+            return height, b64enc(self._tx_root_raw(height))
+
+    def find_hash(self, indep_hash):
+        '''Return the height of the block with indep_hash, or None.'''
+        indep_hash = bytes(b64dec_if_not_bytes(indep_hash))
+        with self.lock:
+            if self._by_hash is None:
+                hashes = self._hashes
+                self._by_hash = {
+                    bytes(hashes[offset : offset + INDEP_HASH_SIZE]): height
+                    for height, offset in enumerate(range(0, len(hashes), INDEP_HASH_SIZE))
+                }
+            return self._by_hash.get(indep_hash)
+
+    def extend(self, entries):
+        '''
+        Append (indep_hash, weave_size, tx_root) entries, oldest first,
+        after the current tip.
+        '''
+        hashes = bytearray()
+        weave_sizes = array.array('Q')
+        tx_roots = bytearray()
+        for indep_hash, weave_size, tx_root in entries:
+            indep_hash = b64dec_if_not_bytes(indep_hash)
+            tx_root = b64dec_if_not_bytes(tx_root)
+            if len(indep_hash) != INDEP_HASH_SIZE or len(tx_root) not in (0, TX_ROOT_SIZE):
+                raise ArweaveException('unexpected block index entry sizes {} {}'.format(len(indep_hash), len(tx_root)))
+            hashes += indep_hash
+            weave_sizes.append(int(weave_size or 0))
+            tx_roots += tx_root or bytes(TX_ROOT_SIZE)
+        with self.lock:
+            if self._files is None:
+                self._hashes += hashes
+                self._weave_sizes.extend(weave_sizes)
+                self._tx_roots += tx_roots
+            else:
+                for file, column in zip(self._files, (hashes, weave_sizes, tx_roots)):
+                    file.write(column)
+                self._map()
+            if self._by_hash is not None:
+                height = len(self._weave_sizes) - len(weave_sizes)
+                for offset in range(0, len(hashes), INDEP_HASH_SIZE):
+                    self._by_hash[bytes(hashes[offset : offset + INDEP_HASH_SIZE])] = height
+                    height += 1
+
+    def truncate(self, height):
+        '''Drop the blocks from height on, as when the chain forks.'''
+        with self.lock:
+            height = max(0, min(height, len(self._weave_sizes)))
+            if self._files is None:
+                del self._hashes[height * INDEP_HASH_SIZE:]
+                del self._weave_sizes[height:]
+                del self._tx_roots[height * TX_ROOT_SIZE:]
+            else:
+                for file, (name, size) in zip(self._files, self.COLUMNS):
+                    file.truncate(height * size)
+                self._map()
+            self._by_hash = None
+
+    def load_binary(self, data):
+        '''Replace the index with a block_index2 reply.'''
+        cursor = Cursor(data)
+        entries = []
+        while cursor.remaining():
+            entries.append((cursor.bin(8), cursor.arint(16), cursor.bin(8)))
+        self._load(entries)
+
+    def load_json(self, entries):
+        '''Replace the index with a block_index reply, a list of dicts of hash, weave_size and tx_root.'''
+        self._load([
+            (entry['hash'], entry['weave_size'], entry['tx_root'])
+            for entry in entries
+        ])
+
+    def _load(self, entries):
+        # the node lists the newest block first; weave sizes only grow
+        if len(entries) > 1 and int(entries[0][1] or 0) > int(entries[-1][1] or 0):
+            entries.reverse()
+        self.truncate(0)
+        self.extend(entries)
+
+    def update(self, peer):
+        '''
+        Extend the index to peer's height block by block, verifying each
+        block's hash and its link to the previous one, and dropping tip
+        blocks that the peer's chain has replaced. Returns the new height.
+        '''
+        target = peer.height()
+        height = len(self)
+        while height <= target:
+            block = Block.frombytes(peer.block2_height(height))
+            if block.height >= FORK_2_0 and block.compute_indep_hash_raw() != block.indep_hash_raw:
+                raise ArweaveException('{}: block {} does not match its hash'.format(peer.api_url, height))
+            if height and block.previous_block_raw != self.indep_hash_raw(height - 1):
+                # the peer is on another fork; drop our tip and look again
+                height -= 1
+                self.truncate(height)
+                continue
+            self.extend([(block.indep_hash_raw, block.weave_size, block.tx_root_raw)])
+            height += 1
+        return self.height
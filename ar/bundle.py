@@ -1,16 +1,31 @@
+import array
+import collections
+import concurrent.futures
 import io
+import itertools
 import json
+import os
 import struct
+import sys
+import tempfile
 import warnings
 
 from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
 from Crypto.Random import get_random_bytes
 
-from .utils import b64dec, b64enc, b64dec_if_not_bytes, b64enc_if_not_str, encode_tag, decode_tag, normalize_tag, create_tag, tags_to_dict
-from .utils.deep_hash import deep_hash
+from .utils import b64dec, b64enc, b64dec_if_not_bytes, b64enc_if_not_str, utf8enc_if_not_bytes, encode_tag, decode_tag, normalize_tag, create_tag, tags_to_dict
+from .utils.deep_hash import deep_hash, deep_hash_chunks, Blob
+from .utils import avro
+from .stream import SubStream
 from .utils.ans104_signers import DEFAULT as DEFAULT_SIGNER, BY_TYPE as SIGNERS_BY_TYPE
 from . import logger
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ANS104_TAGS_AVRO_SCHEMA = {
   "type": "array",
   "items": {
@@ -30,9 +45,42 @@ class ANS104BundleHeader:
             length_id_pairs = [(length,id) for id, length in length_id_pairs.items()]
         elif length_id_pairs is None:
             length_id_pairs = []
-        self.length_id_pairs = length_id_pairs
+        self._length_id_pairs = length_id_pairs
+        self._index = None
         self.version = version
 
+    @property
+    def length_id_pairs(self):
+        # headers parsed from binary keep raw ids in an index until the pairs
+        # are asked for; the pairs then take over, as they may be changed
+        if self._length_id_pairs is None:
+            index = self._index
+            offsets = index.offsets
+            self._length_id_pairs = [
+                (offsets[idx + 1] - offsets[idx], index.id(idx))
+                for idx in range(len(index))
+            ]
+        return self._length_id_pairs
+    @length_id_pairs.setter
+    def length_id_pairs(self, length_id_pairs):
+        self._length_id_pairs = length_id_pairs
+        self._index = None
+
+    @property
+    def index(self):
+        '''
+        A BundleIndex of the entries, for lookups by id. It is built once;
+        assign length_id_pairs again after changing the list in place.
+        '''
+        if self._index is None:
+            self._index = BundleIndex.fromheader(self)
+        return self._index
+
+    def _parsed_index(self):
+        # the index parsed from binary, while the pairs have not taken over
+        if self._length_id_pairs is None:
+            return self._index
+
     @property
     def length_by_id(self):
         return {
@@ -47,9 +95,15 @@ class ANS104BundleHeader:
         ]
 
     def get_count(self):
+        index = self._parsed_index()
+        if index is not None:
+            return len(index)
         return len(self.length_id_pairs)
 
     def get_length(self, id):
+        index = self._parsed_index()
+        if index is not None:
+            return index.get_length(id)
         id = b64enc_if_not_str(id)
         for length, other_id in self.length_id_pairs:
             if id == other_id:
@@ -59,6 +113,9 @@ class ANS104BundleHeader:
         return self.get_range(id)[0]
 
     def get_range(self, id):
+        index = self._parsed_index()
+        if index is not None:
+            return index.get_range(id)
         total = self.get_len_bytes()
         id = b64enc_if_not_str(id)
         for length, other_id in self.length_id_pairs:
@@ -67,6 +124,9 @@ class ANS104BundleHeader:
             total += length
 
     def get_range_id_pairs(self):
+        index = self._parsed_index()
+        if index is not None:
+            return index.get_range_id_pairs()
         total = self.get_len_bytes()
         result = []
         for length, id in self.length_id_pairs:
@@ -75,9 +135,12 @@ class ANS104BundleHeader:
         return result
 
     def get_len_bytes(self):
-        return 32 + len(self.length_id_pairs) * 64
+        return 32 + self.get_count() * 64
 
     def tobytes(self):
+        index = self._parsed_index()
+        if index is not None:
+            return index.tobytes()
         return self.get_count().to_bytes(32, 'little') + b''.join([
             int(length).to_bytes(32, 'little') + b64dec(id)
             for length, id in self.length_id_pairs
@@ -101,19 +164,162 @@ class ANS104BundleHeader:
 
     @classmethod
     def frombytes(cls, data):
-        stream = io.BytesIO(data)
-        return self.fromstream(stream)
+        return cls.fromindex(BundleIndex.frombuffer(data))
 
     @classmethod
     def fromstream(cls, stream):
-        entryct = int.from_bytes(stream.read(32), 'little')
+        return cls.fromindex(BundleIndex.fromstream(stream))
+
+    @classmethod
+    def fromindex(cls, index):
+        header = cls(None, version=2)
+        header._length_id_pairs = None
+        header._index = index
+        return header
+
+class BundleIndex:
+    '''
+    A binary bundle header parsed once into compact arrays for random access.
+
+    raw_ids holds the 32-byte item ids back to back, and offsets holds the
+    count + 1 prefix sums of the item lengths, starting at the header length,
+    so item idx spans offsets[idx]:offsets[idx+1] within the bundle. Lookups
+    by id go through a dict built on first use.
+    '''
+    def __init__(self, raw_ids, offsets):
+        self.raw_ids = bytes(raw_ids)
+        self.offsets = offsets
+        self._index = None
+
+    @classmethod
+    def fromstream(cls, stream):
+        '''Parse the header at the stream's position, leaving it at the first item.'''
+        count = int.from_bytes(stream.read(32), 'little')
+        return cls._fromentries(count, stream.read(count * 64))
+
+    @classmethod
+    def frombuffer(cls, buffer, offset = 0):
+        '''Parse the header from a bytes-like object or mmap, at offset.'''
+        buffer = memoryview(buffer)
+        count = int.from_bytes(buffer[offset:offset+32], 'little')
+        return cls._fromentries(count, buffer[offset+32:offset+32+count*64])
+
+    @classmethod
+    def _fromentries(cls, count, entries):
+        if len(entries) != count * 64:
+            raise ValueError(f'bundle header truncated: {len(entries)} of {count * 64} entry bytes')
+        header_len = 32 + count * 64
+        # each entry is a 32-byte little-endian length followed by a 32-byte id,
+        # so as 64-bit words the length is word 0, must fit in it, and the id is words 4-7
+        if numpy is not None:
+            words = numpy.frombuffer(entries, dtype='<u8').reshape(count, 8)
+            if words[:, 1:4].any():
+                raise ValueError('bundle item is too long to index')
+            offsets = numpy.empty(count + 1, dtype='=u8')
+            offsets[0] = header_len
+            numpy.cumsum(words[:, 0], out=offsets[1:])
+            offsets[1:] += numpy.uint64(header_len)
+            return cls(words[:, 4:].tobytes(), array.array('Q', offsets.tobytes()))
+        words = array.array('Q')
+        words.frombytes(entries)
+        if sys.byteorder != 'little':
+            words.byteswap()
+        if any(words[1::8]) or any(words[2::8]) or any(words[3::8]):
+            raise ValueError('bundle item is too long to index')
+        offsets = array.array('Q', itertools.accumulate(words[0::8], initial = header_len))
+        # gather the ids one byte column at a time with strided slices
+        entries = bytes(entries)
+        raw_ids = bytearray(count * 32)
+        for column in range(32):
+            raw_ids[column::32] = entries[32+column::64]
+        return cls(raw_ids, offsets)
+
+    @classmethod
+    def fromheader(cls, header):
+        count = header.get_count()
+        offsets = array.array('Q', bytes(8 * (count + 1)))
+        total = header.get_len_bytes()
+        offsets[0] = total
+        for idx, (length, id) in enumerate(header.length_id_pairs):
+            total += int(length)
+            offsets[idx + 1] = total
+        return cls(b''.join(b64dec_if_not_bytes(id) for length, id in header.length_id_pairs), offsets)
+
+    def toheader(self):
+        return ANS104BundleHeader([
+            (self.offsets[idx + 1] - self.offsets[idx], b64enc(self.raw_id(idx)))
+            for idx in range(len(self))
+        ], version=2)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        '''Iterate the raw ids in bundle order.'''
+        raw_ids = self.raw_ids
+        return (raw_ids[start:start+32] for start in range(0, len(raw_ids), 32))
+
+    def __contains__(self, id):
+        return self.find(id) is not None
+
+    def get_count(self):
+        return len(self)
+
+    def get_len_bytes(self):
+        return self.offsets[0]
+
+    def get_size(self):
+        '''The length of the whole bundle, header included.'''
+        return self.offsets[-1]
+
+    def raw_id(self, idx):
+        return self.raw_ids[idx*32:idx*32+32]
+
+    def id(self, idx):
+        return b64enc(self.raw_id(idx))
+
+    def find(self, id):
+        '''Return the position of the first item with id, or None.'''
+        if self._index is None:
+            index = {}
+            raw_ids = self.raw_ids
+            # filled backwards so duplicate ids resolve to their first entry
+            for idx in range(len(self) - 1, -1, -1):
+                index[raw_ids[idx*32:idx*32+32]] = idx
+            self._index = index
+        return self._index.get(bytes(b64dec_if_not_bytes(id)))
 
-        length_id_pairs = [
-            (int.from_bytes(stream.read(32), 'little'), b64enc(stream.read(32)))
-            for idx in range(entryct)
+    def range(self, idx):
+        return self.offsets[idx], self.offsets[idx + 1]
+
+    def get_range(self, id):
+        idx = self.find(id)
+        if idx is not None:
+            return self.offsets[idx], self.offsets[idx + 1]
+
+    def get_offset(self, id):
+        idx = self.find(id)
+        if idx is not None:
+            return self.offsets[idx]
+
+    def get_length(self, id):
+        idx = self.find(id)
+        if idx is not None:
+            return self.offsets[idx + 1] - self.offsets[idx]
+
+    def get_range_id_pairs(self):
+        return [
+            [[self.offsets[idx], self.offsets[idx + 1]], self.id(idx)]
+            for idx in range(len(self))
         ]
 
-        return cls(length_id_pairs, version=2)
+    def tobytes(self):
+        offsets = self.offsets
+        raw_ids = self.raw_ids
+        return len(self).to_bytes(32, 'little') + b''.join([
+            (offsets[idx + 1] - offsets[idx]).to_bytes(32, 'little') + raw_ids[idx*32:idx*32+32]
+            for idx in range(len(self))
+        ])
 
 class ANS104DataItemHeader:
     def __init__(self, tags = [], owner=None, target=None, anchor=None, signature=None, signer=DEFAULT_SIGNER, nominal_id=None):
@@ -194,22 +400,30 @@ class ANS104DataItemHeader:
 
     @property
     def tags(self):
-        stream = io.BytesIO(self.raw_tags)
-        return self.tagsfromstream(stream)
+        return self.tagsfrombytes(self.raw_tags)
 
     @tags.setter
     def tags(self, tags):
         self.raw_tags = self.tagstobytes(tags) + self.extra_tags_data
 
+    def get_tag(self, name, default = None):
+        '''Return the value of the first tag called name, decoding no further than it.'''
+        value = avro.find_tag(self.raw_tags, utf8enc_if_not_bytes(name))
+        if value is None:
+            return default
+        return bytes(value)
+
+    @property
+    def tags_count(self):
+        return avro.scan_tags(self.raw_tags)[0]
+
     @property
     def extra_tags_data(self):
-        stream = io.BytesIO(self.raw_tags)
-        self.tagsfromstream(stream)
-        return stream.read()
+        return self.raw_tags[avro.scan_tags(self.raw_tags)[1]:]
 
     @extra_tags_data.setter
     def extra_tags_data(self, extra_tags_data):
-        self.raw_tags = self.raw_tags[-len(self.extra_tags_data):] + extra_tags_data
+        self.raw_tags = self.raw_tags[:avro.scan_tags(self.raw_tags)[1]] + extra_tags_data
 
     def tojson(self):
         return {
@@ -262,7 +476,7 @@ class ANS104DataItemHeader:
             self.raw_owner,
             *target_values,
             *anchor_values,
-            len(self.tags), len(raw_tags)
+            avro.scan_tags(raw_tags)[0], len(raw_tags)
         ) + raw_tags
 
     @classmethod
@@ -333,11 +547,13 @@ class ANS104DataItemHeader:
 
         if raw_tags_len > 0:
             raw_tags = stream.read(raw_tags_len)
-            raw_tags_stream = io.BytesIO(raw_tags)
-            tags = cls.tagsfromstream(raw_tags_stream)
+            try:
+                tags_count, tags_end = avro.scan_tags(raw_tags)
+            except ValueError:
+                raise Exception(f'incorrect tags length')
             offset += raw_tags_len
-            if raw_tags_stream.tell() != raw_tags_len or len(tags) != tags_len:
-                if raw_tags_stream.tell() < raw_tags_len:
+            if tags_end != raw_tags_len or tags_count != tags_len:
+                if tags_end < raw_tags_len:
                     logger.warn('DataItem tags contains cruft data at end.')
                 else:
                     raise Exception(f'incorrect tags length')
@@ -360,8 +576,21 @@ class ANS104DataItemHeader:
         assert offset == result.get_len_bytes()
         return result
 
+    @staticmethod
+    def tagsfrombytes(raw_tags):
+        return [
+            create_tag(bytes(name), bytes(value), True)
+            for name, value in avro.decode_tags(raw_tags)[0]
+        ]
+
     @staticmethod
     def tagsfromstream(stream):
+        if hasattr(stream, 'getbuffer'):
+            offset = stream.tell()
+            tags, end = avro.decode_tags(stream.getbuffer(), offset)
+            tags = [create_tag(bytes(name), bytes(value), True) for name, value in tags]
+            stream.seek(end)
+            return tags
         def avrolongdec(stream):
             # varint encoding is 7-bit little-endian where the 8th bit indicates whether another byte follows
             zigzag = 0
@@ -402,34 +631,10 @@ class ANS104DataItemHeader:
 
     @staticmethod
     def tagstobytes(tags):
-        def avrolongenc(num):
-            # zigzag encoding moves the sign bit to the 1s place
-            zigzag = num << 1
-            if zigzag < 0:
-                zigzag = ~zigzag
-            # varint encoding is 7-bit little-endian where the 8th bit indicates whether another byte follows
-            varint = bytearray()
-            while True:
-                byte = zigzag & 0x7f
-                zigzag >>= 7
-                if zigzag:
-                    varint.append(byte | 0x80)
-                else:
-                    varint.append(byte)
-                    return varint
-        def avrobytesenc(data):
-            return avrolongenc(len(data)) + data
-        if len(tags) == 0:
-            return b''
-        return b''.join([
-            avrolongenc(len(tags)),
-            *[
-                avrobytesenc(tag[key])
-                for tag in (normalize_tag(tag) for tag in tags)
-                for key in ("name", "value")
-            ],
-            b'\0'
-        ])
+        return avro.encode_tags(
+            (tag['name'], tag['value'])
+            for tag in (normalize_tag(tag) for tag in tags)
+        )
 
     @classmethod
     def all_from_tags_stream(cls, tags, stream, step=1):
@@ -451,6 +656,9 @@ class ANS104DataItemHeader:
 
 class DataItem:
     def __init__(self, header = None, data = b'', version = 2):
+        # file-like data is streamed when signing rather than read into memory
+        if hasattr(data, 'read'):
+            data = Blob(data)
         self.data = data
         if header is None:
             header = ANS104DataItemHeader()
@@ -476,9 +684,12 @@ class DataItem:
                 [tag['name'], tag['value']]
                 for tag in self.header.tags
             ])
-        items.append(self.data)
+        items.append(self._data_for_hashing())
         return deep_hash(items, partial=None if include_data else -1)
 
+    def _data_for_hashing(self):
+        return self.data
+
     def sign(self, private_key):
         self.header.raw_owner = self.header.signer.raw_owner(private_key)
         self.header.raw_signature = self.header.signer.sign(private_key, self.get_raw_signature_data())
@@ -486,6 +697,10 @@ class DataItem:
         return self.header.nominal_id
 
     def verify(self):
+        return self._verify_structure() and self._verify_signature()
+
+    def _verify_structure(self):
+        # the cheap checks, done before any hashing or cryptography
         if len(self.header.tags) > 128:
             return False
         if len(self.header.raw_anchor) > 32:
@@ -502,22 +717,73 @@ class DataItem:
                 return False
         if self.header.nominal_id != self.header.id:
             return False
+        return True
+
+    def _verify_signature(self):
         public_key = self.header.signer.public_key(self.header.raw_owner)
         return self.header.signer.verify(public_key, self.get_raw_signature_data(), self.header.raw_signature)
 
+    def _verify_job(self):
+        # what a worker process needs: the header bytes and the payload or where to find it
+        source = getattr(self, 'source', None)
+        path = getattr(source, 'name', None)
+        if isinstance(self, LazyDataItem) and isinstance(path, str) and os.path.isfile(path):
+            payload = (path, self.data_offset, self.data_length)
+        else:
+            payload = self._data_bytes()
+        return self.header.tobytes(), payload, self.version
+
+    @classmethod
+    def verify_batch(cls, items, processes = None, executor = None, chunksize = 64):
+        '''
+        Verify many data items, returning a list of bools in their order.
+
+        Structural checks run here first; only items passing them are
+        hashed and have their signatures checked, spread over a process
+        pool. Lazy items read from a file send only their header and
+        payload location to the workers.
+
+        processes: the size of the pool made when no executor is passed,
+            or 0 to verify in this process
+        executor: a concurrent.futures.Executor to verify with
+        '''
+        results = []
+        positions = []
+        jobs = []
+        for item in items:
+            if item._verify_structure():
+                positions.append(len(results))
+                jobs.append(item._verify_job())
+            results.append(False)
+        if processes == 0:
+            verified = map(_verify_job, jobs)
+        elif executor is not None:
+            verified = executor.map(_verify_job, jobs, chunksize = chunksize)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+                verified = list(executor.map(_verify_job, jobs, chunksize = chunksize))
+        for position, result in zip(positions, verified):
+            results[position] = result
+        return results
+
+    def _data_bytes(self):
+        if isinstance(self.data, Blob):
+            return b''.join(self.data)
+        return self.data
+
     def tojson(self):
         result = self.header.tojson()
-        result['data'] = b64enc(self.data)
+        result['data'] = b64enc(self._data_bytes())
         return result
 
     def get_len_bytes(self):
         return self.header.get_len_bytes() + len(self.data)
 
     def tobytes(self):
-        return self.header.tobytes() + self.data
+        return self.header.tobytes() + self._data_bytes()
 
     @classmethod
-    def all_from_tags_stream(cls, tags, stream):
+    def all_from_tags_stream(cls, tags, stream, lazy = False):
         fmt = None
         for tag in tags:
             if tag['name'] == b'Bundle-Format':
@@ -525,6 +791,8 @@ class DataItem:
         #print(fmt)
         if fmt == b'json':
             yield from Bundle.fromjson(json.load(stream)).dataitems
+        elif fmt == b'binary' and lazy:
+            yield from LazyDataItem.all_from_stream(stream)
         elif fmt == b'binary':
             header = ANS104BundleHeader.fromstream(stream)
             offset = header.get_len_bytes()
@@ -551,6 +819,80 @@ class DataItem:
             data = stream.read(length - header.get_len_bytes())
         return cls(header = header, data = data, version = 2)
 
+class LazyDataItem(DataItem):
+    '''
+    A data item parsed from its header alone. The payload stays in the
+    seekable stream or buffer it came from and is read only when accessed,
+    through data or a SubStream from open(). Signing and verifying stream it.
+    '''
+    def __init__(self, header, source, data_offset, data_length, version = 2):
+        self.header = header
+        self.version = version
+        self.source = source
+        self.data_offset = data_offset
+        self.data_length = data_length
+
+    @property
+    def data(self):
+        return self.open().read()
+
+    def open(self):
+        return SubStream(self.source, self.data_offset, self.data_length)
+
+    def _data_for_hashing(self):
+        return Blob(self.open(), self.data_length)
+
+    @property
+    def id(self):
+        return self.header.nominal_id or self.header.id
+
+    @property
+    def tags(self):
+        return self.header.tags
+
+    @property
+    def owner(self):
+        return self.header.owner
+
+    @property
+    def target(self):
+        return self.header.target
+
+    def get_len_bytes(self):
+        return self.header.get_len_bytes() + self.data_length
+
+    @classmethod
+    def fromstream(cls, stream, length = None, nominal_id = None):
+        '''Parse the header at the stream's position and leave the stream after the payload.'''
+        header = ANS104DataItemHeader.fromstream(stream, nominal_id = nominal_id)
+        data_offset = stream.tell()
+        if length is None:
+            data_length = stream.seek(0, io.SEEK_END) - data_offset
+        else:
+            data_length = length - header.get_len_bytes()
+            stream.seek(data_offset + data_length)
+        return cls(header, stream, data_offset, data_length)
+
+    @classmethod
+    def frombuffer(cls, buffer, offset = 0, length = None, nominal_id = None):
+        '''Parse the item at offset in a bytes-like object or mmap, which the payload then refers into.'''
+        if length is None:
+            length = len(buffer) - offset
+        item = cls.fromstream(SubStream(buffer, offset, length), length, nominal_id)
+        item.source = buffer
+        item.data_offset += offset
+        return item
+
+    @classmethod
+    def all_from_stream(cls, stream):
+        '''Yield the items of the binary bundle at the stream's position.'''
+        start = stream.tell()
+        index = ANS104BundleHeader.fromstream(stream).index
+        for idx in range(len(index)):
+            item_start, item_end = index.range(idx)
+            stream.seek(start + item_start)
+            yield cls.fromstream(stream, item_end - item_start, nominal_id = index.id(idx))
+
 class Bundle:
     def __init__(self, dataitems, version = 2):
         self.dataitems = dataitems
@@ -562,12 +904,16 @@ class Bundle:
     def verify(self):
         return all([dataitem.verify() for dataitem in self.dataitems])
 
+    def verify_batch(self, processes = None, executor = None):
+        '''Verify the items over a process pool, returning a bool for each.'''
+        return DataItem.verify_batch(self.dataitems, processes = processes, executor = executor)
+
     @property
     def header(self):
-        return ANS104BundleHeader({
-            item.header.nominal_id: item.get_len_bytes()
+        return ANS104BundleHeader([
+            (item.get_len_bytes(), item.header.nominal_id)
             for item in self.dataitems
-        })
+        ])
 
     def tojson(self):
         return {
@@ -591,7 +937,236 @@ class Bundle:
         return cls.fromstream(stream)
 
     @classmethod
-    def fromstream(cls, stream):
+    def fromstream(cls, stream, lazy = False):
+        if lazy:
+            return cls(list(LazyDataItem.all_from_stream(stream)), version = 2)
         header = ANS104BundleHeader.fromstream(stream)
         dataitems = [DataItem.fromstream(stream, length, nominal_id=id) for length, id in header.length_id_pairs]
         return cls(dataitems, version = 2)
+
+    def tostream(self, stream):
+        '''Write the binary bundle to stream without building it in memory.'''
+        with BundleWriter(stream, count = len(self.dataitems)) as writer:
+            writer.extend(self.dataitems)
+        return writer.size
+
+def _verify_job(job):
+    header_bytes, payload, version = job
+    header = ANS104DataItemHeader.fromstream(io.BytesIO(header_bytes))
+    if isinstance(payload, tuple):
+        path, offset, length = payload
+        with open(path, 'rb') as file:
+            return LazyDataItem(header, file, offset, length, version)._verify_signature()
+    return DataItem(header, payload, version)._verify_signature()
+
+def _rsa_pss_signer(key_pem):
+    # the cryptography package signs several times faster than pycryptodome when it is installed
+    try:
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+    except ImportError:
+        key = RSA.import_key(key_pem)
+        return lambda data: SIGNERS_BY_TYPE[1].sign(key, data)
+    key = serialization.load_pem_private_key(key_pem, password = None)
+    # arweave-js uses the maximum salt length
+    pss = padding.PSS(padding.MGF1(hashes.SHA256()), SIGNERS_BY_TYPE[1].owner_length - 32 - 2)
+    return lambda data: key.sign(data, pss, hashes.SHA256())
+
+_bulk_sign_func = None
+
+def _bulk_sign_init(key_pem):
+    global _bulk_sign_func
+    _bulk_sign_func = _rsa_pss_signer(key_pem)
+
+def _bulk_sign_job(job):
+    acc, tail = job
+    return _bulk_sign_func(deep_hash_chunks(tail, acc))
+
+class BulkSigner:
+    '''
+    Signs many data items from one arweave key, generalizing
+    toys/accelerated_ditem_signing.py.
+
+    The deep hash of the fields every item shares is computed once. Each
+    item then only hashes its target, anchor, tags and payload and is
+    signed, optionally across a process pool. The cryptography package
+    is used for signing when it is installed.
+
+    key: a pycryptodome RSA private key, as DataItem.sign takes
+    tags, target, anchor: the defaults for items given as bare payloads;
+        an anchor of None is random per item, and b'' means no anchor
+    '''
+    def __init__(self, key, tags = [], target = None, anchor = None):
+        self.signer = SIGNERS_BY_TYPE[1]
+        self.key_pem = key.export_key()
+        self.raw_owner = self.signer.raw_owner(key)
+        self.tags = tags
+        self.target = target
+        self.anchor = anchor
+        # the shared prefix of get_raw_signature_data, folded under the full item count
+        prefix = [b'dataitem', b'1', str(self.signer.type).encode(), self.raw_owner]
+        self.prefix_acc = deep_hash(prefix + [b''] * 4, partial = len(prefix))
+        self._sign_func = None
+
+    def _prepare(self, payload):
+        if isinstance(payload, DataItem):
+            item = payload
+            item.version = 2
+            item.header.signer = self.signer
+            item.header.raw_owner = self.raw_owner
+        else:
+            header = ANS104DataItemHeader(tags = self.tags, owner = self.raw_owner, target = self.target, anchor = self.anchor, signer = self.signer)
+            item = DataItem(header = header, data = payload)
+        tail = [item.header.raw_target, item.header.raw_anchor, item.header.raw_tags, item._data_for_hashing()]
+        return item, (self.prefix_acc, tail)
+
+    def _finish(self, item, raw_signature):
+        item.header.raw_signature = raw_signature
+        item.header.nominal_id = item.header.id
+        return item
+
+    def sign(self, payload):
+        '''Return a signed DataItem for a payload, or sign an unsigned DataItem in place.'''
+        if self._sign_func is None:
+            self._sign_func = _rsa_pss_signer(self.key_pem)
+        item, (acc, tail) = self._prepare(payload)
+        return self._finish(item, self._sign_func(deep_hash_chunks(tail, acc)))
+
+    def sign_all(self, payloads, processes = None, pending = None):
+        '''
+        Yield signed DataItems in order for an iterable of payloads, which
+        may be bytes or unsigned DataItems carrying their own tags, target
+        and anchor.
+
+        processes: the size of the signing pool, or 0 to sign here
+        pending: the most items in flight, bounding memory for long streams
+        '''
+        if processes == 0:
+            for payload in payloads:
+                yield self.sign(payload)
+            return
+        if processes is None:
+            processes = os.cpu_count()
+        if pending is None:
+            pending = processes * 4
+        queue = collections.deque()
+        with concurrent.futures.ProcessPoolExecutor(processes, initializer = _bulk_sign_init, initargs = (self.key_pem,)) as executor:
+            for payload in payloads:
+                item, job = self._prepare(payload)
+                if isinstance(job[1][-1], Blob):
+                    job[1][-1] = item._data_bytes()
+                queue.append((item, executor.submit(_bulk_sign_job, job)))
+                while len(queue) >= pending:
+                    item, future = queue.popleft()
+                    yield self._finish(item, future.result())
+            while queue:
+                item, future = queue.popleft()
+                yield self._finish(item, future.result())
+
+class BundleWriter:
+    '''
+    Writes a binary bundle from data items as they arrive, holding only the
+    64-byte header entries in memory.
+
+    When count is given and the output is seekable, space for the header is
+    reserved up front and written over at close. Otherwise the items are
+    spooled to a temporary file and copied out after the header, so
+    unseekable outputs like sockets and pipes work too.
+
+    output: a writable binary stream
+    count: the number of items that will be added, if known
+    '''
+    COPY_SIZE = 1024 * 1024
+
+    def __init__(self, output, count = None):
+        self.output = output
+        self.count = count
+        self.entries = bytearray()
+        self.item_count = 0
+        self.size = None
+        if count is not None and hasattr(output, 'seekable') and output.seekable():
+            self.start = output.tell()
+            self.stream = output
+            self.stream.write(bytes(32 + count * 64))
+        else:
+            self.start = None
+            self.stream = tempfile.TemporaryFile()
+
+    def add(self, item):
+        '''Append a DataItem, streaming its payload if it is lazy or a Blob.'''
+        if isinstance(item, LazyDataItem):
+            return self.add_stream(item.header, item.open(), item.data_length)
+        data = item.data
+        if isinstance(data, Blob):
+            return self.add_stream(item.header, data, len(data))
+        return self.add_stream(item.header, io.BytesIO(data), len(data))
+
+    def add_stream(self, header, payload, length):
+        '''
+        Append a signed item from its header and a payload of length bytes.
+        payload may be a readable stream or an iterable of buffers.
+        '''
+        if self.count is not None and self.item_count >= self.count:
+            raise ValueError(f'bundle was reserved for {self.count} items')
+        header_bytes = header.tobytes()
+        self.stream.write(header_bytes)
+        written = 0
+        if hasattr(payload, 'read'):
+            while written < length:
+                buf = payload.read(min(self.COPY_SIZE, length - written))
+                if not buf:
+                    break
+                self.stream.write(buf)
+                written += len(buf)
+        else:
+            for buf in payload:
+                self.stream.write(buf)
+                written += len(buf)
+        if written != length:
+            raise ValueError(f'data item payload gave {written} bytes, expected {length}')
+        raw_id = b64dec(header.nominal_id) if header.nominal_id else header.raw_id
+        self.entries += (len(header_bytes) + length).to_bytes(32, 'little') + raw_id
+        self.item_count += 1
+
+    def extend(self, items):
+        '''Append DataItems or (header, payload, length) tuples from an iterable.'''
+        for item in items:
+            if isinstance(item, DataItem):
+                self.add(item)
+            else:
+                self.add_stream(*item)
+
+    def close(self):
+        '''Write the header and return the size of the bundle.'''
+        if self.size is not None:
+            return self.size
+        if self.count is not None and self.item_count != self.count:
+            raise ValueError(f'bundle was reserved for {self.count} items but {self.item_count} were added')
+        header = self.item_count.to_bytes(32, 'little') + self.entries
+        if self.start is not None:
+            end = self.stream.tell()
+            self.stream.seek(self.start)
+            self.stream.write(header)
+            self.stream.seek(end)
+            self.size = end - self.start
+        else:
+            self.output.write(header)
+            self.size = len(header) + self.stream.tell()
+            self.stream.seek(0)
+            while True:
+                buf = self.stream.read(self.COPY_SIZE)
+                if not buf:
+                    break
+                self.output.write(buf)
+            self.stream.close()
+        self.entries = None
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *params):
+        if params[0] is None:
+            self.close()
+        elif self.start is None:
+            self.stream.close()
@@ -1,9 +1,17 @@
 import hashlib, io
 
-from .utils import arbinenc, arbindec, b64enc, b64dec
+from .utils import arbinenc, arbindec, b64enc, b64dec, Cursor
 from .utils.merkle import Node as MerkleNode
 from . import utils
 
+# the fields of a chunk2 reply
+CHUNK_FIELDS = (
+    ('data',        'bin', 24),
+    ('tx_path',     'bin', 24),
+    ('data_path',   'bin', 24),
+    ('packing',     'bin',  8),
+)
+
 class Chunk:
     def __init__(self, data = None, data_path = None, tx_path = None, packing = 'unpacked'):
         self.data = data
@@ -105,15 +113,22 @@ class Chunk:
         )
 
     @classmethod
-    def frombytes(cls, bytes, tx_root_raw=None, data_root_raw=None):
-        return cls.fromstream(io.BytesIO(bytes), tx_root_raw, data_root_raw)
+    def frombytes(cls, bytes, tx_root_raw=None, data_root_raw=None, copy=True):
+        '''With copy=False, data is a memoryview of bytes rather than a copy.'''
+        return cls.fromcursor(Cursor(bytes, copy=copy), tx_root_raw, data_root_raw)
 
     @classmethod
     def fromstream(cls, stream, tx_root_raw=None, data_root_raw=None):
-        data = arbindec(stream, 24)
-        tx_path_bin = arbindec(stream, 24)
-        data_path_bin = arbindec(stream, 24)
-        packing_bin = arbindec(stream, 8)
+        with Cursor.fromstream(stream) as cursor:
+            return cls.fromcursor(cursor, tx_root_raw, data_root_raw)
+
+    @classmethod
+    def fromcursor(cls, cursor, tx_root_raw=None, data_root_raw=None):
+        fields = cursor.read_fields(CHUNK_FIELDS)
+        data = fields['data']
+        tx_path_bin = fields['tx_path']
+        data_path_bin = fields['data_path']
+        packing_bin = bytes(fields['packing'])
         assert len(tx_path_bin) # have not diagnosed why this raises sometimes
         tx_path = MerkleNode.frombytes(tx_path_bin)
         data_path = MerkleNode.frombytes(data_path_bin, max_byte_range=len(data))
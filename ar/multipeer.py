@@ -1,7 +1,9 @@
 from .peer import Peer
+from .stream import PeerStream
+from .chunk import Chunk
 from . import logger, ArweaveNetworkException
 
-import bisect, threading, time
+import bisect, io, threading, time
 
 class IntervalVector:
     # range: (first, last, state)
@@ -276,6 +278,128 @@ class ContentTrackedPeer(Peer):
     def on_too_many_connections(self):
         raise self.DifferentPeerException()
 
+class StripedChunkFetcher:
+    '''
+    Spreads chunk requests across peers.
+
+    Each chunk2 call goes to the peer that holds the offset with the best
+    measured throughput for its current load, so faster peers take a larger
+    share. A failed request is retried on the remaining peers. Concurrent
+    callers, such as a PeerStream with readahead, stripe a download across
+    all the peers.
+
+    Other Peer methods are forwarded to the peers in the same order.
+    '''
+    # weight of the newest throughput measurement
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, peers, validate = None):
+        '''
+        peers: Peers to fetch from. Peers with has_range(), such as
+            ContentTrackedPeer, are only asked for offsets they hold.
+        validate: optional callable checking chunk2 bytes, raising to
+            retry the chunk on a different peer. If it returns a value
+            other than None, such as the parsed Chunk, chunk2 returns that
+            in place of the bytes.
+        '''
+        assert len(peers)
+        self.peers = list(peers)
+        self.validate = validate
+        self.lock = threading.Lock()
+        self.throughput = {peer: None for peer in self.peers} # bytes per second
+        self.in_flight = {peer: 0 for peer in self.peers}
+        self.failures = {peer: 0 for peer in self.peers}
+
+    def _score(self, peer):
+        throughput = self.throughput[peer]
+        if throughput is None:
+            # unmeasured peers are tried as if they were the fastest
+            throughput = max((value for value in self.throughput.values() if value is not None), default = 1)
+        return throughput / (1 + self.in_flight[peer]) / (1 + self.failures[peer])
+
+    def _ranked(self, offset = None, exclude = ()):
+        with self.lock:
+            peers = sorted((peer for peer in self.peers if peer not in exclude), key = self._score, reverse = True)
+        if offset is not None:
+            holding = [peer for peer in peers if not hasattr(peer, 'has_range') or peer.has_range(offset, offset)]
+            if len(holding):
+                peers = holding
+        return peers
+
+    def _record(self, peer, size = None, duration = None):
+        with self.lock:
+            if size is None:
+                self.failures[peer] += 1
+                if self.throughput[peer] is not None:
+                    self.throughput[peer] /= 2
+            else:
+                self.failures[peer] = 0
+                measured = size / max(duration, 1e-6)
+                previous = self.throughput[peer]
+                if previous is None:
+                    self.throughput[peer] = measured
+                else:
+                    self.throughput[peer] = previous + self.EWMA_ALPHA * (measured - previous)
+
+    def _call(self, method, offset, *params, **kwparams):
+        tried = set()
+        exception = None
+        while True:
+            peers = self._ranked(offset, tried)
+            if not len(peers):
+                raise exception
+            peer = peers[0]
+            tried.add(peer)
+            with self.lock:
+                self.in_flight[peer] += 1
+            start = time.time()
+            try:
+                result = getattr(peer, method)(*params, **kwparams)
+                size = len(result) if isinstance(result, (bytes, bytearray)) else 1
+                if method == 'chunk2' and self.validate is not None:
+                    validated = self.validate(result)
+                    if validated is not None:
+                        result = validated
+            except Exception as exc:
+                logger.info(f'{peer.api_url} failed {method}{params}: {exc}. Trying another peer ...')
+                self._record(peer)
+                exception = exc
+                continue
+            finally:
+                with self.lock:
+                    self.in_flight[peer] -= 1
+            self._record(peer, size, time.time() - start)
+            return result
+
+    def chunk2(self, offset, *params, **kwparams):
+        return self._call('chunk2', int(offset), offset, *params, **kwparams)
+
+    def fetch_full_block(self, height_or_hash, workers = 8):
+        '''Peer.fetch_full_block, with the txs the block lacks fetched across the peers.'''
+        return self._call('fetch_full_block', None, height_or_hash, tx_peer = self, workers = workers)
+
+    def state(self):
+        '''Return the throughput, load and failures of each peer.'''
+        with self.lock:
+            return {
+                peer.api_url: {
+                    'throughput': self.throughput[peer],
+                    'in_flight': self.in_flight[peer],
+                    'failures': self.failures[peer],
+                }
+                for peer in self.peers
+            }
+
+    def __getattr__(self, attr):
+        if attr == 'peers' or attr.startswith('__'):
+            raise AttributeError(attr)
+        if not callable(getattr(self.peers[0], attr)):
+            return getattr(self.peers[0], attr)
+        def wrapped(*params, **kwparams):
+            return self._call(attr, None, *params, **kwparams)
+        wrapped.__name__ = attr
+        return wrapped
+
 class MultiPeer:
     def __init__(self, initial_peers = None, timeout = None):
         if initial_peers is None:
@@ -386,6 +510,41 @@ class MultiPeer:
     def peers(self):
         return [peer.api_url.split('://',1)[1] for peer in self.peers[:16]]
 
+    def range_peers(self, first, size, count, timeout = None):
+        '''Return up to count peers that hold the given range, discovering more if needed.'''
+        found = []
+        search = self.chunk_peers(first, size, timeout)
+        try:
+            for peer in search:
+                if peer not in found:
+                    found.append(peer)
+                if len(found) >= count:
+                    break
+        except TimeoutError:
+            if not len(found):
+                raise
+        finally:
+            search.close()
+        return found
+
+    def striped_stream(self, txid, range = None, peer_count = 4, readahead = 16, timeout = None):
+        '''
+        Stream a transaction with its chunks spread across up to peer_count
+        peers that hold it, readahead chunks at a time.
+        '''
+        txoffset = self.tx_offset(txid)
+        size = txoffset['size']
+        first = txoffset['offset'] - size + 1
+        fetcher = StripedChunkFetcher(self.range_peers(first, size, peer_count, timeout))
+        if range is not None:
+            raw = PeerStream.from_txid(fetcher, txid, range[0], range[1] - range[0], readahead = readahead)
+        else:
+            raw = PeerStream.from_txid(fetcher, txid, readahead = readahead)
+        # have bad chunks retried on other peers; the stream takes the
+        # verified Chunk rather than checking it again
+        fetcher.validate = lambda chunk_bytes: Chunk.frombytes(chunk_bytes, raw.tx_root_raw, raw.data_root_raw)
+        return io.BufferedReader(raw, 0x40000)
+
     def _range_call(self, first, size, peer_method, *params, timeout=None, **kwparams):
         for peer in self.chunk_peers(first, size, timeout=timeout):
             try:
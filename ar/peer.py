@@ -1,8 +1,10 @@
 
-from . import DEFAULT_API_URL, DEFAULT_REQUESTS_PER_MINUTE_LIMIT, logger, ArweaveException, ArweaveNetworkException
+from . import DEFAULT_API_URL, DEFAULT_REQUESTS_PER_MINUTE_LIMIT, CHECKPOINT_DEPTH, logger, ArweaveException, ArweaveNetworkException
 from .stream import PeerStream, GatewayStream
 from .utils import b64dec, arbindec
+from .utils.ratelimit import SlidingWindowLimiter
 
+import concurrent.futures
 import io
 import threading
 import time
@@ -30,21 +32,93 @@ def binary_to_term(b):
         b = b.replace(b'\xef\xbf\xbd', b'\x83')
     return erlang.binary_to_term(b)
 
+# reply parsing shared by Peer and AsyncPeer
+
+def _decode_tags(tags):
+    for tag in tags:
+        for key in tag:
+            tag[key] = b64dec(tag[key].encode())
+    return tags
+
+def _parse_data_sync_record(response, format):
+    if format == 'json':
+        try:
+            intervals = response.json()
+            intervals = [
+                (int(key), int(value))
+                for interval in intervals
+                for key, value in interval.items()
+            ]
+            return intervals
+        except json.decoder.JSONDecodeError:
+            # some proxies, such as arweave.net 2022-05, ignore the header and return etf
+            pass
+    intervals = binary_to_term(response.content)
+            
+    intervals = [
+        (int.from_bytes(left.value, 'big'), int.from_bytes(right.value, 'big'))
+        for left, right in intervals
+    ]
+    return intervals
+
+def _data_sync_record_params(start, limit, format):
+    if format == 'json':
+        headers = {'content-type':'application/json'}
+    else:
+        headers = {}
+    if start is None and limit is None:
+        return ('data_sync_record',), headers
+    if start is None:
+        start = -1
+    if limit is None:
+        limit = -1
+    return ('data_sync_record', str(start), str(limit)), headers
+
+def _chunk_headers(packing, bucket_based_offset):
+    headers = {
+        'x-packing': packing
+    }
+    if bucket_based_offset:
+        headers['x-bucket-based-offset'] = '1'
+    return headers
+
+def _parse_tx_offset(result):
+    result['offset'] = int(result['offset'])
+    result['size'] = int(result['size'])
+    return result
+
 class HTTPClient:
-    def __init__(self, api_url, timeout = None, retries = 10, outgoing_connections = 256, requests_per_period = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, period_sec = 60, extra_headers = {}, cert_fingerprint = None, resolved_ips = None):
+    def __init__(self, api_url, timeout = None, retries = 10, outgoing_connections = 256, requests_per_period = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, period_sec = 60, extra_headers = {}, cert_fingerprint = None, resolved_ips = None, limiter = None, coalesce_gets = False):
+        '''
+        limiter: a ar.utils.ratelimit.RateLimiter such as TokenBucketLimiter.
+            If not passed, a SlidingWindowLimiter of requests_per_period
+            requests every period_sec is used, or none if
+            requests_per_period is None. Assigning requests_per_period or
+            period_sec later changes the limiter's rate; assigning
+            requests_per_period = None removes the limiter.
+        coalesce_gets: if True, identical GET requests made while one is
+            already in flight wait for it and share its response, rather
+            than making their own.
+        '''
         if '://' not in api_url:
             api_url = 'http://' + api_url
         self.api_url = api_url
-        self.session = requests.Session()
         self.max_outgoing_connections = outgoing_connections
-        self.outgoing_connection_semaphore = threading.BoundedSemaphore(outgoing_connections)
-        self.rate_limit_lock = threading.Lock()
-        self.requests_per_period = requests_per_period
-        self.ratelimited_requests = 0
-        self.period_sec = period_sec
+        if limiter is None and requests_per_period is not None:
+            limiter = SlidingWindowLimiter(requests_per_period, period_sec)
+        self.limiter = limiter
+        self._period_sec = period_sec
+        self.coalesce_gets = coalesce_gets
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
         #self.incoming_port = incoming_port
         self.extra_headers = extra_headers
-        self.req_history = []
+        self.retries = retries
+        self.timeout = timeout
+        self._init_session(outgoing_connections, retries, cert_fingerprint, resolved_ips)
+    def _init_session(self, outgoing_connections, retries, cert_fingerprint, resolved_ips):
+        self.session = requests.Session()
+        self.outgoing_connection_semaphore = threading.BoundedSemaphore(outgoing_connections)
         max_retries = requests.adapters.Retry(total=retries, backoff_factor=0.1, status_forcelist=[500,502,503,504]) # from so
         parsed_url = requests.compat.urlparse(self.api_url)
         host = parsed_url.hostname
@@ -69,7 +143,6 @@ class HTTPClient:
         )
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
-        self.timeout = timeout
     def __del__(self):
         self.session.close()
     class _DomainAdapter(requests.adapters.HTTPAdapter):
@@ -111,90 +184,172 @@ class HTTPClient:
             # provide the whole url so the correct host header will be passed to the server
             return requests.utils.urldefragauth(request.url)
 
+    @property
+    def requests_per_period(self):
+        return None if self.limiter is None else self.limiter.requests_per_period
+
+    @requests_per_period.setter
+    def requests_per_period(self, requests_per_period):
+        if requests_per_period is None:
+            self.limiter = None
+        elif self.limiter is None:
+            self.limiter = SlidingWindowLimiter(requests_per_period, self._period_sec)
+        else:
+            self.limiter.set_rate(requests_per_period, self.limiter.period_sec)
+
+    @property
+    def period_sec(self):
+        return self._period_sec if self.limiter is None else self.limiter.period_sec
+
+    @period_sec.setter
+    def period_sec(self, period_sec):
+        self._period_sec = period_sec
+        if self.limiter is not None:
+            self.limiter.set_rate(self.limiter.requests_per_period, period_sec)
+
     def ratelimited(self):
-        if self.requests_per_period is None:
+        if self.limiter is None:
             return False
-        with self.rate_limit_lock:
-            now = time.time()
-            queued_requests = 0
-            for idx, then in enumerate(self.req_history):
-                if then + self.period_sec >= now:
-                    queued_requests_idx = idx
-                    queued_requests = len(self.req_history) - queued_requests_idx
-                    break
-            return queued_requests + self.ratelimited_requests >= self.requests_per_period
+        return self.limiter.ratelimited()
 
     def ratelimit_suggested(self):
-        if self.requests_per_period is None:
+        if self.limiter is None:
             return False
-        if len(self.req_history) == 0:
-            return False
-        return (time.time() - self.req_history[-1] < self.requests_per_period / period_sec) or self.ratelimited
+        return self.limiter.suggested()
+
+    def ratelimit_state(self):
+        '''Return a dict describing the rate limiter, or None if there is none.'''
+        if self.limiter is None:
+            return None
+        return self.limiter.state()
+
+    def _ratelimit_acquire(self):
+        '''
+        Record a request against the rate limit without blocking.
+        Returns None if the request may proceed, otherwise the number
+        of seconds to wait before trying again.
+        '''
+        if self.limiter is None:
+            return None
+        duration = self.limiter.try_acquire()
+        if duration is not None:
+            #print(f'{self.api_url}: too many requests in prologue')
+            self.on_too_many_requests()
+        return duration
 
     def _ratelimit_prologue(self):
-        if self.requests_per_period is None:
-            return
-        with self.rate_limit_lock:
-            now = time.time()
-            queued_requests = 0
-            #if len(self.req_history) >= 3600:
-            #    import pdb; pdb.set_trace()
-            for idx, then in enumerate(self.req_history):
-                if then + self.period_sec >= now:
-                    queued_requests_idx = idx
-                    queued_requests = len(self.req_history) - queued_requests_idx
-                    break
-            if queued_requests + self.ratelimited_requests < self.requests_per_period:
-                #if len(self.req_history) >= self.requests_per_period:
-                #    import pdb; pdb.set_trace()
-                self.req_history.append(now)
+        while True:
+            duration = self._ratelimit_acquire()
+            if duration is None:
                 return
-        #print(f'{self.api_url}: too many requests in prologue')
-        self.on_too_many_requests()
-        with self.rate_limit_lock:
-            now = time.time()
-            if len(self.req_history) >= self.requests_per_period:
-                duration = self.req_history[-self.requests_per_period+1] + self.period_sec - now
-                if duration > 0:
-                    if duration > 0.5:
-                        # quick workaround to let this display later during lock contention
-                        time.sleep(0.5)
-                        duration -= 0.5
-                    logger.info(f'Sleeping for {int(duration*100)/100}s to respect ratelimit of {self.requests_per_period}req/{self.period_sec}s ...')
-                    time.sleep(duration)
-                    #import pdb; pdb.set_trace()
-                    logger.info(f'Done sleeping for {int(duration*100)/100}s to respect ratelimit of {self.requests_per_period}req/{self.period_sec}s .')
-        return self._ratelimit_prologue()
+            if duration > 0:
+                if duration > 0.5:
+                    # quick workaround to let this display later during lock contention
+                    time.sleep(0.5)
+                    duration -= 0.5
+                logger.info(f'Sleeping for {int(duration*100)/100}s to respect ratelimit of {self.requests_per_period}req/{self.period_sec}s ...')
+                time.sleep(duration)
+                logger.info(f'Done sleeping for {int(duration*100)/100}s to respect ratelimit of {self.requests_per_period}req/{self.period_sec}s .')
 
     def _ratelimit_epilogue(self, success = True):
-        if self.requests_per_period is None:
+        if self.limiter is None:
             return
-        if success:
-            with self.rate_limit_lock:
-                self.ratelimited_requests = 0
-                now = time.time()
-                for req_idx, req_time in enumerate(self.req_history):
-                    if req_time + self.period_sec > now:
-                        self.req_history = self.req_history[req_idx:]
-                        break
-        else:
-            with self.rate_limit_lock:
-                self.ratelimited_requests += 1
-                now = time.time()
-                #import pdb; pdb.set_trace()
-                if len(self.req_history):
-                    self.period_sec = max(self.period_sec, now - self.req_history[0])
-                if len(self.req_history) - self.ratelimited_requests <= self.requests_per_period:
-                    self.requests_per_period = max(1, len(self.req_history) - self.ratelimited_requests)
-                logger.info(f'Rate limit hit. Dropped rate to {self.requests_per_period}/{self.period_sec}s.')
+        self.limiter.release(success)
+        if not success:
             self.on_too_many_requests()
 
-    # _get and _post should just call a _request function to share code
-    def _request(self, *params, **request_kwparams):
-        if len(params) and params[-1][0] == '?':
-            url = self.api_url + '/' + '/'.join(params[:-1]) + params[1]
+    def _url(self, *params):
+        if len(params) and params[-1][:1] == '?':
+            return self.api_url + '/' + '/'.join(params[:-1]) + params[-1]
         else:
-            url = self.api_url + '/' + '/'.join(params)
+            return self.api_url + '/' + '/'.join(params)
+
+    def _check_response(self, response, url):
+        '''Raise for error replies, including ones that arrive with a success status.'''
+        if response.headers.get('content-type','').startswith('application/json') or response.status_code == 400:
+            # 'errors': # example from graphql
+            #   [{
+            #     'message':str,
+            #     'locations':[{'line':int, 'column':int}],
+            #     'path': ['transactions'],
+            #     'extensions': {'code': 'INTERNAL_SERVER_ERROR'}
+            #   }]
+            try:
+                msg = response.json()
+            except:
+                pass
+            else:
+                if type(msg) is dict:
+                    msg = msg.get('error',msg.get('errors'))
+                    if msg is not None:
+                        raise ArweaveException(msg)
+        if response.status_code == 400:
+            raise ArweaveException(response.text)
+
+        response.raise_for_status()
+        if int(response.headers.get('content-length', 1)) == 0:
+            raise ArweaveException(f'Empty response from {url}')
+
+    @staticmethod
+    def _classify_status(status_code):
+        '''
+        Returns how a failed reply with the given status should be handled:
+        'ratelimited' to back off and retry, 'retry' to retry, or None to raise.
+        '''
+        if status_code == 429 or status_code == 522: # 522 means server behind cloudfront timed out, these have resolved later
+            return 'ratelimited'
+        elif status_code == 520: # cloudfront broke
+            return 'retry'
+        elif status_code == 502: # cloudflare broke
+            return 'retry'
+        return None
+
+    def _coalesce_key(self, url, request_kwparams):
+        '''Return a key identifying a request that can share another's response, or None.'''
+        if not self.coalesce_gets:
+            return None
+        if request_kwparams.get('method') != 'GET' or request_kwparams.get('stream'):
+            return None
+        if request_kwparams.keys() - {'method', 'headers'}:
+            # requests with bodies or other options are not shared
+            return None
+        headers = {**self.extra_headers, **request_kwparams.get('headers', {})}
+        return (url, tuple(sorted((key.lower(), value) for key, value in headers.items())))
+
+    class _InFlight:
+        def __init__(self):
+            self.event = threading.Event()
+            self.response = None
+            self.exception = None
+
+    def _request(self, *params, **request_kwparams):
+        key = self._coalesce_key(self._url(*params), request_kwparams)
+        if key is None:
+            return self._request_uncoalesced(*params, **request_kwparams)
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._InFlight()
+                self._in_flight[key] = in_flight
+        if not leader:
+            in_flight.event.wait()
+            if in_flight.exception is not None:
+                raise in_flight.exception
+            return in_flight.response
+        try:
+            in_flight.response = self._request_uncoalesced(*params, **request_kwparams)
+            return in_flight.response
+        except BaseException as exc:
+            in_flight.exception = exc
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            in_flight.event.set()
+
+    def _request_uncoalesced(self, *params, **request_kwparams):
+        url = self._url(*params)
 
         headers = {**self.extra_headers, **request_kwparams.get('headers', {})}
         request_kwparams['headers'] = headers
@@ -215,36 +370,15 @@ class HTTPClient:
                 finally:
                     self.outgoing_connection_semaphore.release()
 
-                if response.headers.get('content-type','').startswith('application/json') or response.status_code == 400:
-                    # 'errors': # example from graphql
-                    #   [{
-                    #     'message':str,
-                    #     'locations':[{'line':int, 'column':int}],
-                    #     'path': ['transactions'],
-                    #     'extensions': {'code': 'INTERNAL_SERVER_ERROR'}
-                    #   }]
-                    try:
-                        msg = response.json()
-                    except:
-                        pass
-                    else:
-                        if type(msg) is dict:
-                            msg = msg.get('error',msg.get('errors'))
-                            if msg is not None:
-                                raise ArweaveException(msg)
-                if response.status_code == 400:
-                    raise ArweaveException(response.text)
-
-                response.raise_for_status()
-                if int(response.headers.get('content-length', 1)) == 0:
-                    raise ArweaveException(f'Empty response from {url}')
+                self._check_response(response, url)
                 self._ratelimit_epilogue(True)
                 return response
             except requests.exceptions.RequestException as exc:
                 text = '' if response is None else response.text
                 status_code = 0 if response is None else response.status_code
                 logger.info(f'exception of type {type(exc)} args={[type(a) for a in exc.args]}')
-                if status_code == 429 or status_code == 522: # 522 means server behind cloudfront timed out, these have resolved later
+                action = self._classify_status(status_code)
+                if action == 'ratelimited':
                     # too many requests
                     self._ratelimit_epilogue(False)
                     self.on_too_many_requests()
@@ -264,12 +398,7 @@ class HTTPClient:
                     logger.info('{}\n{}'.format(text, request_kwparams), exc_info=True)
                 else:
                     logger.error('{}\n{}'.format(text, request_kwparams), exc_info=True)
-                if status_code == 520:
-                    # cloudfront broke
-                    self._ratelimit_epilogue(True)
-                    continue
-                elif status_code == 502:
-                    # cloudflare broke
+                if action == 'retry':
                     self._ratelimit_epilogue(True)
                     continue
                 self.on_network_exception(text, status_code, exc, response)
@@ -325,11 +454,59 @@ class Peer(HTTPClient):
     # - https://docs.arweave.org/developers/server/http-api
     # - https://github.com/ArweaveTeam/arweave/blob/master/apps/arweave/src/ar_http_iface_middleware.erl#L132
     # - https://github.com/ArweaveTeam/arweave/blob/master/apps/arweave/src/ar_http_iface_client.erl
-    def __init__(self, api_url = DEFAULT_API_URL, timeout = None, retries = 5, outgoing_connections = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, requests_per_period = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, period_sec = 60, incoming_port = None):
+    def __init__(self, api_url = DEFAULT_API_URL, timeout = None, retries = 5, outgoing_connections = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, requests_per_period = DEFAULT_REQUESTS_PER_MINUTE_LIMIT, period_sec = 60, incoming_port = None, limiter = None, coalesce_gets = False, cache = None):
+        '''
+        cache: an ar.utils.cache.ResponseCache to hold responses that cannot
+            change: blocks by hash, transactions by id, and blocks and
+            unpacked chunks deeper than CHECKPOINT_DEPTH. Each reply is
+            checked against its hash or proofs before it is stored.
+        '''
         super().__init__(
             api_url, timeout, retries, outgoing_connections, requests_per_period, period_sec,
-            extra_headers = {'X-P2p-Port':str(incoming_port)} if incoming_port is not None else {}
+            extra_headers = {'X-P2p-Port':str(incoming_port)} if incoming_port is not None else {},
+            limiter = limiter,
+            coalesce_gets = coalesce_gets,
         )
+        self.cache = cache
+        self._checkpoint = None
+        self._checkpoint_time = 0
+
+    # how often the height is refetched to judge what is deep enough to cache
+    CHECKPOINT_REFRESH_SEC = 60
+
+    def _cache_checkpoint(self, refresh):
+        '''
+        Return (height, weave_size) of a block CHECKPOINT_DEPTH below the tip,
+        refetching it if refresh is set and it is old. Blocks and data at or
+        below it will not change.
+        '''
+        if refresh and time.time() - self._checkpoint_time > self.CHECKPOINT_REFRESH_SEC:
+            from .block import Block
+            height = self.height() - CHECKPOINT_DEPTH
+            content = self.cache.get('block2_height', height)
+            if content is None:
+                content = self._get('block2/height', str(height)).content
+                if not self._is_block2(content, height = height):
+                    raise ArweaveException(f'{self.api_url}: block2 of height {height} does not match its hash')
+                self.cache.put('block2_height', height, content)
+            self._checkpoint = (height, Block.frombytes(content).weave_size)
+            self._checkpoint_time = time.time()
+        return self._checkpoint
+
+    def _cache_immutable(self, height = None, offset = None):
+        '''True if the block at height, or the weave at offset, is deep enough to cache.'''
+        if self.cache is None:
+            return False
+        for refresh in (False, True):
+            checkpoint = self._cache_checkpoint(refresh)
+            if checkpoint is None:
+                continue
+            checkpoint_height, checkpoint_weave_size = checkpoint
+            if height is not None and height <= checkpoint_height:
+                return True
+            if offset is not None and offset <= checkpoint_weave_size:
+                return True
+        return False
 
     def info(self):
         '''
@@ -485,28 +662,41 @@ class Peer(HTTPClient):
         '''Return a JSON-encoded transaction.'''
         response = self._get_json('tx', txid)
         tx = response
-        for tag in tx['tags']:
-            for key in tag:
-                tag[key] = b64dec(tag[key].encode())
+        _decode_tags(tx['tags'])
         return tx
 
     def tx2(self, txid):
         '''Return a binary-encoded transaction.'''
+        # txids hash the signed transaction, so these can be cached once checked
+        if self.cache is not None:
+            content = self.cache.get('tx2', txid)
+            if content is not None:
+                return content
         response = self._get('tx2', txid)#, stream = True)
         #with response_stream_to_file_object(response) as stream:
         #    size = int.from_bytes(stream.read(3), 'big')
         #    format = stream.read(1)[0]
         #    txid_raw = stream.read(32)
         #    last_tx = arbindec(stream, 
+        if self.cache is not None and response.status_code == 200 and self._is_tx2(response.content, txid):
+            self.cache.put('tx2', txid, response.content)
         return response.content
 
+    @staticmethod
+    def _is_tx2(content, txid):
+        '''True if content is the binary tx with id txid, so it may be cached.'''
+        from .transaction import TxHeader
+        try:
+            tx = TxHeader.frombytes(content)
+        except Exception:
+            return False
+        return type(tx) is not str and tx.compute_id_raw() == b64dec(txid)
+
     def unconfirmed_tx(self, txid):
         '''Return a possibly unconfirmed JSON-encoded transaction.'''
         response = self._get_json('unconfirmed_tx', txid)
         tx = response
-        for tag in tx['tags']:
-            for key in tag:
-                tag[key] = b64dec(tag[key].encode())
+        _decode_tags(tx['tags'])
         return tx
 
     def unconfirmed_tx2(self, txid):
@@ -577,37 +767,9 @@ class Peer(HTTPClient):
         limit: the number of intervals to pick
         format: 'json' or 'etf', serialize in JSON or Erlang Term Format
         '''
-        if format == 'json':
-            headers = {'content-type':'application/json'}
-        else:
-            headers = {}
-        if start is None and limit is None:
-            response = self._get('data_sync_record', headers=headers)
-        else:
-            if start is None:
-                start = -1
-            if limit is None:
-                limit = -1
-            response = self._get('data_sync_record', str(start), str(limit), headers=headers)
-        if format == 'json':
-            try:
-                intervals = response.json()
-                intervals = [
-                    (int(key), int(value))
-                    for interval in intervals
-                    for key, value in interval.items()
-                ]
-                return intervals
-            except json.decoder.JSONDecodeError:
-                # some proxies, such as arweave.net 2022-05, ignore the header and return etf
-                pass
-        intervals = binary_to_term(response.content)
-                
-        intervals = [
-            (int.from_bytes(left.value, 'big'), int.from_bytes(right.value, 'big'))
-            for left, right in intervals
-        ]
-        return intervals
+        params, headers = _data_sync_record_params(start, limit, format)
+        response = self._get(*params, headers=headers)
+        return _parse_data_sync_record(response, format)
 
     def chunk(self, offset, packing = 'unpacked', bucket_based_offset = False):
         '''
@@ -624,11 +786,7 @@ class Peer(HTTPClient):
         }
         '''
 
-        headers = {
-            'x-packing': packing
-        }
-        if bucket_based_offset:
-            headers['x-bucket-based-offset'] = '1'
+        headers = _chunk_headers(packing, bucket_based_offset)
 
         response = self._get_json('chunk', str(offset), headers=headers)
         return response
@@ -641,28 +799,37 @@ class Peer(HTTPClient):
         {packing} := { 'unpacked' | 'spora_2_5' | 'spora_2_6_<address>' | 'any' }
         '''
 
-        headers = {
-            'x-packing': packing
-        }
-        if bucket_based_offset:
-            headers['x-bucket-based-offset'] = '1'
+        cacheable = self.cache is not None and packing == 'unpacked' and not bucket_based_offset
+        if cacheable:
+            content = self.cache.get('chunk2', offset)
+            if content is not None:
+                return content
+
+        headers = _chunk_headers(packing, bucket_based_offset)
 
         response = self._get('chunk2', str(offset), headers=headers)
+        if cacheable and response.status_code == 200 and self._is_chunk2(response.content) and self._cache_immutable(offset = int(offset)):
+            self.cache.put('chunk2', offset, response.content)
         return response.content
 
+    @staticmethod
+    def _is_chunk2(content):
+        '''True if content is a binary chunk whose proofs validate, so it may be cached.'''
+        from .chunk import Chunk
+        try:
+            Chunk.frombytes(content).validate(None, None)
+        except Exception:
+            return False
+        return True
+
     def chunk_size(self, offset, packing = 'unpacked', bucket_based_offset = False):
         '''Returns the size of the data chunk containing 1-based offset.'''
 
-        headers = {
-            'x-packing': packing,
-            'Range': 'bytes=0-2',
-        }
-        if bucket_based_offset:
-            headers['x-bucket-based-offset'] = '1'
+        headers = _chunk_headers(packing, bucket_based_offset)
+        headers['Range'] = 'bytes=0-2'
 
-        response = self._get('chunk2', str(offset), headers=headers, stream = True)
-        with response_stream_to_file_object(response) as stream:
-            return int.from_bytes(stream.read(3), 'big')
+        response = self._get('chunk2', str(offset), headers=headers)
+        return int.from_bytes(response.content[:3], 'big')
 
     def tx_offset(self, hash):
         '''
@@ -678,10 +845,12 @@ class Peer(HTTPClient):
             "size": <total size of tx data>
         }
         '''
-        response = self._get_json('tx', hash, 'offset')
-        result = response
-        result['offset'] = int(result['offset'])
-        result['size'] = int(result['size'])
+        # not cached: nothing in the reply can be checked against the txid
+        response = self._get('tx', hash, 'offset')
+        try:
+            result = _parse_tx_offset(response.json())
+        except:
+            raise ArweaveException(response.text)
         return result
 
     def send_chunk(self, json_data):
@@ -993,9 +1162,35 @@ class Peer(HTTPClient):
         if encoded_transaction_indices is not None:
             response = self._post(encoded_transaction_indices, 'block2/hash', hash, method = 'GET')
         else:
+            # indep_hash hashes the block, so these can be cached once checked
+            if self.cache is not None:
+                content = self.cache.get('block2_hash', hash)
+                if content is not None:
+                    return content
             response = self._get('block2/hash', hash)
+            if self.cache is not None and response.status_code == 200 and self._is_block2(response.content, hash = hash):
+                self.cache.put('block2_hash', hash, response.content)
         return response.content
 
+    @staticmethod
+    def _is_block2(content, hash = None, height = None):
+        '''
+        True if content is a binary block that hashes to its indep_hash, and
+        has the given hash or height, so it may be cached.
+        '''
+        from . import FORK_2_0
+        from .block import Block
+        try:
+            block = Block.frombytes(content)
+        except Exception:
+            return False
+        if hash is not None and block.indep_hash_raw != b64dec(hash):
+            return False
+        if height is not None and block.height != int(height):
+            return False
+        # earlier blocks cannot be hashed here
+        return block.height >= FORK_2_0 and block.compute_indep_hash_raw() == block.indep_hash_raw
+
     def block2_height(self, height, encoded_transaction_indices = None):
         '''
         Return the binary-encoded block with the given height.
@@ -1010,9 +1205,63 @@ class Peer(HTTPClient):
         if encoded_transaction_indices is not None:
             response = self._post(encoded_transaction_indices, 'block2/height', str(height), method = 'GET')
         else:
+            if self.cache is not None:
+                content = self.cache.get('block2_height', height)
+                if content is not None:
+                    return content
             response = self._get('block2/height', str(height))
+            if self.cache is not None and response.status_code == 200 and self._is_block2(response.content, height = height) and self._cache_immutable(height = int(height)):
+                self.cache.put('block2_height', height, response.content)
         return response.content
 
+    # every bit of encoded_transaction_indices: a block has at most 1000 txs
+    FULL_BLOCK_TX_INDICES = b'\xff' * 125
+
+    def fetch_full_block(self, height_or_hash, tx_peer = None, workers = 8):
+        '''
+        Return a Block with every tx in full, as a TxHeader.
+
+        The block is requested with every encoded_transaction_indices bit
+        set, so the node includes each tx it has cached. The txs it left as
+        ids are fetched with tx2 on up to workers threads from tx_peer, such
+        as a StripedChunkFetcher to spread them across peers, or by default
+        from this peer. Each tx is checked against the id the block lists,
+        and from FORK_2_0 the txs together against the block's tx_root.
+        '''
+        from ar import Block, TxHeader, FORK_2_0
+        if type(height_or_hash) is int:
+            block = Block.frombytes(self.block2_height(height_or_hash, self.FULL_BLOCK_TX_INDICES))
+            if block.height != height_or_hash:
+                raise ArweaveException(f'{self.api_url} sent block {block.height} for height {height_or_hash}')
+        else:
+            block = Block.frombytes(self.block2_hash(height_or_hash, self.FULL_BLOCK_TX_INDICES))
+            if block.indep_hash != height_or_hash:
+                raise ArweaveException(f'{self.api_url} sent block {block.indep_hash} for {height_or_hash}')
+        if block.height >= FORK_2_0 and block.compute_indep_hash_raw() != block.indep_hash_raw:
+            raise ArweaveException(f'{self.api_url}: block {block.indep_hash} does not match its hash')
+        for tx in block.txs:
+            if type(tx) is not str and tx.compute_id_raw() != tx.id_raw:
+                raise ArweaveException(f'{self.api_url}: tx {tx.id} in block {block.indep_hash} does not match its id')
+
+        missing = [index for index, tx in enumerate(block.txs) if type(tx) is str]
+        if missing:
+            if tx_peer is None:
+                tx_peer = self
+            def fetch(txid):
+                tx = TxHeader.frombytes(tx_peer.tx2(txid))
+                if tx.id != txid or tx.compute_id_raw() != tx.id_raw:
+                    raise ArweaveException(f'tx2 of {txid} does not match its id')
+                return tx
+            with concurrent.futures.ThreadPoolExecutor(min(workers, len(missing))) as executor:
+                txs = executor.map(fetch, [block.txs[index] for index in missing])
+                for index, tx in zip(missing, txs):
+                    block.txs[index] = tx
+        # a tx's id need not cover its data_root and size; the tx_root does,
+        # from the fork that added it
+        if block.height >= FORK_2_0:
+            block.tx_offsets()
+        return block
+
     def block_current(self):
         '''Return the current block.'''
         response = self._get_json('block/current')
@@ -1056,9 +1305,8 @@ class Peer(HTTPClient):
             return response.text
         else:
             response = self._get_json('tx', hash, field)
-            for tag in response:
-                for key in tag:
-                    tag[key] = b64dec(tag[key].encode())
+            if field == 'tags':
+                _decode_tags(response)
             return response
 
     def tx_id(self, hash):
@@ -1147,11 +1395,11 @@ class Peer(HTTPClient):
         else:
             return GatewayStream.from_txid(self, txid)
 
-    def peer_stream(self, txid, range = None):
+    def peer_stream(self, txid, range = None, readahead = 0):
         if range is not None:
-            return io.BufferedReader(PeerStream.from_txid(self, txid, range[0], range[1]-range[0]), 0x40000)
+            return io.BufferedReader(PeerStream.from_txid(self, txid, range[0], range[1]-range[0], readahead = readahead), 0x40000)
         else:
-            return io.BufferedReader(PeerStream.from_txid(self, txid), 0x40000)
+            return io.BufferedReader(PeerStream.from_txid(self, txid, readahead = readahead), 0x40000)
 
     # below are used with https://github.com/ar-io/arweave-gateway
 
@@ -1237,16 +1485,15 @@ class Peer(HTTPClient):
         response = self._get_json('cache', 'jobs')
         return response
 
-from ar.utils.merkle import compute_root_hash, generate_transaction_chunks
+from ar.utils.merkle import ChunkSpool
 from ar.utils import b64enc
-import tempfile, shutil
 def reupload_tx(peer, tx, range=None):
-    full_stream = tempfile.SpooledTemporaryFile()
+    # the data is read from the gateway once, hashing as it is spooled
+    spool = ChunkSpool()
     with peer.gateway_stream(tx) as network_data:
-        shutil.copyfileobj(network_data, full_stream)
+        spool.update_from_file(network_data)
 
-    full_stream.seek(0)
-    chunks = generate_transaction_chunks(full_stream)
+    chunks = spool.transaction_chunks()
     try:
         tx_data_root = peer.tx_data_root(tx)
         logger.warning(f'uhh trying to reupload {tx}')
@@ -1256,25 +1503,21 @@ def reupload_tx(peer, tx, range=None):
         logger.info(f'{tx} not confirmed yet, got the data from gateway and am ensuring another node has it')
     if chunks['data_root'] != tx_data_root:
         logger.error(f'{peer.api_url}: Data for {tx} mismatches generated root.')
+        spool.close()
         return False
-    offset = 0
-    full_stream.seek(0)
-    for proof, chunk in zip(chunks['proofs'], chunks['chunks']):
-        chunk_size = chunk.data_size
-        chunk = {
+    for index, chunk in enumerate(chunks['chunks']):
+        proof = chunks['proofs'][index]
+        peer.send_chunk({
             'data_root': chunks['data_root'],
-            'data_size': str(chunks['chunks'][-1].max_byte_range),
+            'data_size': str(spool.size),
             'data_path': b64enc(proof.proof),
             'offset': str(proof.offset),
-            'chunk': b64enc(stream.read(chunk_size))
-        }
-        peer.send_chunk(chunk)
-        offset+=chunk_size
-    full_stream.seek(0)
+            'chunk': b64enc(spool.read(chunk.min_byte_range, chunk.data_size))
+        })
     if range is not None:
-        ranged_stream = tempfile.SpooledTemporaryFile()
-        stream.seek(range[0])
-        ranged_stream.write(stream.read(range[1]-range[0]))
+        ranged_stream = io.BytesIO(spool.read(range[0], range[1]-range[0]))
+        spool.close()
         return ranged_stream
     else:
-        return full_stream
+        spool.file.seek(0)
+        return spool.file
@@ -1,15 +1,24 @@
-import hashlib, io, ar
-from ar import logger
+import concurrent.futures, hashlib, io, ar
+from ar import logger, DATA_CHUNK_SIZE
 
 class PeerStream(io.RawIOBase):
     @classmethod
-    def from_txid(cls, peer, txid, offset = 0, length = None, tx_root = None, data_root = None):
+    def from_txid(cls, peer, txid, offset = 0, length = None, tx_root = None, data_root = None, readahead = 0, block_index = None):
+        '''
+        block_index: an ar.BlockIndex to find the tx_root in by the tx's
+            offset, rather than fetching its block.
+        '''
         try:
             tx_offset = peer.tx_offset(txid)
+            if tx_root is None and block_index is not None:
+                try:
+                    height, tx_root = block_index.find_offset(tx_offset['offset'])
+                except IndexError:
+                    pass # newer than the index
             if tx_root is None:
                 tx_status = peer.tx_status(txid)
                 block = ar.Block.frombytes(peer.block2_hash(tx_status['block_indep_hash']))
-                assert block.compute_indep_hash_raw() == block.indep_hash_raw()
+                assert block.compute_indep_hash_raw() == block.indep_hash_raw
 
                 tx_root = block.tx_root
             if data_root is None:
@@ -18,17 +27,37 @@ class PeerStream(io.RawIOBase):
                 data_root = tx.data_root
         except ar.ArweaveNetworkException as exc:
             raise # likely exc is 404 and the tx is unconfirmed. a gateway stream would work, or waiting.
-        return cls.from_tx_offset(peer, tx_offset, offset, length, tx_root, data_root)
+        return cls.from_tx_offset(peer, tx_offset, offset, length, tx_root, data_root, readahead)
     @classmethod
-    def from_tx_offset(cls, peer, tx_offset, offset = 0, length = None, tx_root = None, data_root = None):
+    def from_block(cls, peer, block, readahead = 0):
+        '''
+        Yield (txid, stream) for each tx with data in a block fetched with
+        its txs in full. Offsets and roots come from the block itself.
+        '''
+        for tx_offset in block.tx_offsets():
+            yield tx_offset['id'], cls.from_tx_offset(peer, tx_offset, tx_root = block.tx_root, data_root = tx_offset['data_root'], readahead = readahead)
+    @classmethod
+    def from_tx_offset(cls, peer, tx_offset, offset = 0, length = None, tx_root = None, data_root = None, readahead = 0):
         assert tx_root is not None
         assert data_root is not None
         stream_last = tx_offset['offset']
         stream_size = tx_offset['size']
         stream_first = stream_last - stream_size + 1
-        return cls(peer.chunk2, stream_first, offset, stream_size if length is None else min(offset + length, stream_size), tx_root, data_root)
+        return cls(peer.chunk2, stream_first, offset, stream_size if length is None else min(offset + length, stream_size), tx_root, data_root, readahead)
 
-    def __init__(self, peer_chunk2, tx_start_offset, start_offset, end_offset, tx_root, data_root):
+    def __init__(self, peer_chunk2, tx_start_offset, start_offset, end_offset, tx_root, data_root, readahead = 0, executor = None):
+        '''
+        readahead: the most chunks to fetch and verify in the background
+            ahead of sequential reads. The window grows while reads are
+            sequential and collapses when the stream seeks elsewhere.
+        executor: a concurrent.futures.Executor to fetch with. By default
+            a thread pool of readahead threads is made.
+        '''
+        self.readahead = readahead
+        self.window = 0
+        self.prefetched = {} # requested offset -> future of verified chunk
+        self._own_executor = executor is None and readahead > 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(readahead) if self._own_executor else executor
         self.peer_chunk2 = peer_chunk2.chunk2 if isinstance(peer_chunk2, ar.Peer) else peer_chunk2
         assert end_offset >= start_offset
         self.start = start_offset
@@ -38,6 +67,14 @@ class PeerStream(io.RawIOBase):
         self.tx_root_raw = ar.utils.b64dec_if_not_bytes(tx_root)
         self.data_root_raw = ar.utils.b64dec_if_not_bytes(data_root)
         self.chunk = None
+    def close(self):
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched.clear()
+        if self._own_executor:
+            self.executor.shutdown(wait = False)
+            self._own_executor = False
+        super().close()
     def tell(self):
         return self.offset - self.start
     def readable(self):
@@ -64,7 +101,7 @@ class PeerStream(io.RawIOBase):
                 self.chunk.start_offset > self.offset or
                 self.chunk.end_offset <= self.offset
         ):
-            self.chunk = ar.Chunk.frombytes(self.peer_chunk2(self.offset + self.tx_start), self.tx_root_raw, self.data_root_raw)
+            self.chunk = self._next_chunk()
             assert self.chunk.start_offset <= self.offset
             assert self.chunk.end_offset > self.offset
 
@@ -77,6 +114,105 @@ class PeerStream(io.RawIOBase):
 
         return bytecount
 
+    def _fetch(self, offset):
+        # verification happens here, so readahead does it in the background
+        chunk = self.peer_chunk2(offset + self.tx_start)
+        if isinstance(chunk, ar.Chunk):
+            # already parsed and verified against the roots, as by a
+            # StripedChunkFetcher validating for striped_stream
+            if chunk.tx_root_raw != self.tx_root_raw or chunk.data_root_raw != self.data_root_raw:
+                raise ar.ArweaveException(f'chunk at {offset} was verified against other roots')
+            return chunk
+        return ar.Chunk.frombytes(chunk, self.tx_root_raw, self.data_root_raw)
+
+    def _next_chunk(self):
+        if not self.readahead:
+            return self._fetch(self.offset)
+        offset = self.offset
+        if self.chunk is not None and self.chunk.end_offset == offset:
+            self.window = min(self.readahead, max(1, self.window * 2))
+        else:
+            # a seek: drop what was fetched for elsewhere and start small
+            self.window = 1
+            for key in [key for key in self.prefetched if not offset <= key < offset + DATA_CHUNK_SIZE]:
+                self.prefetched.pop(key).cancel()
+        chunk = self._take_prefetched(offset)
+        if chunk is None:
+            chunk = self._fetch(offset)
+        self._schedule(chunk.end_offset)
+        return chunk
+
+    def _take_prefetched(self, offset):
+        future = self.prefetched.pop(offset, None)
+        if future is None:
+            # chunks are not always DATA_CHUNK_SIZE, so look for a fetch that may hold offset
+            for key in sorted(self.prefetched):
+                if key <= offset < key + DATA_CHUNK_SIZE:
+                    future = self.prefetched.pop(key)
+                    break
+            else:
+                return None
+        try:
+            chunk = future.result()
+        except Exception:
+            logger.info(f'readahead of chunk at {offset + self.tx_start} failed, refetching', exc_info=True)
+            return None
+        if chunk.start_offset <= offset < chunk.end_offset:
+            return chunk
+        return None
+
+    def _schedule(self, next_offset):
+        for key in [key for key in self.prefetched if key < next_offset]:
+            self.prefetched.pop(key).cancel()
+        # chunks are predicted to be DATA_CHUNK_SIZE long
+        for key in range(next_offset, min(self.end, next_offset + self.window * DATA_CHUNK_SIZE), DATA_CHUNK_SIZE):
+            if key not in self.prefetched:
+                self.prefetched[key] = self.executor.submit(self._fetch, key)
+
+class SubStream(io.RawIOBase):
+    '''
+    A read-only window of length bytes at offset into a seekable stream or
+    into a buffer such as an mmap. The underlying stream is sought before
+    every read, so many views can share one source.
+    '''
+    def __init__(self, source, offset, length):
+        self.source = source
+        self.buffer = None if hasattr(source, 'read') else memoryview(source).cast('B')
+        self.start = offset
+        self.end = offset + length
+        self.position = 0
+    def __len__(self):
+        return self.end - self.start
+    def readable(self):
+        return True
+    def seekable(self):
+        return True
+    def tell(self):
+        return self.position
+    def seek(self, offset, whence = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.end - self.start
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self.position = offset
+        return offset
+    def readinto(self, b):
+        size = min(memoryview(b).nbytes, self.end - self.start - self.position)
+        if size <= 0:
+            return 0
+        start = self.start + self.position
+        if self.buffer is not None:
+            data = self.buffer[start:start+size]
+        else:
+            self.source.seek(start)
+            data = self.source.read(size)
+            size = len(data)
+        memoryview(b).cast('B')[:size] = data
+        self.position += size
+        return size
+
 class GatewayStream:
     @classmethod
     def from_txid(cls, peer, txid, offset = 0, length = None):
@@ -2,7 +2,10 @@ import json
 import os
 import io
 import hashlib
+import threading
+import time
 from jose import jwk
+from Crypto.PublicKey import RSA
 from .utils import (
     winston_to_ar,
     ar_to_winston,
@@ -12,28 +15,137 @@ from .utils import (
     b64enc, b64dec,
     arbinenc, arbindec,
     arintenc, arintdec,
-    utf8dec_if_bytes
+    utf8dec_if_bytes,
+    raw_owner_to_raw_address,
+    Cursor,
 )
 from .peer import Peer
-from .wallet import Wallet
-from .utils.deep_hash import deep_hash
-from .utils.merkle import compute_root_hash, generate_transaction_chunks
+from .wallet import Wallet, verify_pss
+from .utils.deep_hash import deep_hash, Blob
+from .utils.merkle import compute_root_hash, ChunkSpool
 from . import logger, ArweaveException
 
+# the fields of a binary tx after its format byte and id, before its tags;
+# the integers are kept as their raw bytes, as TxHeader.tobytes must
+# reproduce them
+TX_FIELDS = (
+    ('last_tx',     'bin',  8),
+    ('owner',       'bin', 16),
+    ('target',      'bin',  8),
+    ('quantity',    'bin',  8),
+    ('data_size',   'bin', 16),
+    ('data_root',   'bin',  8),
+    ('signature',   'bin', 16),
+    ('reward',      'bin',  8),
+    ('data',        'bin', 24),
+)
+_TX_FIELD_SIZE_BYTES = tuple(bits // 8 for name, read, bits in TX_FIELDS)
+
+def _read_tx(cursor):
+    '''
+    Decode a length-prefixed binary tx. Returns a base64 id for a bare
+    32-byte id, or (format, id_raw, fields, tags_raw) with fields in
+    TX_FIELDS order and tags_raw in serialized order.
+    '''
+    size = cursor.uint(3)
+    if size == 32:
+        return b64enc(cursor.fixed(32))
+    # the tx is read once and its fields sliced from it: txs are decoded
+    # by the thousand, and this is several times faster than a cursor
+    # method call per field
+    bintx = cursor.fixed(size)
+    fields = []
+    offset = 33
+    for size_bytes in _TX_FIELD_SIZE_BYTES:
+        start = offset + size_bytes
+        offset = start + int.from_bytes(bintx[offset:start], 'big')
+        fields.append(bintx[start:offset])
+    tags_raw = []
+    tags_end = offset + 2
+    for tag_idx in range(int.from_bytes(bintx[offset:tags_end], 'big')):
+        # a 2-byte name size then a 2-byte value size
+        name_start = tags_end + 4
+        sizes = int.from_bytes(bintx[tags_end:name_start], 'big')
+        name_end = name_start + (sizes >> 16)
+        tags_end = name_end + (sizes & 0xffff)
+        tags_raw.append((bintx[name_start:name_end], bintx[name_end:tags_end]))
+    # slices stop at the end of the tx, so an overrun shows as a longer offset
+    if tags_end != size:
+        raise ArweaveException('tx of {} bytes decoded as {}'.format(size, tags_end))
+    return bintx[0], bintx[1:33], fields, tags_raw
+
+def _arint_from_raw(raw):
+    # as arintdec decodes an empty integer
+    return int.from_bytes(raw, 'big') if raw else None
+
+class TxOracle:
+    '''
+    Fetches and caches the network values that building a transaction
+    needs, the anchor and the price, so many transactions can share them.
+
+    peer: the Peer to ask, by default a new Peer()
+    ttl: seconds a fetched value is reused for
+    '''
+    def __init__(self, peer = None, ttl = 60):
+        self.peer = peer if peer is not None else Peer()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.anchor_cache = None
+        self.price_cache = {}
+
+    def anchor(self):
+        with self.lock:
+            if self.anchor_cache is not None and time.monotonic() < self.anchor_cache[0]:
+                return self.anchor_cache[1]
+        anchor = self.peer.tx_anchor()
+        with self.lock:
+            self.anchor_cache = (time.monotonic() + self.ttl, anchor)
+        return anchor
+
+    def price(self, data_size, target_address = None):
+        key = (int(data_size), target_address)
+        with self.lock:
+            cached = self.price_cache.get(key)
+            if cached is not None and time.monotonic() < cached[0]:
+                return cached[1]
+        price = self.peer.price(data_size, target_address)
+        with self.lock:
+            now = time.monotonic()
+            self.price_cache = {key: value for key, value in self.price_cache.items() if now < value[0]}
+            self.price_cache[key] = (now + self.ttl, price)
+        return price
+
 class Transaction(object):
-    def __init__(self, wallet, **kwargs):
-        self.jwk_data = wallet.jwk_data
-        self.jwk = jwk.construct(self.jwk_data, algorithm='RS256')
+    def __init__(self, wallet = None, **kwargs):
+        '''
+        Nothing here touches the network. The anchor (last_tx) and reward
+        may be passed; otherwise they are fetched when first needed, from
+        oracle if one is passed, or else from the wallet's and
+        transaction's peers.
+
+        wallet: the Wallet to sign with, or None with owner passed instead
+        '''
         self.wallet = wallet
+        if wallet is not None:
+            self.jwk_data = wallet.jwk_data
+        else:
+            self.jwk_data = {
+                'kty': 'RSA',
+                'e': 'AQAB',
+                'n': kwargs.get('owner', ''),
+            }
+        self._jwk = None
 
         self.id = kwargs.get('id', '')
-        self.last_tx = wallet.get_last_transaction_id()
+        self._last_tx = kwargs.get('last_tx', None)
         self.owner = self.jwk_data.get('n')
         self.tags = []
         self.format = kwargs.get('format', 2)
 
-        self.peer = Peer()
+        self.oracle = kwargs.get('oracle', None)
+        self._peer = kwargs.get('peer', None)
         self.chunks = None
+        self.reward = None
 
         data = kwargs.get('data', '')
         self.data_size = len(data)
@@ -49,10 +161,19 @@ class Transaction(object):
         self.file_handler = kwargs.get('file_handler', None)
         if self.file_handler:
             self.uses_uploader = True
-            self.data_size = os.stat(kwargs['file_path']).st_size
+            if 'file_path' in kwargs:
+                self.data_size = os.stat(kwargs['file_path']).st_size
+            else:
+                self.data_size = len(Blob(self.file_handler))
         else:
             self.uses_uploader = False
 
+        # a ChunkSpool holding data already passed through the merkle builder
+        self.spool = kwargs.get('spool', None)
+        if self.spool is not None:
+            self.uses_uploader = True
+            self.data_size = self.spool.size
+
         if kwargs.get('transaction'):
             self.from_serialized_transaction(kwargs.get('transaction'))
         else:
@@ -75,73 +196,45 @@ class Transaction(object):
                 # convert to winston
                 self.quantity = ar_to_winston(float(self.quantity))
 
-            reward = kwargs.get('reward', None)
-            if reward is not None:
-                self.reward = reward
+            self.reward = kwargs.get('reward', None)
 
             self.signature = ''
             self.status = None
 
     @classmethod
     def frombytes(cls, bytes):
-        stream = io.BytesIO(bytes)
-        tx = cls.fromstream(stream)
-        assert stream.tell() == len(bytes)
+        cursor = Cursor(bytes)
+        tx = cls.fromcursor(cursor)
+        cursor.expect_end()
         return tx
 
     @classmethod
     def fromstream(cls, stream):
-        bintx = arbindec(stream, 24)
-        if len(bintx) == 32:
-            return b64enc(bintx)
-        stream = io.BytesIO(bintx)
-        format = stream.read(1)[0]
-        id_raw = stream.read(32)
-        last_tx_raw = arbindec(stream, 8)
-        owner_raw = arbindec(stream, 16)
-        target_raw = arbindec(stream, 8)
-        quantity = arintdec(stream, 8)
-        data_size = arintdec(stream, 16)
-        data_root_raw = arbindec(stream, 8)
-        signature_raw = arbindec(stream, 16)
-        reward = arintdec(stream, 8)
-        data_raw = arbindec(stream, 24)
-
-        tags_count = int.from_bytes(stream.read(2), 'big')
-
-        tags = [None]*tags_count
-        for tag_idx in range(tags_count):
-            name_size = int.from_bytes(stream.read(2), 'big')
-            value_size = int.from_bytes(stream.read(2), 'big')
-            name = stream.read(name_size)
-            value = stream.read(value_size)
-            tag = create_tag(name, value, format == 2)
-            tags[tags_count - 1 - tag_idx] = tag
-
-        assert stream.tell() == len(bintx)
-
-        wallet = Wallet(
-            jwk_data = {
-                'kty': 'RSA',
-                'e': 'AQAB',
-                'n': b64enc(owner_raw)
-            }
-        )
-        wallet.get_last_transaction_id = lambda: b64enc(last_tx_raw)
+        with Cursor.fromstream(stream) as cursor:
+            return cls.fromcursor(cursor)
+
+    @classmethod
+    def fromcursor(cls, cursor):
+        decoded = _read_tx(cursor)
+        if type(decoded) is str:
+            return decoded
+        format, id_raw, fields, tags_raw = decoded
+        last_tx, owner, target, quantity, data_size, data_root, signature, reward, data = fields
 
         tx = cls(
             format = format,
             id = b64enc(id_raw),
-            wallet = wallet,
-            target = b64enc(target_raw),
-            quantity = winston_to_ar(quantity),
-            reward = str(reward),
-            data = data_raw,
+            owner = b64enc(owner),
+            last_tx = b64enc(last_tx),
+            target = b64enc(target),
+            quantity = winston_to_ar(_arint_from_raw(quantity)),
+            reward = str(_arint_from_raw(reward)),
+            data = data,
         )
-        tx.data_size = data_size
-        tx.data_root = b64enc(data_root_raw)
-        tx.signature = b64enc(signature_raw)
-        tx.tags = tags
+        tx.data_size = _arint_from_raw(data_size)
+        tx.data_root = b64enc(data_root)
+        tx.signature = b64enc(signature)
+        tx.tags = [create_tag(name, value, format == 2) for name, value in tags_raw[::-1]]
         return tx
 
     def tobytes(self):
@@ -164,9 +257,40 @@ class Transaction(object):
                 len(tag['value']).to_bytes(2, 'big'),
                 tag['name'],
                 tag['value']
-            )) for tag in self.tags)
+            )) for tag in self.tags[::-1])
         )), 24)
 
+    @property
+    def jwk(self):
+        if self._jwk is None:
+            self._jwk = jwk.construct(self.jwk_data, algorithm='RS256')
+        return self._jwk
+
+    @property
+    def peer(self):
+        if self._peer is None:
+            self._peer = self.oracle.peer if self.oracle is not None else Peer()
+        return self._peer
+
+    @peer.setter
+    def peer(self, peer):
+        self._peer = peer
+
+    @property
+    def last_tx(self):
+        if self._last_tx is None:
+            if self.oracle is not None:
+                self._last_tx = self.oracle.anchor()
+            elif self.wallet is not None:
+                self._last_tx = self.wallet.get_last_transaction_id()
+            else:
+                self._last_tx = self.peer.tx_anchor()
+        return self._last_tx
+
+    @last_tx.setter
+    def last_tx(self, last_tx):
+        self._last_tx = last_tx
+
     @property
     def api_url(self):
         return self.peer.api_url
@@ -185,7 +309,10 @@ class Transaction(object):
                 'Please supply a string or dict containing json to initialize a serialized transaction')
 
     def get_reward(self, data_size, target_address=None):
-        reward = self.peer.price(data_size, target_address)
+        if self.oracle is not None:
+            reward = self.oracle.price(data_size, target_address)
+        else:
+            reward = self.peer.price(data_size, target_address)
         return str(reward)
 
     def add_tag(self, name, value):
@@ -200,6 +327,9 @@ class Transaction(object):
         self.tags = tags
 
     def sign(self):
+        if self.reward is None:
+            self.reward = self.get_reward(self.data_size, target_address=self.target if len(self.target) > 0 else None)
+
         data_to_sign = self.get_signature_data()
 
         raw_signature = self.wallet.sign(data_to_sign)
@@ -212,13 +342,12 @@ class Transaction(object):
             self.id = self.id.decode()
 
     def verify(self):
-        assert self.wallet.verify(self.get_signature_data(), b64dec(self.signature))
+        public_key = RSA.construct((int.from_bytes(b64dec(self.owner), 'big'), 65537))
+        assert verify_pss(public_key, self.get_signature_data(), b64dec(self.signature))
         assert b64dec(self.id) == hashlib.sha256(b64dec(self.signature)).digest()
         return True
 
     def get_signature_data(self):
-        self.reward = self.get_reward(self.data_size, target_address=self.target if len(self.target) > 0 else None)
-
         if int(self.data_size) > 0 and self.data_root == '' and not self.uses_uploader:
             if type(self.data) == str:
                 root_hash = compute_root_hash(io.BytesIO(b64dec(self.data.encode('utf-8'))))
@@ -235,7 +364,7 @@ class Transaction(object):
                 name, value = decode_tag(tag)
                 tag_str += '{}{}'.format(name.decode(), value.decode())
 
-            owner = b64dec(self.jwk_data['n'].encode())
+            owner = b64dec(self.owner.encode())
             target = b64dec(self.target)
             data = b64dec(self.data)
             quantity = self.quantity.encode()
@@ -252,7 +381,7 @@ class Transaction(object):
 
             signature_data_list = [
                 '2'.encode(),
-                b64dec(self.jwk_data['n'].encode()),
+                b64dec(self.owner.encode()),
                 b64dec(self.target.encode()),
                 str(self.quantity).encode(),
                 self.reward.encode(),
@@ -349,7 +478,12 @@ class Transaction(object):
 
     def prepare_chunks(self):
         if not self.chunks:
-            self.chunks = generate_transaction_chunks(self.file_handler)
+            if self.spool is None:
+                # a seekable file is hashed once here and read again as
+                # chunks are sent, without a copy
+                self.spool = ChunkSpool()
+                self.spool.update_from_file(self.file_handler)
+            self.chunks = self.spool.transaction_chunks()
             self.data_root = self.chunks.get('data_root')
 
         if not self.chunks:
@@ -368,9 +502,7 @@ class Transaction(object):
         proof = self.chunks.get('proofs')[idx]
         chunk = self.chunks.get('chunks')[idx]
 
-        self.file_handler.seek(chunk.min_byte_range)
-
-        chunk_data = self.file_handler.read(chunk.data_size)
+        chunk_data = self.spool.read(chunk.min_byte_range, chunk.data_size)
 
         return {
             'data_root': self.data_root,
@@ -380,6 +512,128 @@ class Transaction(object):
             'chunk': b64enc(chunk_data)
         }
 
+class TxHeader:
+    '''
+    A compact, read-only transaction decoded from its binary form.
+
+    Fields are kept as the raw bytes they were decoded from, with the
+    base64, integer and tag views built on access, so tobytes() returns
+    exactly the input. Use totransaction() for a full Transaction.
+    '''
+    __slots__ = (
+        'format', 'id_raw', 'last_tx_raw', 'owner_raw', 'target_raw',
+        'quantity_raw', 'data_size_raw', 'data_root_raw', 'signature_raw',
+        'reward_raw', 'data_raw', 'tags_raw',
+    )
+
+    def __init__(self, format, id_raw, last_tx_raw, owner_raw, target_raw, quantity_raw, data_size_raw, data_root_raw, signature_raw, reward_raw, data_raw, tags_raw):
+        self.format = format
+        self.id_raw = id_raw
+        self.last_tx_raw = last_tx_raw
+        self.owner_raw = owner_raw
+        self.target_raw = target_raw
+        self.quantity_raw = quantity_raw
+        self.data_size_raw = data_size_raw
+        self.data_root_raw = data_root_raw
+        self.signature_raw = signature_raw
+        self.reward_raw = reward_raw
+        self.data_raw = data_raw
+        # (name, value) pairs in serialized order, which is the reverse of the tx's
+        self.tags_raw = tags_raw
+
+    @classmethod
+    def frombytes(cls, bytes):
+        cursor = Cursor(bytes)
+        tx = cls.fromcursor(cursor)
+        cursor.expect_end()
+        return tx
+
+    @classmethod
+    def fromstream(cls, stream):
+        '''Decode a tx; like Transaction.fromstream, a bare 32-byte id is returned as a base64 string.'''
+        with Cursor.fromstream(stream) as cursor:
+            return cls.fromcursor(cursor)
+
+    @classmethod
+    def fromcursor(cls, cursor):
+        decoded = _read_tx(cursor)
+        if type(decoded) is str:
+            return decoded
+        format, id_raw, fields, tags_raw = decoded
+        return cls(format, id_raw, *fields, tuple(tags_raw))
+
+    def tobytes(self):
+        return arbinenc(b''.join((
+            bytes([self.format]),
+            self.id_raw,
+            arbinenc(self.last_tx_raw, 8),
+            arbinenc(self.owner_raw, 16),
+            arbinenc(self.target_raw, 8),
+            arbinenc(self.quantity_raw, 8),
+            arbinenc(self.data_size_raw, 16),
+            arbinenc(self.data_root_raw, 8),
+            arbinenc(self.signature_raw, 16),
+            arbinenc(self.reward_raw, 8),
+            arbinenc(self.data_raw, 24),
+            len(self.tags_raw).to_bytes(2, 'big'),
+            *(b''.join((
+                len(name).to_bytes(2, 'big'),
+                len(value).to_bytes(2, 'big'),
+                name,
+                value
+            )) for name, value in self.tags_raw)
+        )), 24)
+
+    def totransaction(self):
+        return Transaction.frombytes(self.tobytes())
+
+    @property
+    def id(self):
+        return b64enc(self.id_raw)
+
+    @property
+    def last_tx(self):
+        return b64enc(self.last_tx_raw)
+
+    @property
+    def owner(self):
+        return b64enc(self.owner_raw)
+
+    @property
+    def owner_address(self):
+        return b64enc(raw_owner_to_raw_address(self.owner_raw))
+
+    @property
+    def target(self):
+        return b64enc(self.target_raw)
+
+    @property
+    def quantity(self):
+        return int.from_bytes(self.quantity_raw, 'big')
+
+    @property
+    def data_size(self):
+        return int.from_bytes(self.data_size_raw, 'big')
+
+    @property
+    def data_root(self):
+        return b64enc(self.data_root_raw)
+
+    @property
+    def signature(self):
+        return b64enc(self.signature_raw)
+
+    @property
+    def reward(self):
+        return int.from_bytes(self.reward_raw, 'big')
+
+    @property
+    def tags(self):
+        return [create_tag(name, value, self.format == 2) for name, value in self.tags_raw[::-1]]
+
+    def compute_id_raw(self):
+        return hashlib.sha256(self.signature_raw).digest()
+
 def test_partial():
     for txbytes in TXS_2_5_bytes:
         tx = Transaction.frombytes(txbytes)
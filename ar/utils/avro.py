@@ -0,0 +1,130 @@
+# This file is part of PyArweave.
+# 
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+# 
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+
+# The avro subset used for ANS-104 data item tags: an array of records with
+# bytes fields name and value. Decoding works on any buffer and hands back
+# memoryview slices of it, so nothing is copied until the caller asks.
+
+def decode_long(buf, offset = 0):
+    '''Decode a zigzag varint from buf at offset, returning (value, next offset).'''
+    try:
+        byte = buf[offset]
+        offset += 1
+        if byte < 0x80:
+            return (byte >> 1) ^ -(byte & 1), offset
+        # varint encoding is 7-bit little-endian where the 8th bit indicates whether another byte follows
+        zigzag = byte & 0x7f
+        bits = 7
+        while True:
+            byte = buf[offset]
+            offset += 1
+            zigzag |= (byte & 0x7f) << bits
+            if byte < 0x80:
+                break
+            bits += 7
+    except IndexError:
+        raise ValueError('avro data is truncated')
+    # zigzag encoding has the sign bit in the 1s place
+    return (zigzag >> 1) ^ -(zigzag & 1), offset
+
+def encode_long(num, out):
+    '''Append the zigzag varint encoding of num to the bytearray out.'''
+    # zigzag encoding moves the sign bit to the 1s place
+    zigzag = num << 1
+    if zigzag < 0:
+        zigzag = ~zigzag
+    while zigzag > 0x7f:
+        out.append((zigzag & 0x7f) | 0x80)
+        zigzag >>= 7
+    out.append(zigzag)
+
+def _block_count(buf, offset):
+    # an array is a run of blocks ended by a 0 count; a negative count is followed by the block's byte size
+    if offset >= len(buf):
+        # tolerate a missing terminator, as a stream reader would
+        return 0, offset
+    count, offset = decode_long(buf, offset)
+    if count < 0:
+        block_bytes, offset = decode_long(buf, offset)
+        count = -count
+    return count, offset
+
+def _bytes_end(buf, offset):
+    size, offset = decode_long(buf, offset)
+    end = offset + size
+    if size < 0 or end > len(buf):
+        raise ValueError('avro data is truncated')
+    return offset, end
+
+def scan_tags(buf, offset = 0):
+    '''Return (tag count, end offset) of the tag array at offset, without slicing out any tags.'''
+    buf = memoryview(buf)
+    total = 0
+    while True:
+        count, offset = _block_count(buf, offset)
+        if count == 0:
+            return total, offset
+        total += count
+        for idx in range(count * 2):
+            start, offset = _bytes_end(buf, offset)
+
+def decode_tags(buf, offset = 0):
+    '''Return ([(name, value), ...], end offset) for the tag array at offset, as memoryview slices of buf.'''
+    buf = memoryview(buf)
+    tags = []
+    while True:
+        count, offset = _block_count(buf, offset)
+        if count == 0:
+            return tags, offset
+        for idx in range(count):
+            start, offset = _bytes_end(buf, offset)
+            name = buf[start:offset]
+            start, offset = _bytes_end(buf, offset)
+            tags.append((name, buf[start:offset]))
+
+def iter_tags(buf, offset = 0):
+    '''Yield (name, value) memoryview slices of the tag array at offset, decoding only as far as iterated.'''
+    buf = memoryview(buf)
+    while True:
+        count, offset = _block_count(buf, offset)
+        if count == 0:
+            return
+        for idx in range(count):
+            start, offset = _bytes_end(buf, offset)
+            name = buf[start:offset]
+            start, offset = _bytes_end(buf, offset)
+            yield name, buf[start:offset]
+
+def find_tag(buf, name, offset = 0):
+    '''Return the value of the first tag called name as a memoryview, or None.'''
+    for other_name, value in iter_tags(buf, offset):
+        if other_name == name:
+            return value
+    return None
+
+def encode_tags(tags):
+    '''Encode an iterable of (name, value) bytes-like pairs as one avro tag array.'''
+    tags = list(tags)
+    if len(tags) == 0:
+        return b''
+    out = bytearray()
+    encode_long(len(tags), out)
+    for name, value in tags:
+        encode_long(len(name), out)
+        out += name
+        encode_long(len(value), out)
+        out += value
+    out.append(0)
+    return bytes(out)
@@ -0,0 +1,183 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+class ResponseCache:
+    '''
+    A size-bounded cache of immutable response bodies, keyed by endpoint and
+    identifier, with a memory LRU in front of an optional on-disk LRU.
+
+    Callers decide what is immutable; Peer only stores responses that
+    cannot change, such as blocks below CHECKPOINT_DEPTH.
+
+    path: directory for the disk tier, or None for memory only
+    memory_bytes: bound on the bytes held in memory
+    disk_bytes: bound on the bytes held on disk
+    '''
+    def __init__(self, path = None, memory_bytes = 64 * 1024 * 1024, disk_bytes = 4 * 1024 * 1024 * 1024):
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.lock = threading.Lock()
+        self.memory = collections.OrderedDict()
+        self.memory_size = 0
+        self.disk = collections.OrderedDict()
+        self.disk_size = 0
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(path, exist_ok = True)
+            self._load_disk_index()
+
+    # a .tmp file older than this was left by a writer that died; newer ones
+    # may be another process's put in progress
+    STALE_TMP_SEC = 60 * 60
+
+    def _load_disk_index(self):
+        # files are ordered by mtime, which get() updates, so the lru order persists
+        entries = []
+        stale = time.time() - self.STALE_TMP_SEC
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                filepath = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(filepath)
+                except FileNotFoundError:
+                    # another process renamed or evicted it
+                    continue
+                if filename.endswith('.tmp'):
+                    if stat.st_mtime < stale:
+                        try:
+                            os.unlink(filepath)
+                        except FileNotFoundError:
+                            pass
+                    continue
+                entries.append((stat.st_mtime, filepath, stat.st_size))
+        entries.sort()
+        for mtime, filepath, size in entries:
+            self.disk[filepath] = size
+            self.disk_size += size
+        self._evict_disk()
+
+    def _key(self, endpoint, identifier):
+        return endpoint + '/' + str(identifier)
+
+    def _filepath(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.path, digest[:2], digest)
+
+    def get(self, endpoint, identifier):
+        '''Return the cached content for endpoint and identifier, or None.'''
+        key = self._key(endpoint, identifier)
+        with self.lock:
+            content = self.memory.get(key)
+            if content is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return content
+            if self.path is None:
+                self.misses += 1
+                return None
+            filepath = self._filepath(key)
+            if filepath not in self.disk:
+                self.misses += 1
+                return None
+            self.disk.move_to_end(filepath)
+        try:
+            with open(filepath, 'rb') as file:
+                content = file.read()
+            os.utime(filepath)
+        except FileNotFoundError:
+            with self.lock:
+                size = self.disk.pop(filepath, None)
+                if size is not None:
+                    self.disk_size -= size
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self._put_memory(key, content)
+        return content
+
+    def put(self, endpoint, identifier, content):
+        '''Store immutable content for endpoint and identifier.'''
+        content = bytes(content)
+        key = self._key(endpoint, identifier)
+        with self.lock:
+            self._put_memory(key, content)
+            if self.path is None or len(content) > self.disk_bytes:
+                return
+            filepath = self._filepath(key)
+            if filepath in self.disk:
+                return
+        os.makedirs(os.path.dirname(filepath), exist_ok = True)
+        fd, tmppath = tempfile.mkstemp(dir = os.path.dirname(filepath), suffix = '.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmppath, filepath)
+        with self.lock:
+            if filepath not in self.disk:
+                self.disk[filepath] = len(content)
+                self.disk_size += len(content)
+                self._evict_disk()
+
+    def _put_memory(self, key, content):
+        if len(content) > self.memory_bytes:
+            return
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_size -= len(old)
+        self.memory[key] = content
+        self.memory_size += len(content)
+        while self.memory_size > self.memory_bytes:
+            key, old = self.memory.popitem(last = False)
+            self.memory_size -= len(old)
+
+    def _evict_disk(self):
+        while self.disk_size > self.disk_bytes:
+            filepath, size = self.disk.popitem(last = False)
+            self.disk_size -= size
+            try:
+                os.unlink(filepath)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_size = 0
+            for filepath in self.disk:
+                try:
+                    os.unlink(filepath)
+                except FileNotFoundError:
+                    pass
+            self.disk.clear()
+            self.disk_size = 0
+
+    def state(self):
+        with self.lock:
+            return {
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory_size,
+                'disk_entries': len(self.disk),
+                'disk_bytes': self.disk_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -18,27 +18,105 @@ from Crypto.PublicKey import RSA
 from Crypto.Signature import PKCS1_PSS
 from Crypto.Hash import SHA384
 
+BLOB_READ_SIZE = 1024 * 1024
 
-def deep_hash(data, partial=None):
-    if type(data) == list:
-        tag = b'list' + str(len(data)).encode()
+class Blob:
+    '''
+    A deep hash leaf whose bytes are streamed rather than held in memory.
+
+    source: a file-like object, read from its current position, or an
+            iterable of bytes-like buffers
+    length: the number of bytes in the blob; for seekable files it defaults
+            to the bytes remaining after the current position
+
+    Seekable files are returned to their starting position after hashing, so
+    the same object can then be written out.
+    '''
+    def __init__(self, source, length = None):
+        self.source = source
+        if length is None:
+            if not hasattr(source, 'seek'):
+                raise ValueError('length is needed for unseekable blob sources')
+            start = source.tell()
+            length = source.seek(0, 2) - start
+            source.seek(start)
+        self.length = length
+
+    def __len__(self):
+        return self.length
 
-        return deep_hash_chunks(data[:partial], hashlib.sha384(tag).digest())
+    def __iter__(self):
+        if hasattr(self.source, 'read'):
+            start = self.source.tell() if hasattr(self.source, 'seek') else None
+            remaining = self.length
+            while remaining > 0:
+                buf = self.source.read(min(remaining, BLOB_READ_SIZE))
+                if not buf:
+                    break
+                remaining -= len(buf)
+                yield buf
+            if start is not None:
+                self.source.seek(start)
+        else:
+            yield from self.source
 
+def _blob_hash(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        length = memoryview(data).nbytes
+        data_hash = hashlib.sha384(data).digest()
     else:
-        tag = b'blob' + str(len(data)).encode()
+        if not isinstance(data, Blob):
+            data = Blob(data)
+        length = 0
+        hasher = hashlib.sha384()
+        for buf in data:
+            hasher.update(buf)
+            length += memoryview(buf).nbytes
+        if length != data.length:
+            raise ValueError(f'blob source gave {length} bytes, expected {data.length}')
+        data_hash = hasher.digest()
+    tag = b'blob' + str(length).encode()
+    return hashlib.sha384(hashlib.sha384(tag).digest() + data_hash).digest()
 
-    tagged_hash = hashlib.sha384(tag).digest() + hashlib.sha384(data).digest()
+def _list_tag(items):
+    return hashlib.sha384(b'list' + str(len(items)).encode()).digest()
 
-    return hashlib.sha384(tagged_hash).digest()
+def deep_hash(data, partial=None):
+    '''
+    Hash nested lists of blobs the way arweave signs structures.
 
+    Blobs are bytes-like, or file-like objects and Blob instances whose data
+    is hashed incrementally. When partial is given, only data[:partial] is
+    folded into the top-level accumulator, which lets the remaining items be
+    hashed later with deep_hash_chunks.
 
-def deep_hash_chunks(chunks, acc):
-    if len(chunks) < 1:
-        return acc
+    The nesting is walked with an explicit stack, so long or deep lists do
+    not touch the recursion limit.
+    '''
+    if type(data) != list:
+        return _blob_hash(data)
 
-    hash_pair = acc + deep_hash(chunks[0])
+    # each frame is [accumulator, items, next index, end index]
+    stack = [[_list_tag(data), data, 0, len(range(len(data))[:partial])]]
+    while True:
+        frame = stack[-1]
+        acc, items, index, end = frame
+        if index == end:
+            stack.pop()
+            if not stack:
+                return acc
+            parent = stack[-1]
+            parent[0] = hashlib.sha384(parent[0] + acc).digest()
+            continue
+        frame[2] = index + 1
+        item = items[index]
+        if type(item) == list:
+            stack.append([_list_tag(item), item, 0, len(item)])
+        else:
+            frame[0] = hashlib.sha384(acc + _blob_hash(item)).digest()
 
-    new_acc = hashlib.sha384(hash_pair).digest()
 
-    return deep_hash_chunks(chunks[1:], new_acc)
+def deep_hash_chunks(chunks, acc):
+    for chunk in chunks:
+        acc = hashlib.sha384(acc + deep_hash(chunk)).digest()
+    return acc
@@ -12,9 +12,15 @@
 # You should have received a copy of the GNU General Public License along with
 # PyArweave. If not, see <https://www.gnu.org/licenses/>.
 
+import array
+import collections
+import collections.abc
+import concurrent.futures
 import hashlib
 import struct
 import functools
+import tempfile
+import threading
 from . import concat_buffers, b64enc, b64dec
 from json import JSONEncoder
 
@@ -267,10 +273,27 @@ def chunk_data(file_handler):
     return tuple(chunks)  # lets make this a fast processing tuple for later!
 
 
-def compute_root_hash(file_handler):
-    root_node = generate_tree(file_handler)
+def compute_root_hash(file_handler, workers=None):
+    builder = MerkleBuilder(workers=workers)
+    builder.update_from_file(file_handler)
 
-    return root_node.id_raw
+    return builder.root
+
+
+def compute_chunk_tree_root(data):
+    '''
+    Return the data root the node gives inline data, as it roots format 1
+    transactions in a block's tx tree.
+
+    Unlike compute_root_hash, the data is split as ar_tx:chunk_binary does:
+    into whole chunks followed by the remainder, which is an empty chunk
+    when the size is a multiple of the chunk size, and for no data.
+    '''
+    builder = MerkleBuilder()
+    builder.update(data)
+    if len(data) % MAX_CHUNK_SIZE == 0:
+        builder.add_chunk(b'')
+    return builder.root
 
 
 def generate_leaves(chunks):
@@ -294,57 +317,394 @@ def generate_tree(file_handler):
 
 
 def build_layers(nodes, level=0):
-    nodes_lenth = len(nodes)
+    while len(nodes) >= 2:
+        nodes_lenth = len(nodes)
 
-    if nodes_lenth < 2:
-        left = nodes[0]
-        right = None if nodes_lenth == 1 else nodes[1]
-        root = hash_branch(left, right)
+        next_layer = [];
+        nadd = next_layer.append
 
-        return root
+        for i in range(0, nodes_lenth, 2):
+            left = nodes[i]
+            right = None if i + 1 > (nodes_lenth - 1) else nodes[i + 1]
 
-    next_layer = [];
-    nadd = next_layer.append
+            nadd(hash_branch(left, right))
 
-    for i in range(0, nodes_lenth, 2):
-        left = nodes[i]
-        right = None if i + 1 > (nodes_lenth - 1) else nodes[i + 1]
+        nodes = next_layer
 
-        nadd(hash_branch(left, right))
-
-    return build_layers(next_layer, level + 1)
+    return nodes[0]
 
 
 def generate_proofs(root):
-    proofs = resolve_branch_proofs(root)
-
-    if type(proofs) == Proof:
-        proofs = (proofs,)
-
-    if type(proofs) != tuple:
-        return flatten_list(proofs)
+    proofs = []
+    padd = proofs.append
+
+    # depth first, left to right, without recursion
+    stack = [(root, b'')]
+    while stack:
+        node, proof = stack.pop()
+
+        if node.type == 'leaf':
+            padd(Proof(
+                node.max_byte_range - 1,
+                concat_buffers([proof, node.data_hash, int_to_buffer(node.max_byte_range)])
+            ))
+        elif node.type == 'branch':
+            partial_proof = concat_buffers([
+                proof,
+                node.left_child.id_raw,
+                node.right_child.id_raw,
+                int_to_buffer(node.byte_range)
+            ])
+            stack.append((node.right_child, partial_proof))
+            stack.append((node.left_child, partial_proof))
+        else:
+            raise NodeTypeException('Unexpected node type')
 
-    return flatten_tuple(proofs)
+    return proofs
 
 
-def generate_transaction_chunks(file_handler):
-    chunks = chunk_data(file_handler)
-    leaves = generate_leaves(chunks)
-    root = build_layers(leaves)
-    proofs = generate_proofs(root)
+def generate_transaction_chunks(file_handler, workers=None):
+    builder = MerkleBuilder(keep_proofs=True, workers=workers)
+    builder.update_from_file(file_handler)
 
-    last_chunk = chunks[-1]
-    if last_chunk.max_byte_range - last_chunk.min_byte_range == 0:
-        chunks = chunks[:-1]
-        proofs = proofs[:-1]
+    chunks = tuple(builder.chunks())
+    proofs = [builder.proof(index) for index in range(len(chunks))]
 
     return {
-        'data_root': b64enc(root.id_raw),
+        'data_root': b64enc(builder.root),
         'chunks': chunks,
         'proofs': proofs
     }
 
 
+class MerkleBuilder:
+    '''
+    Computes a data root, and optionally chunk proofs, from data passed a
+    piece at a time.
+
+    The tree is the same as build_layers makes: leaves are paired level by
+    level, and an odd node at the end of a level is promoted unchanged.
+    Each level is either a full ordered list of node ids (keep_proofs=True,
+    about 112 bytes per chunk, for proofs on demand) or only its unpaired
+    node (O(log n) memory, for the root alone).
+
+        builder = MerkleBuilder()
+        builder.update_from_file(file_handler)
+        data_root = builder.root
+
+    With workers set, chunks are hashed on that many threads. hashlib
+    releases the GIL while hashing, so this uses multiple cores. The
+    branch levels hash only 96 bytes per node and stay on the calling
+    thread.
+    '''
+    def __init__(self, keep_proofs=False, chunk_size=MAX_CHUNK_SIZE, workers=None):
+        self.keep_proofs = keep_proofs
+        self.chunk_size = chunk_size
+        self.workers = workers
+        if workers:
+            self._executor = concurrent.futures.ThreadPoolExecutor(workers)
+            self._hashing = collections.deque() # (future of data hash, size), in order
+        else:
+            self._executor = None
+        self.size = 0
+        self.chunk_count = 0
+        self._buffer = bytearray()
+        self._root = None
+        if keep_proofs:
+            # per level, concatenated ids and end offsets of every node
+            self._ids = []
+            self._ends = []
+            self._data_hashes = bytearray()
+        else:
+            # per level, the node waiting for a right sibling, as (id, end)
+            self._pending = []
+
+    def update(self, data):
+        '''Add data, splitting it into chunks of chunk_size.'''
+        buffer = self._buffer
+        if not buffer and len(data) == self.chunk_size:
+            return self.add_chunk(data)
+        buffer += data
+        chunk_size = self.chunk_size
+        if len(buffer) >= chunk_size:
+            view = memoryview(buffer)
+            offset = 0
+            while len(buffer) - offset >= chunk_size:
+                self.add_chunk(view[offset:offset + chunk_size])
+                offset += chunk_size
+            view.release()
+            del buffer[:offset]
+
+    def update_from_file(self, file_handler):
+        '''Add all the data read from a file, or from an iterable of buffers.'''
+        if hasattr(file_handler, 'read'):
+            chunk_size = self.chunk_size
+            while True:
+                data = file_handler.read(chunk_size)
+                if not data:
+                    break
+                self.update(data)
+        else:
+            for data in file_handler:
+                self.update(data)
+
+    def add_chunk(self, data):
+        '''Add one whole chunk of data.'''
+        if self._executor is None:
+            return self._add_leaf(hash_raw(data), len(data))
+        if type(data) is not bytes:
+            # the caller may reuse its buffer
+            data = bytes(data)
+        self._hashing.append((self._executor.submit(hash_raw, data), len(data)))
+        # bound the data held in memory
+        while len(self._hashing) > 2 * self.workers:
+            self._add_hashed()
+
+    def _add_hashed(self):
+        future, data_size = self._hashing.popleft()
+        self._add_leaf(future.result(), data_size)
+
+    def add_chunk_hash(self, data_hash, data_size):
+        '''Add a chunk by its sha256 and size.'''
+        if self._executor is not None:
+            while self._hashing:
+                self._add_hashed()
+        self._add_leaf(data_hash, data_size)
+
+    def _add_leaf(self, data_hash, data_size):
+        assert self._root is None, 'builder already finished'
+        self.size += data_size
+        self.chunk_count += 1
+        end = self.size
+        leaf_id = hash_raw([hash_raw(data_hash), hash_raw(int_to_buffer(end))])
+        if self.keep_proofs:
+            self._data_hashes += data_hash
+        self._add_node(0, leaf_id, end)
+
+    def _add_node(self, level, node_id, end):
+        if self.keep_proofs:
+            while True:
+                if level == len(self._ids):
+                    self._ids.append(bytearray())
+                    self._ends.append(array.array('Q'))
+                ids = self._ids[level]
+                ends = self._ends[level]
+                ids += node_id
+                ends.append(end)
+                if len(ends) % 2:
+                    return
+                left_id = ids[-2*HASH_SIZE:-HASH_SIZE]
+                left_end = ends[-2]
+                node_id = _branch_id(left_id, node_id, left_end)
+                level += 1
+        else:
+            pending = self._pending
+            while True:
+                if level == len(pending):
+                    pending.append(None)
+                left = pending[level]
+                if left is None:
+                    pending[level] = (node_id, end)
+                    return
+                pending[level] = None
+                node_id = _branch_id(left[0], node_id, left[1])
+                level += 1
+
+    def finish(self):
+        '''Hash any buffered partial chunk and promote the unpaired nodes to a root.'''
+        if self._root is not None:
+            return self._root
+        if self._buffer:
+            self.add_chunk(bytes(self._buffer))
+            self._buffer.clear()
+        if self._executor is not None:
+            while self._hashing:
+                self._add_hashed()
+            self._executor.shutdown()
+            self._executor = None
+        if self.chunk_count == 0:
+            raise ValueError('no data to make a merkle root of')
+        if self.keep_proofs:
+            level = 0
+            while len(self._ends[level]) > 1:
+                if len(self._ends[level]) % 2:
+                    # promote the last node unchanged
+                    self._add_node(level + 1, bytes(self._ids[level][-HASH_SIZE:]), self._ends[level][-1])
+                level += 1
+            self._root = bytes(self._ids[level])
+        else:
+            # fold the unpaired nodes right to left, as promotion pairs them
+            carry = None
+            for node in self._pending:
+                if node is None:
+                    continue
+                if carry is None:
+                    carry = node
+                else:
+                    carry = (_branch_id(node[0], carry[0], node[1]), carry[1])
+            self._root = carry[0]
+        return self._root
+
+    @property
+    def root(self):
+        return self.finish()
+
+    def chunks(self):
+        '''Yield a Chunk for each chunk added. Needs keep_proofs.'''
+        self.finish()
+        ends = self._ends[0]
+        hashes = self._data_hashes
+        start = 0
+        for index, end in enumerate(ends):
+            yield Chunk(
+                bytes(hashes[index*HASH_SIZE:(index+1)*HASH_SIZE]),
+                data_size=end - start,
+                min_byte_range=start,
+                max_byte_range=end
+            )
+            start = end
+
+    def proof(self, index):
+        '''Return the Proof of the chunk at index. Needs keep_proofs.'''
+        assert self.keep_proofs
+        self.finish()
+        parts = []
+        # walk from the root down; a node at level k holds leaf index >> k
+        for level in range(len(self._ends) - 2, -1, -1):
+            left = (index >> (level + 1)) << 1
+            ends = self._ends[level]
+            if left + 1 >= len(ends):
+                # promoted, no branch here
+                continue
+            ids = self._ids[level]
+            parts.append(ids[left*HASH_SIZE:(left+2)*HASH_SIZE])
+            parts.append(int_to_buffer(ends[left]))
+        end = self._ends[0][index]
+        parts.append(self._data_hashes[index*HASH_SIZE:(index+1)*HASH_SIZE])
+        parts.append(int_to_buffer(end))
+        return Proof(end - 1, b''.join(parts))
+
+    def proofs(self):
+        '''Yield the Proof of each chunk in order. Needs keep_proofs.'''
+        self.finish()
+        for index in range(self.chunk_count):
+            yield self.proof(index)
+
+
+class ChunkSpool:
+    '''
+    Passes data once through a MerkleBuilder and keeps a way to read it
+    back, so its chunks can be uploaded with proofs once the root is known.
+
+    A seekable file given to update_from_file is hashed in one pass and
+    its chunks are later read back from it, so it is read twice and never
+    copied; it must stay open and unchanged until the upload is done.
+    Other data, or a seekable network stream passed as an iterable of its
+    reads, is kept as it is hashed: up to memory_bytes in memory, and past
+    that in a temporary file in dir.
+
+        spool = ChunkSpool()
+        spool.update_from_file(response)
+        tx = Transaction(wallet, spool=spool)
+        tx.sign()
+        ChunkUploader(tx, peers).upload()
+    '''
+    def __init__(self, memory_bytes=64*1024*1024, chunk_size=MAX_CHUNK_SIZE, workers=None, dir=None):
+        self.builder = MerkleBuilder(keep_proofs=True, chunk_size=chunk_size, workers=workers)
+        self.file = tempfile.SpooledTemporaryFile(max_size=memory_bytes, dir=dir)
+        self.lock = threading.Lock()
+        self.size = 0
+        # a seekable file the data is read back from, and where it started
+        self.source = None
+        self.source_start = 0
+
+    def update(self, data):
+        '''Add data, hashing and storing it.'''
+        if self.source is not None:
+            raise ValueError('the spool reads its data back from its source file')
+        self.builder.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    def update_from_file(self, file_handler):
+        '''Add all the data read from a file, or from an iterable of buffers.'''
+        if hasattr(file_handler, 'read'):
+            chunk_size = self.builder.chunk_size
+            seekable = getattr(file_handler, 'seekable', None)
+            if not self.size and seekable is not None and seekable():
+                self.source = file_handler
+                self.source_start = file_handler.tell()
+                while True:
+                    data = file_handler.read(chunk_size)
+                    if not data:
+                        break
+                    self.builder.update(data)
+                    self.size += len(data)
+                return
+            while True:
+                data = file_handler.read(chunk_size)
+                if not data:
+                    break
+                self.update(data)
+        else:
+            for data in file_handler:
+                self.update(data)
+
+    @property
+    def root(self):
+        return self.builder.root
+
+    def read(self, offset, size):
+        '''Return size bytes of the data from offset.'''
+        with self.lock:
+            if self.source is not None:
+                self.source.seek(self.source_start + offset)
+                return self.source.read(size)
+            self.file.seek(offset)
+            return self.file.read(size)
+
+    def transaction_chunks(self):
+        '''
+        Return the chunks as generate_transaction_chunks does. The proofs
+        are built as they are indexed.
+        '''
+        return {
+            'data_root': b64enc(self.root),
+            'chunks': tuple(self.builder.chunks()),
+            'proofs': _BuilderProofs(self.builder)
+        }
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *params):
+        self.close()
+
+
+class _BuilderProofs(collections.abc.Sequence):
+    def __init__(self, builder):
+        self.builder = builder
+
+    def __len__(self):
+        return self.builder.chunk_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.builder.proof(index)
+
+
+def _branch_id(left_id, right_id, left_end):
+    return hash_raw([hash_raw(left_id), hash_raw(right_id), hash_raw(int_to_buffer(left_end))])
+
+
 def flatten_tuple(inputs):
     flat = [];
     fadd = flat.append
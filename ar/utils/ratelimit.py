@@ -0,0 +1,205 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import abc
+import collections
+import threading
+import time
+
+from .. import logger
+
+class RateLimiter(abc.ABC):
+    '''
+    Request rate limiter used by HTTPClient.
+
+    try_acquire() does not block: it returns None when a request may be made,
+    or the number of seconds to wait before trying again, so callers can wait
+    with time.sleep or asyncio.sleep. release() reports whether the server
+    accepted the request or replied that it was rate limited, so the limit
+    can adapt.
+    '''
+    def __init__(self, requests_per_period, period_sec):
+        self.requests_per_period = requests_per_period
+        self.period_sec = period_sec
+        self.lock = threading.Lock()
+        self.last_acquire = None
+    @abc.abstractmethod
+    def try_acquire(self):
+        pass
+    @abc.abstractmethod
+    def wait_time(self):
+        '''Like try_acquire, but without recording a request.'''
+    @abc.abstractmethod
+    def release(self, success = True):
+        pass
+    @abc.abstractmethod
+    def state(self):
+        '''Return a dict describing the limiter, for showing why requests wait.'''
+    def set_rate(self, requests_per_period, period_sec):
+        '''Replace the configured limit, keeping the requests already made.'''
+        with self.lock:
+            self.requests_per_period = requests_per_period
+            self.period_sec = period_sec
+    def ratelimited(self):
+        return self.wait_time() is not None
+    def suggested(self):
+        '''True if waiting a little before the next request would keep the rate even.'''
+        last_acquire = self.last_acquire
+        if last_acquire is None:
+            return False
+        return time.monotonic() - last_acquire < self.period_sec / self.requests_per_period or self.ratelimited()
+
+class SlidingWindowLimiter(RateLimiter):
+    '''
+    Allows requests_per_period requests in any window of period_sec seconds.
+
+    When the server rate limits anyway, the window is stretched to span the
+    recent requests and the count is dropped to what the server accepted.
+    Each request is recorded in a deque and expired from the front, so
+    acquiring is amortized O(1).
+    '''
+    def __init__(self, requests_per_period, period_sec = 60):
+        super().__init__(requests_per_period, period_sec)
+        self.history = collections.deque()
+        self.limited = collections.deque()
+    def _expire(self, now):
+        expired = now - self.period_sec
+        history = self.history
+        while history and history[0] < expired:
+            history.popleft()
+        limited = self.limited
+        while limited and limited[0] < expired:
+            limited.popleft()
+    def _wait_time(self, now):
+        self._expire(now)
+        if len(self.history) + len(self.limited) < self.requests_per_period:
+            return None
+        oldest = min(queue[0] for queue in (self.history, self.limited) if queue)
+        return max(0, oldest + self.period_sec - now)
+    def wait_time(self):
+        with self.lock:
+            return self._wait_time(time.monotonic())
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            duration = self._wait_time(now)
+            if duration is None:
+                self.history.append(now)
+                self.last_acquire = now
+            return duration
+    def release(self, success = True):
+        with self.lock:
+            if success:
+                self.limited.clear()
+                return
+            now = time.monotonic()
+            self._expire(now)
+            self.limited.append(now)
+            if self.history:
+                self.period_sec = max(self.period_sec, now - self.history[0])
+            accepted = len(self.history) - len(self.limited)
+            if accepted <= self.requests_per_period:
+                self.requests_per_period = max(1, accepted)
+        logger.info(f'Rate limit hit. Dropped rate to {self.requests_per_period}/{self.period_sec}s.')
+    def state(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self._wait_time(now)
+            return {
+                'kind': 'sliding_window',
+                'requests_per_period': self.requests_per_period,
+                'period_sec': self.period_sec,
+                'requests_in_window': len(self.history),
+                'ratelimited_in_window': len(self.limited),
+                'available': max(0, self.requests_per_period - len(self.history) - len(self.limited)),
+                'wait_time': wait_time or 0,
+            }
+
+class TokenBucketLimiter(RateLimiter):
+    '''
+    Refills tokens at requests_per_period / period_sec per second, holding up
+    to burst tokens, and spends one per request.
+
+    A rate limited reply halves the refill rate (down to min_rate_per_sec) and
+    empties the bucket. Each accepted request restores a fraction of the
+    configured rate, so a full period of accepted requests recovers it.
+    '''
+    def __init__(self, requests_per_period, period_sec = 60, burst = None, min_rate_per_sec = None):
+        super().__init__(requests_per_period, period_sec)
+        self.burst = burst
+        self.min_rate_per_sec = min_rate_per_sec
+        self._configure()
+        self.tokens = float(self.capacity)
+        self.stamp = time.monotonic()
+    def _configure(self):
+        self.max_rate = self.requests_per_period / self.period_sec
+        self.rate = self.max_rate
+        self.min_rate = self.min_rate_per_sec if self.min_rate_per_sec is not None else self.max_rate / self.requests_per_period
+        self.capacity = self.burst if self.burst is not None else self.requests_per_period
+    def set_rate(self, requests_per_period, period_sec):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.requests_per_period = requests_per_period
+            self.period_sec = period_sec
+            self._configure()
+            self.tokens = min(self.tokens, self.capacity)
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+    def _wait_time(self):
+        if self.tokens >= 1:
+            return None
+        return (1 - self.tokens) / self.rate
+    def wait_time(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return self._wait_time()
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            duration = self._wait_time()
+            if duration is None:
+                self.tokens -= 1
+                self.last_acquire = now
+            return duration
+    def release(self, success = True):
+        with self.lock:
+            if success:
+                if self.rate < self.max_rate:
+                    self.rate = min(self.max_rate, self.rate + self.max_rate / self.capacity)
+                    self._update_period()
+                return
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            self._update_period()
+        logger.info(f'Rate limit hit. Dropped rate to {self.requests_per_period}/{self.period_sec}s.')
+    def _update_period(self):
+        # keep the requests_per_period/period_sec view of the rate current
+        self.requests_per_period = max(1, round(self.rate * self.period_sec))
+    def state(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                'kind': 'token_bucket',
+                'requests_per_period': self.requests_per_period,
+                'period_sec': self.period_sec,
+                'rate_per_sec': self.rate,
+                'max_rate_per_sec': self.max_rate,
+                'tokens': self.tokens,
+                'capacity': self.capacity,
+                'available': max(0, int(self.tokens)),
+                'wait_time': self._wait_time() or 0,
+            }
@@ -1,3 +1,4 @@
+import io
 from jose.utils import base64url_encode, base64url_decode, base64
 from .. import ArweaveException
 
@@ -19,7 +20,7 @@ def b64enc_if_not_str(data):
 def b64dec_if_not_bytes(data):
     if data is None:
         return b''
-    elif isinstance(data, (bytes, bytearray)):
+    elif isinstance(data, (bytes, bytearray, memoryview)):
         return data
     else:
         return base64url_decode(data.encode())
@@ -27,7 +28,7 @@ def b64dec_if_not_bytes(data):
 def utf8enc_if_not_bytes(data):
     if data is None:
         return b''
-    elif isinstance(data, (bytes, bytearray)):
+    elif isinstance(data, (bytes, bytearray, memoryview)):
         return data
     else:
         return data.encode()
@@ -35,8 +36,8 @@ def utf8enc_if_not_bytes(data):
 def utf8dec_if_bytes(data):
     if data is None:
         return None
-    elif isinstance(data, (bytes, bytearray)):
-        return data.decode()
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        return str(data, 'utf-8')
     else:
         return data
 
@@ -104,6 +105,176 @@ def arintdec(stream, bits):
         raise ArweaveException('stream terminated early')
     return int.from_bytes(int_raw, 'big')
 
+class _FieldReader:
+    '''The decoders that Cursor and StreamCursor build on their fixed and uint.'''
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *params):
+        pass
+
+    def arint(self, bits):
+        size = self.uint(bits // 8)
+        if size == 0:
+            return None
+        return self.uint(size)
+
+    def erlint(self, bits):
+        return self.uint(bits // 8)
+
+    def bins(self, count_bits, bits):
+        '''Decode an erlint count followed by that many arbin fields.'''
+        return [self.bin(bits) for idx in range(self.erlint(count_bits))]
+
+    def fixeds(self, count_bits, size):
+        '''Decode an erlint count followed by that many fields of size bytes.'''
+        data = self.fixed(self.erlint(count_bits) * size)
+        return [data[offset:offset + size] for offset in range(0, len(data), size)]
+
+    def read_fields(self, fields, values = None):
+        if values is None:
+            values = {}
+        for name, read, *params in fields:
+            if type(read) is str:
+                values[name] = getattr(self, read)(*params)
+            else:
+                values[name] = read(self, *params)
+        return values
+
+class Cursor(_FieldReader):
+    '''
+    Decodes the binary formats from a buffer at an advancing offset.
+
+    Fields are sliced from a memoryview of the buffer rather than each read
+    into a new object through a stream. Sizes are checked against the end
+    of the buffer, raising ArweaveException if it would be passed. With
+    copy=False byte fields are memoryview slices, so the buffer must outlive
+    them; otherwise each is copied once to bytes.
+
+    The methods match the stream functions: fixed(size) for a field of known
+    size, bin(bits) for arbindec, arint(bits) for arintdec and erlint(bits)
+    for erlintdec. read_fields decodes a table of
+    (name, method name or function, *params) entries into a dict.
+    '''
+    __slots__ = ('view', 'offset', 'end', 'copy')
+
+    def __init__(self, buffer, offset = 0, end = None, copy = True):
+        self.view = buffer if type(buffer) is memoryview else memoryview(buffer)
+        self.offset = offset
+        self.end = len(self.view) if end is None else end
+        self.copy = copy
+
+    @classmethod
+    def fromstream(cls, stream):
+        '''
+        Return a cursor reading from stream, for use as a context manager.
+
+        A BytesIO is decoded in place and its position advanced on exit.
+        Other streams are read field by field, by a StreamCursor, which has
+        the same decoders but no known end.
+        '''
+        if isinstance(stream, io.BytesIO):
+            return _BytesIOCursor(stream)
+        return StreamCursor(stream)
+
+    def remaining(self):
+        return self.end - self.offset
+
+    def expect_end(self):
+        if self.offset != self.end:
+            raise ArweaveException('{} bytes left after decoding'.format(self.end - self.offset))
+
+    def _advance(self, size):
+        offset = self.offset
+        end = offset + size
+        if end > self.end:
+            raise ArweaveException('stream terminated early')
+        self.offset = end
+        return offset, end
+
+    def fixed(self, size):
+        offset = self.offset
+        end = offset + size
+        if end > self.end:
+            raise ArweaveException('stream terminated early')
+        self.offset = end
+        if self.copy:
+            return self.view[offset:end].tobytes()
+        return self.view[offset:end]
+
+    def uint(self, size):
+        '''Decode a big-endian unsigned integer of size bytes.'''
+        offset = self.offset
+        end = offset + size
+        if end > self.end:
+            raise ArweaveException('stream terminated early')
+        self.offset = end
+        return int.from_bytes(self.view[offset:end], 'big')
+
+    def sub(self, size):
+        '''Return a cursor over the next size bytes, and skip them.'''
+        offset, end = self._advance(size)
+        return Cursor(self.view, offset, end, self.copy)
+
+    def bin(self, bits):
+        # inlined, as this is most of the fields of blocks and txs
+        offset = self.offset
+        start = offset + bits // 8
+        if start > self.end:
+            raise ArweaveException('stream terminated early')
+        end = start + int.from_bytes(self.view[offset:start], 'big')
+        if end > self.end:
+            raise ArweaveException('stream terminated early')
+        self.offset = end
+        if self.copy:
+            return self.view[start:end].tobytes()
+        return self.view[start:end]
+
+class StreamCursor(_FieldReader):
+    '''
+    Decodes the binary formats field by field from a stream of unknown
+    length. Its end is not known, so expect_end checks nothing.
+    '''
+    __slots__ = ('stream',)
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def expect_end(self):
+        pass
+
+    def fixed(self, size):
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise ArweaveException('stream terminated early')
+        return data
+
+    def uint(self, size):
+        return int.from_bytes(self.fixed(size), 'big')
+
+    def sub(self, size):
+        return Cursor(self.fixed(size))
+
+    def bin(self, bits):
+        return self.fixed(self.uint(bits // 8))
+
+class _BytesIOCursor(Cursor):
+    __slots__ = ('stream',)
+
+    def __init__(self, stream):
+        self.stream = stream
+        super().__init__(stream.getbuffer(), stream.tell())
+
+    def expect_end(self):
+        pass
+
+    def __exit__(self, *params):
+        self.stream.seek(self.offset)
+        # the BytesIO cannot be resized while its buffer is exported
+        self.view.release()
+
 class AutoRaw:
     def __getattr(self, attr):
         return super().__getattribute__(attr)
@@ -157,3 +328,73 @@ class AutoRaw:
                 if not self.__hasprop(raw_attr) and self.__hasattr(raw_attr):
                     return super().__setattr__(raw_attr, b64dec(val))
         return super().__setattr__(attr, val)
+
+# Declared, slotted fields with both raw and base64url views.
+#
+#   @b64_fields
+#   class POA:
+#       __slots__ = ('option', *b64_slots('tx_path', 'chunk'))
+#
+# gives POA.tx_path (text) and POA.tx_path_raw (bytes). The value is kept in
+# whichever form it was assigned and the other is converted once, on first
+# read. Lists convert item by item. Assigning bytes to the text view stores
+# them raw, so constructors can take either form.
+
+_UNCONVERTED = object()
+
+def b64_slots(*names):
+    '''Return the slot names holding the raw and text forms of names.'''
+    return tuple(
+        slot
+        for name in names
+        for slot in ('_' + name + '_raw', '_' + name + '_b64')
+    )
+
+def _to_raw(value):
+    if type(value) is list or type(value) is tuple:
+        return [b64dec(item) for item in value]
+    return b64dec(value)
+
+def _to_b64(value):
+    if value is None:
+        return None
+    if type(value) is list or type(value) is tuple:
+        return [b64enc(item) for item in value]
+    return b64enc(value)
+
+class B64Field:
+    '''One view, text or raw, of a field declared with b64_slots.'''
+    __slots__ = ('own', 'other', 'convert', 'raw')
+    def __init__(self, cls, name, raw):
+        raw_slot = cls.__dict__['_' + name + '_raw']
+        b64_slot = cls.__dict__['_' + name + '_b64']
+        self.raw = raw
+        if raw:
+            self.own, self.other, self.convert = raw_slot, b64_slot, _to_raw
+        else:
+            self.own, self.other, self.convert = b64_slot, raw_slot, _to_b64
+    def __get__(self, obj, cls = None):
+        if obj is None:
+            return self
+        value = self.own.__get__(obj)
+        if value is _UNCONVERTED:
+            value = self.convert(self.other.__get__(obj))
+            self.own.__set__(obj, value)
+        return value
+    def __set__(self, obj, value):
+        own, other = self.own, self.other
+        if not self.raw:
+            first = value[0] if (type(value) is list or type(value) is tuple) and value else value
+            if isinstance(first, (bytes, bytearray, memoryview)):
+                own, other = other, own
+        own.__set__(obj, value)
+        other.__set__(obj, _UNCONVERTED)
+
+def b64_fields(cls):
+    '''Class decorator adding the views of the fields declared with b64_slots.'''
+    for slot in cls.__slots__:
+        if slot.startswith('_') and slot.endswith('_b64'):
+            name = slot[1:-4]
+            setattr(cls, name, B64Field(cls, name, raw = False))
+            setattr(cls, name + '_raw', B64Field(cls, name, raw = True))
+    return cls
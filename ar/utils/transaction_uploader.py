@@ -12,16 +12,19 @@
 # You should have received a copy of the GNU General Public License along with
 # PyArweave. If not, see <https://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import json
 import arrow
+import os
 import random
+import threading
 import time
 import requests
 import logging
 from jose.utils import base64url_encode, base64url_decode
 from ..transaction import Transaction
 from ..peer import Peer
-from .. import DEFAULT_API_URL
+from .. import DEFAULT_API_URL, ArweaveException
 from . import *
 from .merkle import validate_path, CHUNK_SIZE
 
@@ -81,7 +84,7 @@ class TransactionUploader:
             'lastRequestTimeEnd': self.last_request_time_end,
             'lastResponseStatus': self.last_response_status,
             'lastResponseError': self.last_response_error,
-            'lastResponseError': self.tx_posted
+            'txPosted': self.tx_posted
         }
 
         return json.dumps(data)
@@ -91,11 +94,13 @@ class TransactionUploader:
             data = json.loads(data)
 
         self.chunk_index = data['chunkIndex']
-        self.transaction = Transaction.from_serialized_transaction(data['transaction'])
-        self.last_request_time_end = arrow.now(data['lastRequestTimeEnd']).timestamp
+        self.transaction = Transaction(file_handler=self.file_handler, transaction=data['transaction'])
+        self.transaction.prepare_chunks()
+        self.transaction.data = b''
+        self.last_request_time_end = data['lastRequestTimeEnd']
         self.last_response_status = data['lastResponseStatus']
         self.last_response_error = data['lastResponseError']
-        self.tx_posted = data['lastResponseError']
+        self.tx_posted = data['txPosted']
 
     def upload_chunk(self):
         if self.is_complete:
@@ -234,6 +239,241 @@ class TransactionUploader:
         self.tx_posted = True
 
 
+class UploadJournal:
+    '''
+    A durable, append-only record of which chunk offsets each peer has
+    acknowledged for one data_root, so an interrupted upload resumes
+    without sending them again.
+
+    Each line is JSON. Lines are flushed as they are written and synced to
+    disk every sync_every records and on close.
+    '''
+    def __init__(self, path, sync_every = 64):
+        self.path = path
+        self.sync_every = sync_every
+        self.lock = threading.Lock()
+        self.acked = {}  # (data_root, peer url) -> set of offsets
+        self.posted = set()  # (data_root, peer url) whose tx header was accepted
+        self.unsynced = 0
+        torn = False
+        if os.path.exists(path):
+            with open(path) as journal:
+                for line in journal:
+                    torn = not line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        # a torn final line from a crash
+                        continue
+                    key = (record['data_root'], record['peer'])
+                    if 'offset' in record:
+                        self.acked.setdefault(key, set()).add(record['offset'])
+                    else:
+                        self.posted.add(key)
+        self.file = open(path, 'a')
+        if torn:
+            self.file.write('\n')
+
+    def is_acked(self, data_root, peer, offset):
+        with self.lock:
+            return offset in self.acked.get((data_root, peer), ())
+
+    def is_posted(self, data_root, peer):
+        with self.lock:
+            return (data_root, peer) in self.posted
+
+    def ack(self, data_root, peer, offset):
+        self._write({'data_root': data_root, 'peer': peer, 'offset': offset})
+        with self.lock:
+            self.acked.setdefault((data_root, peer), set()).add(offset)
+
+    def post(self, data_root, peer):
+        self._write({'data_root': data_root, 'peer': peer, 'tx': True})
+        with self.lock:
+            self.posted.add((data_root, peer))
+
+    def _write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every:
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *params):
+        self.close()
+
+
+class ChunkUploader:
+    '''
+    Posts a transaction's chunks concurrently to several peers.
+
+    Every chunk is sent to every peer through Peer.send_chunk, so each
+    peer's connection pool and rate limiter apply. At most window chunk
+    posts are in flight at once. A retryable failure is retried with
+    backoff; a fatal reply such as an invalid proof raises. upload() also
+    raises if some chunk reached no peer, after sending everything else.
+    With a journal, acknowledged chunks are recorded and skipped when
+    resuming, so uploading again retries only what is missing.
+
+    transaction: a signed Transaction whose chunks can be prepared,
+        usually one made with a file_handler
+    peers: Peers or api urls to upload to
+    journal: an UploadJournal or a path for one, or None
+    progress: called with state() after each acknowledgement
+    '''
+    def __init__(self, transaction, peers, journal = None, window = 16, retries = 8, post_tx = True, progress = None, report_every = 30):
+        self.transaction = transaction
+        self.peers = [Peer(peer) if isinstance(peer, str) else peer for peer in peers]
+        self.owns_journal = isinstance(journal, str)
+        self.journal = UploadJournal(journal) if self.owns_journal else journal
+        self.window = window
+        self.retries = retries
+        self.post_tx = post_tx
+        self.progress = progress
+        self.report_every = report_every
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.chunks_acked = 0
+        self.chunks_skipped = 0
+        self.failures = {}  # peer url -> count of chunks given up on
+        self.undelivered = [] # offsets of chunks no peer acknowledged
+        self.start_time = None
+        self.last_report = 0
+
+    def state(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.start_time if self.start_time is not None else 0
+            return {
+                'bytes_sent': self.bytes_sent,
+                'chunks_acked': self.chunks_acked,
+                'chunks_skipped': self.chunks_skipped,
+                'failures': dict(self.failures),
+                'elapsed': elapsed,
+                'bytes_per_sec': self.bytes_sent / elapsed if elapsed else 0,
+            }
+
+    def _post_tx(self):
+        data_root = self.transaction.data_root
+        accepted = 0
+        for peer in self.peers:
+            if self.journal is not None and self.journal.is_posted(data_root, peer.api_url):
+                accepted += 1
+                continue
+            try:
+                peer.send_tx(json.loads(self.transaction.json_data))
+            except Exception as exc:
+                logger.warning('{} did not accept tx {}: {}'.format(peer.api_url, self.transaction.id, exc))
+                continue
+            accepted += 1
+            if self.journal is not None:
+                self.journal.post(data_root, peer.api_url)
+        if accepted == 0:
+            raise TransactionUploaderException('No peer accepted transaction {}'.format(self.transaction.id))
+
+    def _send(self, peer, chunk):
+        for attempt in range(self.retries):
+            try:
+                peer.send_chunk(chunk)
+                return True
+            except ArweaveException as exc:
+                error = str(exc)
+                if any(fatal in error for fatal in FATAL_CHUNK_UPLOAD_ERRORS):
+                    raise TransactionUploaderException(
+                        'Fatal error uploading chunk at {} to {}: {}'.format(chunk['offset'], peer.api_url, error))
+                logger.info('retrying chunk at {} to {}: {}'.format(chunk['offset'], peer.api_url, error))
+            except Exception as exc:
+                logger.info('retrying chunk at {} to {}: {}'.format(chunk['offset'], peer.api_url, exc))
+            if attempt + 1 < self.retries:
+                time.sleep(min(2 ** attempt, 30) * (1 - random.random() * 0.3))
+        return False
+
+    def _acked(self, peer, chunk):
+        if self.journal is not None:
+            self.journal.ack(chunk['data_root'], peer.api_url, int(chunk['offset']))
+        with self.lock:
+            self.chunks_acked += 1
+            self.bytes_sent += len(chunk['chunk']) * 3 // 4
+            report = time.monotonic() - self.last_report >= self.report_every
+            if report:
+                self.last_report = time.monotonic()
+        if report:
+            state = self.state()
+            logger.info('{}: {} chunks, {:.1f} KiB/s'.format(self.transaction.id, state['chunks_acked'], state['bytes_per_sec'] / 1024))
+        if self.progress is not None:
+            self.progress(self.state())
+
+    def upload(self):
+        '''Upload everything not yet acknowledged and return state().'''
+        try:
+            self._upload()
+        finally:
+            if self.owns_journal:
+                self.journal.close()
+        return self.state()
+
+    def _upload(self):
+        self.start_time = time.monotonic()
+        self.last_report = self.start_time
+        self.transaction.prepare_chunks()
+        if self.post_tx:
+            self._post_tx()
+        data_root = self.transaction.data_root
+        pending = set()
+        with concurrent.futures.ThreadPoolExecutor(self.window) as executor:
+            for index, chunk in enumerate(self.transaction.chunks['chunks']):
+                # a chunk's proof offset is its last byte
+                offset = chunk.max_byte_range - 1
+                peers = [
+                    peer for peer in self.peers
+                    if self.journal is None or not self.journal.is_acked(data_root, peer.api_url, offset)
+                ]
+                with self.lock:
+                    self.chunks_skipped += len(self.peers) - len(peers)
+                if not peers:
+                    continue
+                chunk = self.transaction.get_chunk(index)
+                # [sends left, delivered], shared by the chunk's sends
+                outcome = [len(peers), len(peers) < len(self.peers)]
+                for peer in peers:
+                    while len(pending) >= self.window:
+                        self._collect(pending, concurrent.futures.FIRST_COMPLETED)
+                    future = executor.submit(self._send, peer, chunk)
+                    future.peer, future.chunk, future.outcome = peer, chunk, outcome
+                    pending.add(future)
+            while pending:
+                self._collect(pending, concurrent.futures.ALL_COMPLETED)
+        if self.undelivered:
+            raise TransactionUploaderException('{} chunks of {} reached no peer, the first at offset {}'.format(
+                len(self.undelivered), self.transaction.id, min(self.undelivered)))
+
+    def _collect(self, pending, return_when):
+        done, not_done = concurrent.futures.wait(pending, return_when = return_when)
+        pending.difference_update(done)
+        for future in done:
+            outcome = future.outcome
+            outcome[0] -= 1
+            if future.result():
+                outcome[1] = True
+                self._acked(future.peer, future.chunk)
+            else:
+                with self.lock:
+                    self.failures[future.peer.api_url] = self.failures.get(future.peer.api_url, 0) + 1
+            if outcome[0] == 0 and not outcome[1]:
+                self.undelivered.append(int(future.chunk['offset']))
+
+
 def get_transaction_offset(tx_id, api_url = DEFAULT_API_URL):
     return Peer(api_url).tx_offset(tx_id)
 
@@ -273,22 +513,24 @@ def download_chunked_data(tx_id, file_handler=None):
             file_handler.write(chunk_data)
 
 
-def from_serialized(self, file_handler, json_str):
+def from_serialized(file_handler, json_str):
     if json_str is None:
         raise TransactionUploaderException('Serialized object does not match expected format')
 
     serialized = json.loads(json_str)
 
-    if type(serialized.chunk_index) != int or type(serialized.transaction) != object:
+    if type(serialized.get('chunkIndex')) != int or type(serialized.get('transaction')) != dict:
         raise TransactionUploaderException('Serialized object does not match expected format')
 
     upload = TransactionUploader(
         file_handler=file_handler,
         transaction=Transaction(
             file_handler=file_handler,
-            transaction=serialized.transaction
+            transaction=serialized['transaction']
         )
     )
+    upload.load_from_json(serialized)
+    return upload
 
 
 def from_transaction_id(file_handler, transaction_str, wallet, api_url=DEFAULT_API_URL):
@@ -12,6 +12,18 @@ from . import DEFAULT_API_URL
 from .peer import Peer
 
 
+def verify_pss(rsa, message, signed_data):
+    h = SHA256.new(message)
+    for salt_length in [
+        rsa.size_in_bytes() - h.digest_size - 2,
+        32,
+        0,
+    ]:
+        if PKCS1_PSS.new(rsa, saltLen=salt_length).verify(h, signed_data):
+            return True
+    else:
+        return False
+
 class Wallet(object):
     HASH = 'sha256'
 
@@ -68,16 +80,7 @@ class Wallet(object):
         return signed_data
 
     def verify(self, message, signed_data):
-        h = SHA256.new(message)
-        for salt_length in [
-            self.rsa.size_in_bytes() - h.digest_size - 2,
-            32,
-            0,
-        ]:
-            if PKCS1_PSS.new(self.rsa, saltLen=salt_length).verify(h, signed_data):
-                return True
-        else:
-            return False
+        return verify_pss(self.rsa, message, signed_data)
 
     def get_last_transaction_id(self):
         self.last_tx = self.peer.tx_anchor()
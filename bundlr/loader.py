@@ -55,25 +55,10 @@ class Loader:
             data = self.preferred.data(txid)
         logger.warning(f'{txid} was not verified') # check the hash tree
         return data
-    FULL_BLOCK_REQ = b'\xff' * 125
     def full_block(self, block):
-        # 2022-06-01: i started implementing this to quickly get validatable tags, but graphql doesn't return a data root, so isn't a quick way to get validatable txs if the peer doesn't have them cached.
-        raise NotImplementedError()
-        if type(block) is int:
-            block = self.peer.block2_height(block, self.FULL_BLOCK_REQ)
-        else:
-            block = self.peer.block2_hash(block, self.FULL_BLOCK_REQ)
-        extra_txs = [txid for txid in block.txs if type(txid) is str]
-        #result = self.graphql('''query {
-        #    transactions(ids:''' + json.dumps(extra_txs) + ''') {
-        #        edges { node {
-        #            id anchor signature recipient owner fee quantity
-        #            data { size }
-        #        } }
-        #    }
-        #}''')
-        print(f'{block.indep_hash} was not verified')
-        
+        '''A block by height or hash with all its txs, fetching any the peer lacks.'''
+        return self.binary_peer.fetch_full_block(block)
+
     def tags(self, txid, bundleid = None, blockid = None):
         if bundleid is not None:
             tags = self.tx_tags(bundleid)
@@ -38,4 +38,7 @@ setup(
     #'git+https://github.com/jtgrassie/pyrx', # for block validation, could be made optional if there is a trusted node
     # note: pyrx is only available via git url; RandomX is on pypi
   ],
+  extras_require={
+    'async': ['aiohttp'], # for ar.asyncpeer
+  },
 )
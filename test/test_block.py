@@ -13,7 +13,12 @@
 # PyArweave. If not, see <https://www.gnu.org/licenses/>.
 
 
-from ar import Peer, Block
+import hashlib, io
+
+from ar import Peer, Block, TxHeader, ArweaveException, DATA_CHUNK_SIZE
+from ar.utils import Cursor, b64enc
+from ar.utils.merkle import Chunk, generate_leaves, build_layers, compute_chunk_tree_root
+from ar._block_testdata2 import BLOCK_1904186_bytes, BLOCK_1904186_json
 import pytest
 
 
@@ -29,5 +34,119 @@ def test_live_block_reserialization():
     assert blockfrombytes.tojson() == blockjson
     assert blockfromjson.tojson() == blockjson
 
+def test_block_reserialization():
+    blockfrombytes = Block.frombytes(BLOCK_1904186_bytes)
+    blockfromjson = Block.fromjson(BLOCK_1904186_json)
+    assert blockfrombytes.tobytes() == BLOCK_1904186_bytes
+    assert blockfromjson.tobytes() == BLOCK_1904186_bytes
+    # tojson does not yet produce the stored json's poa unpacked_chunk
+    assert blockfrombytes.tojson() == blockfromjson.tojson()
+    assert blockfrombytes.compute_indep_hash_raw() == blockfrombytes.indep_hash_raw
+    assert blockfromjson.compute_indep_hash_raw() == blockfromjson.indep_hash_raw
+
+def test_block_fields():
+    block = Block.frombytes(BLOCK_1904186_bytes)
+    assert not hasattr(block, '__dict__') and not hasattr(block.poa, '__dict__')
+    # either view can be assigned, and the other follows
+    signature = block.signature
+    block.signature_raw = bytes(len(block.signature_raw))
+    assert block.signature == 'A' * len(signature)
+    block.signature = signature
+    assert block.compute_indep_hash_raw() == block.indep_hash_raw
+    steps = block.nonce_limiter_info.steps
+    block.nonce_limiter_info.steps = steps
+    assert block.nonce_limiter_info.steps_raw == Block.frombytes(BLOCK_1904186_bytes).nonce_limiter_info.steps_raw
+    with pytest.raises(AttributeError):
+        block.unknown = 1
+
+class Unseekable:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+    def read(self, size):
+        return self.stream.read(size)
+
+def test_block_cursor():
+    expected = Block.frombytes(BLOCK_1904186_bytes).tobytes()
+    # a BytesIO is decoded in place, and left after the block
+    stream = io.BytesIO(BLOCK_1904186_bytes + b'next')
+    assert Block.fromstream(stream).tobytes() == expected
+    assert stream.read() == b'next'
+    stream.write(b'resizable')
+    assert Block.fromstream(Unseekable(BLOCK_1904186_bytes)).tobytes() == expected
+    # fields can be views of the buffer
+    cursor = Cursor(BLOCK_1904186_bytes, copy = False)
+    block = Block.fromcursor(cursor)
+    assert cursor.remaining() == 0
+    assert type(block.poa.chunk_raw) is memoryview
+    assert block.tobytes() == expected
+    assert block.compute_indep_hash_raw() == block.indep_hash_raw
+    with pytest.raises(ArweaveException):
+        Block.frombytes(BLOCK_1904186_bytes[:-1])
+    with pytest.raises(ArweaveException):
+        Block.fromstream(Unseekable(BLOCK_1904186_bytes[:-1]))
+
+def fake_tx(format, data_size, data = b''):
+    data_root = hashlib.sha256(b'root %d' % data_size).digest() if format == 2 else b''
+    return TxHeader(
+        format, hashlib.sha256(b'tx %d %d' % (format, data_size)).digest(), b'', b'', b'', b'',
+        data_size.to_bytes(8, 'big'), data_root, b'', b'', data, ()
+    )
+
+def test_block_tx_offsets():
+    block = Block.frombytes(BLOCK_1904186_bytes)
+    with pytest.raises(ArweaveException):
+        # only ids
+        block.tx_offsets()
+    block.txs = [
+        fake_tx(2, DATA_CHUNK_SIZE * 2),
+        fake_tx(2, 1000),
+        fake_tx(2, 0),
+        fake_tx(1, 5, b'hello'),
+        fake_tx(2, 300000),
+        # a format 1 transfer, and format 1 data of a whole chunk
+        fake_tx(1, 0),
+        fake_tx(1, DATA_CHUNK_SIZE, bytes(DATA_CHUNK_SIZE)),
+    ]
+    # the tree the node builds: the txs sorted by format and then id, with
+    # a padding leaf after each partial chunk
+    ordered = sorted(block.txs, key = lambda tx: (tx.format, tx.id_raw))
+    leaves = []
+    ends = []
+    end = 0
+    for tx in ordered:
+        data_root = compute_chunk_tree_root(tx.data_raw) if tx.format == 1 else tx.data_root_raw
+        leaves.append(Chunk(data_root, tx.data_size, end, end + tx.data_size))
+        end += tx.data_size
+        ends.append(end)
+        if end % DATA_CHUNK_SIZE:
+            padding = DATA_CHUNK_SIZE - end % DATA_CHUNK_SIZE
+            leaves.append(Chunk(b'', padding, end, end + padding))
+            end += padding
+    block.tx_root_raw = build_layers(generate_leaves(leaves)).id_raw
+    block.block_size = end
+    block_start = block.weave_size - end
+
+    tx_offsets = block.tx_offsets()
+    with_data = [idx for idx, tx in enumerate(ordered) if tx.data_size]
+    assert [tx_offset['id'] for tx_offset in tx_offsets] == [ordered[idx].id for idx in with_data]
+    assert [tx_offset['size'] for tx_offset in tx_offsets] == [ordered[idx].data_size for idx in with_data]
+    assert [tx_offset['offset'] - block_start + 1 for tx_offset in tx_offsets] == [ends[idx] for idx in with_data]
+    assert [tx_offset['data_root'] for tx_offset in tx_offsets] == [
+        b64enc(compute_chunk_tree_root(ordered[idx].data_raw)) if ordered[idx].format == 1 else ordered[idx].data_root
+        for idx in with_data
+    ]
+    # the block's own order does not change the tree
+    for txs in (block.txs[::-1], block.txs[2:] + block.txs[:2]):
+        block.txs = txs
+        assert block.compute_tx_root_raw() == block.tx_root_raw
+
+    block.txs[1].data_size_raw = (1001).to_bytes(8, 'big')
+    with pytest.raises(ArweaveException):
+        block.tx_offsets()
+
 if __name__ == '__main__':
     test_live_block_reserialization()
+    test_block_reserialization()
+    test_block_fields()
+    test_block_cursor()
+    test_block_tx_offsets()
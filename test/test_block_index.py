@@ -0,0 +1,168 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib, os, tempfile, threading
+
+import pytest
+
+from ar import Block, BlockIndex
+from ar._block_testdata2 import BLOCK_1904186_bytes
+from ar.utils import arbinenc, arintenc, b64enc
+
+def fake_entries(count):
+    entries = []
+    weave_size = 0
+    for height in range(count):
+        # every third block is empty and has no tx_root
+        if height % 3:
+            weave_size += 1000 * height
+            tx_root = hashlib.sha256(b'root %d' % height).digest()
+        else:
+            tx_root = b''
+        entries.append((hashlib.sha384(b'block %d' % height).digest(), weave_size, tx_root))
+    return entries
+
+def block_index2(entries):
+    # as a node sends it, newest first
+    return b''.join(
+        arbinenc(indep_hash, 8) + arintenc(weave_size, 16) + arbinenc(tx_root, 8)
+        for indep_hash, weave_size, tx_root in entries[::-1]
+    )
+
+def check_index(index, entries):
+    assert len(index) == len(entries)
+    assert index.height == len(entries) - 1
+    for height, (indep_hash, weave_size, tx_root) in enumerate(entries):
+        assert index.indep_hash_raw(height) == indep_hash
+        assert index.weave_size(height) == weave_size
+        assert index.tx_root_raw(height) == tx_root
+        assert index.find_hash(b64enc(indep_hash)) == height
+        if weave_size > entries[height - 1][1]:
+            # the first and last bytes of a block's data
+            assert index.find_offset(entries[height - 1][1]) == (height, b64enc(tx_root))
+            assert index.find_offset(weave_size - 1) == (height, b64enc(tx_root))
+    with pytest.raises(IndexError):
+        index.find_offset(entries[-1][1])
+    with pytest.raises(IndexError):
+        index.weave_size(len(entries))
+
+def test_block_index():
+    entries = fake_entries(50)
+    index = BlockIndex.frombinary(block_index2(entries))
+    check_index(index, entries)
+
+    json_index = BlockIndex.fromjson([
+        {'hash': b64enc(indep_hash), 'weave_size': str(weave_size), 'tx_root': b64enc(tx_root)}
+        for indep_hash, weave_size, tx_root in entries[::-1]
+    ])
+    check_index(json_index, entries)
+
+    # a fork replaces the tip
+    index.truncate(45)
+    assert index.find_hash(entries[47][0]) is None
+    forked = fake_entries(60)[45:]
+    forked[0] = (hashlib.sha384(b'fork').digest(),) + forked[0][1:]
+    index.extend(forked)
+    check_index(index, entries[:45] + forked)
+
+def test_block_index_file():
+    entries = fake_entries(40)
+    with tempfile.TemporaryDirectory() as path:
+        with BlockIndex(path) as index:
+            assert len(index) == 0
+            index.load_binary(block_index2(entries[:30]))
+            index.extend(entries[30:])
+            check_index(index, entries)
+        # a torn append is dropped on reopening
+        with open(os.path.join(path, 'indep_hash'), 'ab') as file:
+            file.write(b'partial')
+        with BlockIndex(path) as index:
+            check_index(index, entries)
+            index.truncate(20)
+        with BlockIndex(path) as index:
+            check_index(index, entries[:20])
+
+def test_block_index_file_readers():
+    entries = fake_entries(400)
+    with tempfile.TemporaryDirectory() as path:
+        with BlockIndex(path) as index:
+            index.extend(entries[:2])
+            done = threading.Event()
+            errors = []
+            def read():
+                try:
+                    while not done.is_set():
+                        height = index.height
+                        index.find_offset(index.weave_size(height) - 1)
+                        index.indep_hash_raw(height)
+                        index.tx_root_raw(height)
+                except Exception as exc:
+                    errors.append(exc)
+            reader = threading.Thread(target = read)
+            reader.start()
+            # each extend remaps the files under the reader
+            for entry in entries[2:]:
+                index.extend([entry])
+            done.set()
+            reader.join()
+            assert errors == []
+            check_index(index, entries)
+
+class ChainPeer:
+    '''Serves block2_height from a chain of blocks made from a template.'''
+    def __init__(self, blocks):
+        self.api_url = 'chain'
+        self.blocks = blocks
+    def height(self):
+        return max(self.blocks)
+    def block2_height(self, height):
+        return self.blocks[height].tobytes()
+
+def chain(index_or_block, heights, label):
+    blocks = {}
+    previous = index_or_block
+    for height in heights:
+        block = Block.frombytes(BLOCK_1904186_bytes)
+        block.height = height
+        block.previous_block_raw = previous
+        block.weave_size = 1000000 * height
+        block.indep_hash_raw = hashlib.sha384(b'%s %d' % (label, height)).digest()
+        blocks[height] = block
+        previous = block.indep_hash_raw
+    return blocks
+
+def test_block_index_update():
+    entries = fake_entries(10)
+    index = BlockIndex.frombinary(block_index2(entries))
+    blocks = chain(entries[-1][0], range(10, 13), b'first')
+    assert index.update(ChainPeer(blocks)) == 12
+    assert index.indep_hash_raw(12) == blocks[12].indep_hash_raw
+    assert index.find_offset(11500000) == (12, blocks[12].tx_root)
+
+    # the peer moved to a fork that replaces blocks 11 and 12
+    forked = {10: blocks[10], **chain(blocks[10].indep_hash_raw, range(11, 14), b'fork')}
+    assert index.update(ChainPeer(forked)) == 13
+    for height in range(10, 14):
+        assert index.indep_hash_raw(height) == forked[height].indep_hash_raw
+    assert index.find_hash(blocks[12].indep_hash_raw) is None
+    check_index(index, entries + [
+        (forked[height].indep_hash_raw, forked[height].weave_size, forked[height].tx_root_raw)
+        for height in range(10, 14)
+    ])
+
+if __name__ == '__main__':
+    test_block_index()
+    test_block_index_file()
+    test_block_index_file_readers()
+    test_block_index_update()
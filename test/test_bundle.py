@@ -0,0 +1,259 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+
+import io, json, mmap, os, random, tempfile
+
+from Crypto.PublicKey import RSA
+from jose import jwk
+
+import ar.bundle
+
+from ar import ANS104BundleHeader, ANS104DataItemHeader, BundleIndex, Bundle, BundleWriter, BulkSigner, DataItem, LazyDataItem
+from ar.utils import b64enc, avro
+
+def random_header(count):
+    pairs = [(random.randrange(1, 1 << 20), b64enc(os.urandom(32))) for idx in range(count)]
+    # a duplicate id resolves to its first entry
+    pairs.append((5, pairs[3][1]))
+    return ANS104BundleHeader(pairs)
+
+def test_bundle_index():
+    header = random_header(1000)
+    header_bytes = header.tobytes()
+    index = BundleIndex.fromstream(io.BytesIO(header_bytes + b'items'))
+    assert len(index) == header.get_count()
+    assert index.get_len_bytes() == header.get_len_bytes()
+    assert index.get_range_id_pairs() == header.get_range_id_pairs()
+    assert index.toheader().tobytes() == header_bytes
+    assert BundleIndex.fromheader(header).raw_ids == index.raw_ids
+    for length, id in header.length_id_pairs[::37] + header.length_id_pairs[-1:]:
+        assert id in index
+        assert index.get_range(id) == tuple(header.get_range(id))
+        assert index.get_length(id) == header.get_length(id)
+        assert index.get_offset(index.raw_id(index.find(id))) == header.get_offset(id)
+    assert index.find(b64enc(bytes(32))) is None
+    assert [b64enc(raw_id) for raw_id in index] == [id for length, id in header.length_id_pairs]
+
+    with tempfile.TemporaryFile() as file:
+        file.write(b'x' * 100 + header_bytes)
+        file.flush()
+        with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            mapped_index = BundleIndex.frombuffer(mapped, 100)
+            assert mapped_index.raw_ids == index.raw_ids
+            assert mapped_index.offsets == index.offsets
+
+    try:
+        BundleIndex.frombuffer(header_bytes[:-1])
+        assert False
+    except ValueError:
+        pass
+
+def test_bundle_header_parse():
+    header = random_header(500)
+    header_bytes = header.tobytes()
+    numpy = ar.bundle.numpy
+    try:
+        for ar.bundle.numpy in set([numpy, None]):
+            stream = io.BytesIO(header_bytes + b'items')
+            parsed = ANS104BundleHeader.fromstream(stream)
+            assert stream.read() == b'items'
+            assert parsed.get_count() == header.get_count()
+            assert parsed.tobytes() == header_bytes
+            assert parsed.get_range_id_pairs() == header.get_range_id_pairs()
+            length, id = header.length_id_pairs[200]
+            assert parsed.get_range(id) == tuple(header.get_range(id))
+            assert parsed.get_length(id) == length
+            # the pairs are built on demand and then take over
+            assert parsed.length_id_pairs == header.length_id_pairs
+            # the parsed index is kept for lookups
+            assert parsed.index is parsed.index
+            assert parsed.index.get_range(id) == parsed.get_range(id)
+            parsed.length_id_pairs.append((7, id))
+            assert parsed.get_count() == header.get_count() + 1
+            parsed.length_id_pairs = parsed.length_id_pairs
+            assert len(parsed.index) == header.get_count() + 1
+            assert header.index is header.index
+            assert ANS104BundleHeader.frombytes(header_bytes).tobytes() == header_bytes
+    finally:
+        ar.bundle.numpy = numpy
+
+def test_avro_tags():
+    tags = [
+        {'name': b'Content-Type', 'value': b'text/plain'},
+        {'name': os.urandom(200), 'value': os.urandom(3000)},
+        {'name': b'Bundle-Format', 'value': b'binary'},
+    ]
+    header = ANS104DataItemHeader(tags = tags)
+    raw_tags = header.raw_tags
+    assert raw_tags[:1] == b'\x06' and raw_tags[-1:] == b'\0'
+    assert ANS104DataItemHeader.fromstream(io.BytesIO(header.tobytes())).tags == tags
+    assert header.get_tag('Bundle-Format') == b'binary'
+    assert header.get_tag('Missing') is None
+    assert header.tags_count == 3
+
+    decoded, end = avro.decode_tags(raw_tags)
+    assert end == len(raw_tags)
+    assert [(bytes(name), bytes(value)) for name, value in decoded] == [(tag['name'], tag['value']) for tag in tags]
+    # slices share the buffer
+    assert decoded[0][0].obj is raw_tags
+
+    # a block with a negative count carries its byte size
+    blocked = bytearray()
+    avro.encode_long(-3, blocked)
+    avro.encode_long(len(raw_tags) - 2, blocked)
+    blocked += raw_tags[1:]
+    assert ANS104DataItemHeader.tagsfrombytes(bytes(blocked)) == tags
+
+    header.extra_tags_data = b'cruft'
+    assert header.tags == tags and header.extra_tags_data == b'cruft'
+    try:
+        avro.decode_tags(raw_tags[:-10])
+        assert False
+    except ValueError:
+        pass
+
+def test_lazy_dataitems():
+    items = [
+        DataItem(ANS104DataItemHeader(tags = [{'name': b'Index', 'value': str(idx).encode()}], nominal_id = os.urandom(32)), data = os.urandom(size))
+        for idx, size in enumerate([0, 1, 100000, 5])
+    ]
+    bundle_bytes = Bundle(items).tobytes()
+    stream = io.BytesIO(b'prefix' + bundle_bytes)
+    stream.seek(6)
+    lazy = Bundle.fromstream(stream, lazy = True)
+    assert stream.tell() == len(b'prefix' + bundle_bytes)
+    assert lazy.tobytes() == bundle_bytes
+    # serializing pads the unsigned owner, so compare against items read back
+    items = Bundle.frombytes(bundle_bytes).dataitems
+    for item, lazy_item in zip(items, lazy.dataitems):
+        assert isinstance(lazy_item, LazyDataItem)
+        assert lazy_item.id == item.header.nominal_id
+        assert lazy_item.tags == item.header.tags
+        assert lazy_item.get_len_bytes() == item.get_len_bytes()
+        assert lazy_item.get_raw_signature_data() == item.get_raw_signature_data()
+        view = lazy_item.open()
+        view.seek(1)
+        assert view.read(3) == item.data[1:4]
+    assert lazy.dataitems[2].data == items[2].data
+
+    tags = [{'name': b'Bundle-Format', 'value': b'binary'}]
+    stream.seek(6)
+    assert [item.data for item in DataItem.all_from_tags_stream(tags, stream, lazy = True)] == [item.data for item in items]
+
+    with tempfile.TemporaryFile() as file:
+        file.write(items[2].tobytes())
+        file.flush()
+        with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            mapped_item = LazyDataItem.frombuffer(mapped)
+            assert mapped_item.tags == items[2].header.tags
+            assert mapped_item.data == items[2].data
+            del mapped_item
+
+class Pipe:
+    '''An unseekable output.'''
+    def __init__(self):
+        self.data = bytearray()
+    def write(self, data):
+        self.data += data
+
+def test_bundle_writer():
+    items = [
+        DataItem(ANS104DataItemHeader(nominal_id = os.urandom(32)), data = os.urandom(size))
+        for size in [10, 3000000, 0]
+    ]
+    expected = Bundle(items).tobytes()
+
+    output = io.BytesIO()
+    output.write(b'prefix')
+    assert Bundle(items).tostream(output) == len(expected)
+    assert output.getvalue() == b'prefix' + expected
+
+    pipe = Pipe()
+    with BundleWriter(pipe) as writer:
+        writer.add(items[0])
+        # a header with a payload stream, or with an iterable of buffers
+        writer.extend([
+            (items[1].header, io.BytesIO(items[1].data), len(items[1].data)),
+            (items[2].header, [], 0),
+        ])
+    assert writer.size == len(expected)
+    assert bytes(pipe.data) == expected
+
+    output = io.BytesIO()
+    with BundleWriter(output, count = 3) as writer:
+        writer.extend(Bundle.fromstream(io.BytesIO(expected), lazy = True).dataitems)
+    assert output.getvalue() == expected
+
+    writer = BundleWriter(io.BytesIO(), count = 1)
+    writer.add(items[0])
+    try:
+        writer.add(items[0])
+        assert False
+    except ValueError:
+        pass
+
+def load_test_key():
+    with open(os.path.join(os.path.dirname(__file__), 'test_jwk_file.json')) as jwk_file:
+        return RSA.importKey(jwk.construct(json.load(jwk_file), algorithm = 'RS256').to_pem())
+
+def test_verify_batch():
+    key = load_test_key()
+    items = [
+        DataItem(ANS104DataItemHeader(tags = [{'name': b'Index', 'value': str(idx).encode()}]), data = os.urandom(idx * 1000))
+        for idx in range(6)
+    ]
+    for item in items:
+        item.sign(key)
+    # a bad signature, a mismatched id, and too many tags
+    items[1].header.raw_signature = bytes(512)
+    items[2].header.nominal_id = items[3].header.nominal_id
+    items[4].header.tags = [{'name': b'tag', 'value': b'value'}] * 129
+    expected = [True, False, False, True, False, True]
+    assert [item.verify() for item in items] == expected
+    assert DataItem.verify_batch(items, processes = 0) == expected
+    assert DataItem.verify_batch(items, processes = 2) == expected
+
+    with tempfile.NamedTemporaryFile() as file:
+        Bundle(items).tostream(file)
+        file.flush()
+        file.seek(0)
+        bundle = Bundle.fromstream(file, lazy = True)
+        assert bundle.dataitems[0]._verify_job()[1][0] == file.name
+        assert bundle.verify_batch(processes = 2) == expected
+
+def test_bulk_signer():
+    key = load_test_key()
+    tags = [{'name': b'Content-Type', 'value': b'text/plain'}]
+    signer = BulkSigner(key, tags = tags, anchor = b'a' * 32)
+    payloads = [os.urandom(size) for size in [0, 10, 100000]]
+    # an item can bring its own tags, target and anchor
+    payloads.append(DataItem(ANS104DataItemHeader(tags = [{'name': b'Index', 'value': b'3'}], target = os.urandom(32), anchor = b''), data = b'own'))
+    for processes in [0, 2]:
+        items = list(signer.sign_all(payloads, processes = processes, pending = 2))
+        assert [item.verify() for item in items] == [True] * len(payloads)
+        assert [bytes(item.data) for item in items[:3]] == payloads[:3]
+        assert items[0].header.tags == tags and items[0].header.raw_anchor == b'a' * 32
+        assert items[3].header.tags == [{'name': b'Index', 'value': b'3'}] and items[3].header.anchor is None
+    random_anchor = BulkSigner(key).sign(b'data')
+    assert random_anchor.verify() and len(random_anchor.header.raw_anchor) == 32
+
+if __name__ == '__main__':
+    test_bundle_index()
+    test_bundle_header_parse()
+    test_avro_tags()
+    test_lazy_dataitems()
+    test_bundle_writer()
+    test_verify_batch()
+    test_bulk_signer()
@@ -0,0 +1,63 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib, io, os, sys
+
+from ar.utils.deep_hash import deep_hash, deep_hash_chunks, Blob
+
+def recursive_deep_hash(data):
+    if type(data) == list:
+        acc = hashlib.sha384(b'list' + str(len(data)).encode()).digest()
+        for item in data:
+            acc = hashlib.sha384(acc + recursive_deep_hash(item)).digest()
+        return acc
+    tag = b'blob' + str(len(data)).encode()
+    return hashlib.sha384(hashlib.sha384(tag).digest() + hashlib.sha384(data).digest()).digest()
+
+def test_deep_hash_nested():
+    data = [b'2', b'', [[b'name', b'value'], [b'a', os.urandom(100)]], [], [[[b'deep']]], os.urandom(5000)]
+    assert deep_hash(data) == recursive_deep_hash(data)
+    assert deep_hash(data[0]) == recursive_deep_hash(data[0])
+    # a partial hash can be completed later
+    acc = deep_hash(data, partial = -2)
+    assert deep_hash_chunks(data[-2:], acc) == deep_hash(data)
+
+def test_deep_hash_long():
+    items = [str(idx).encode() for idx in range(sys.getrecursionlimit() * 4)]
+    assert deep_hash(items) == recursive_deep_hash(items)
+    nested = []
+    for idx in range(sys.getrecursionlimit() * 2):
+        nested = [nested, b'x']
+    deep_hash(nested)
+
+def test_deep_hash_streamed():
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    expected = deep_hash([b'dataitem', data])
+    stream = io.BytesIO(b'prefix' + data)
+    stream.seek(6)
+    assert deep_hash([b'dataitem', stream]) == expected
+    assert stream.tell() == 6
+    pieces = (data[offset:offset + 1000] for offset in range(0, len(data), 1000))
+    assert deep_hash([b'dataitem', Blob(pieces, len(data))]) == expected
+    try:
+        deep_hash(Blob(iter([data[:10]]), len(data)))
+        assert False
+    except ValueError:
+        pass
+
+if __name__ == '__main__':
+    test_deep_hash_nested()
+    test_deep_hash_long()
+    test_deep_hash_streamed()
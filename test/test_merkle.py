@@ -0,0 +1,140 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib, io, os
+
+from ar.utils.merkle import (
+    MerkleBuilder, ChunkSpool, Chunk, CHUNK_SIZE,
+    generate_leaves, build_layers, generate_proofs, generate_transaction_chunks,
+    compute_root_hash, compute_chunk_tree_root, validate_path,
+)
+
+def layered_tree(chunk_count):
+    chunks = []
+    for idx in range(chunk_count):
+        size = CHUNK_SIZE if idx < chunk_count - 1 else 1234
+        start = chunks[-1].max_byte_range if chunks else 0
+        chunks.append(Chunk(hashlib.sha256(bytes([idx % 256, idx // 256])).digest(), size, start, start + size))
+    return chunks, build_layers(generate_leaves(chunks))
+
+def test_builder_matches_layers():
+    for chunk_count in range(1, 70):
+        chunks, root = layered_tree(chunk_count)
+        proofs = generate_proofs(root)
+
+        streaming = MerkleBuilder()
+        indexed = MerkleBuilder(keep_proofs = True)
+        for chunk in chunks:
+            streaming.add_chunk_hash(chunk.data_hash, chunk.data_size)
+            indexed.add_chunk_hash(chunk.data_hash, chunk.data_size)
+
+        assert streaming.root == root.id_raw
+        assert indexed.root == root.id_raw
+        assert len(streaming._pending) <= chunk_count.bit_length()
+        for index, proof in enumerate(proofs):
+            built = indexed.proof(index)
+            assert built.offset == proof.offset
+            assert built.proof == proof.proof
+            chunk = chunks[index]
+            assert validate_path(root.id_raw, chunk.min_byte_range, 0, chunk.max_byte_range if index == chunk_count - 1 else chunks[-1].max_byte_range, built.proof)
+
+def test_builder_data():
+    data = os.urandom(CHUNK_SIZE * 3 + 5)
+    expected = generate_transaction_chunks(io.BytesIO(data))
+
+    builder = MerkleBuilder()
+    # uneven pieces are rechunked
+    for offset in range(0, len(data), 100000):
+        builder.update(data[offset:offset + 100000])
+    assert builder.root == compute_root_hash(io.BytesIO(data))
+
+    assert compute_root_hash(io.BytesIO(data), workers = 3) == builder.root
+    assert generate_transaction_chunks(io.BytesIO(data), workers = 2)['data_root'] == expected['data_root']
+
+    builder = MerkleBuilder(keep_proofs = True)
+    builder.update_from_file(iter([data[:7], data[7:]]))
+    assert [proof.proof for proof in builder.proofs()] == [proof.proof for proof in expected['proofs']]
+    assert [chunk.max_byte_range for chunk in builder.chunks()] == [chunk.max_byte_range for chunk in expected['chunks']]
+
+def test_chunk_tree_root():
+    # as ar_tx:chunk_binary splits data: no data is one empty chunk, whose
+    # leaf is hash(hash(sha256(<<>>)), hash(offset 0))
+    sha256 = lambda data: hashlib.sha256(data).digest()
+    assert compute_chunk_tree_root(b'') == sha256(sha256(sha256(b'')) + sha256(bytes(32)))
+
+    # a whole number of chunks is followed by an empty one at the same end
+    data = os.urandom(CHUNK_SIZE * 2)
+    chunks = [
+        Chunk(sha256(data[:CHUNK_SIZE]), CHUNK_SIZE, 0, CHUNK_SIZE),
+        Chunk(sha256(data[CHUNK_SIZE:]), CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE * 2),
+        Chunk(sha256(b''), 0, CHUNK_SIZE * 2, CHUNK_SIZE * 2),
+    ]
+    assert compute_chunk_tree_root(data) == build_layers(generate_leaves(chunks)).id_raw
+    assert compute_chunk_tree_root(data) != compute_root_hash(io.BytesIO(data))
+
+    # otherwise the last chunk is the remainder, not rebalanced
+    data = os.urandom(CHUNK_SIZE + 5)
+    chunks = [
+        Chunk(sha256(data[:CHUNK_SIZE]), CHUNK_SIZE, 0, CHUNK_SIZE),
+        Chunk(sha256(data[CHUNK_SIZE:]), 5, CHUNK_SIZE, CHUNK_SIZE + 5),
+    ]
+    assert compute_chunk_tree_root(data) == build_layers(generate_leaves(chunks)).id_raw
+
+def test_chunk_spool():
+    data = os.urandom(CHUNK_SIZE * 4 + 77)
+    expected = generate_transaction_chunks(io.BytesIO(data))
+
+    # a generator cannot be read twice, so it is kept, spilling past one chunk
+    with ChunkSpool(memory_bytes = CHUNK_SIZE) as spool:
+        spool.update_from_file(data[offset:offset + 65536] for offset in range(0, len(data), 65536))
+        chunks = spool.transaction_chunks()
+        assert chunks['data_root'] == expected['data_root']
+        assert len(chunks['proofs']) == len(expected['proofs'])
+        assert [proof.proof for proof in chunks['proofs']] == [proof.proof for proof in expected['proofs']]
+        assert chunks['proofs'][-1].offset == len(data) - 1
+        for chunk in chunks['chunks']:
+            assert spool.read(chunk.min_byte_range, chunk.data_size) == data[chunk.min_byte_range:chunk.max_byte_range]
+
+class CountingFile(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+    def read(self, size = -1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+def test_chunk_spool_seekable():
+    data = os.urandom(CHUNK_SIZE * 4 + 77)
+    expected = generate_transaction_chunks(io.BytesIO(data))
+
+    # a seekable file is hashed once and its chunks read back from it, from
+    # where it was when passed, without a copy
+    source = CountingFile(b'head' + data)
+    source.read(4)
+    with ChunkSpool() as spool:
+        spool.update_from_file(source)
+        chunks = spool.transaction_chunks()
+        assert chunks['data_root'] == expected['data_root']
+        for chunk in chunks['chunks']:
+            assert spool.read(chunk.min_byte_range, chunk.data_size) == data[chunk.min_byte_range:chunk.max_byte_range]
+        assert source.bytes_read == 4 + len(data) * 2
+        assert spool.file.tell() == 0
+
+if __name__ == '__main__':
+    test_builder_matches_layers()
+    test_builder_data()
+    test_chunk_tree_root()
+    test_chunk_spool()
+    test_chunk_spool_seekable()
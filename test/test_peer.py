@@ -0,0 +1,420 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio, hashlib, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+import pytest
+
+from ar import Peer, Block, TxHeader, ArweaveException, ArweaveNetworkException, CHECKPOINT_DEPTH, FORK_2_0
+from ar._block_testdata2 import BLOCK_1904186_bytes
+from ar.multipeer import StripedChunkFetcher
+from ar.utils import arbinenc
+from ar.utils.cache import ResponseCache
+from ar.utils.merkle import hash_raw, int_to_buffer
+from ar.utils.ratelimit import RateLimiter, SlidingWindowLimiter, TokenBucketLimiter
+
+# a tiny local node so the client code can be exercised offline
+
+ROUTES = {
+    '/info': (200, 'application/json', json.dumps({'height': 5, 'current': 'abc'}).encode()),
+    '/height': (200, 'text/plain', b'5'),
+    '/tx/abc/offset': (200, 'application/json', json.dumps({'offset': '1000', 'size': '10'}).encode()),
+    '/chunk2/1000': (200, 'application/octet-stream', b'\x00\x00\x04data'),
+    '/missing': (404, 'text/plain', b'Not Found.'),
+    '/tx': (200, 'text/plain', b'OK'),
+    '/chunk': (200, 'text/plain', b'OK'),
+}
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # HTTPClient sends the whole url in the request line
+        path = urlsplit(self.path).path
+        self.server.requests.append(path)
+        if self.headers['Content-Length']:
+            # block2 takes its tx indices as a GET body
+            self.server.get_bodies.append((path, self.rfile.read(int(self.headers['Content-Length']))))
+        if path == '/slow':
+            time.sleep(0.25)
+        if path == '/limited' and self.server.requests.count(path) < 3:
+            status, content_type, body = 429, 'text/plain', b'Too Many Requests'
+        else:
+            routes = self.server.routes
+            status, content_type, body = routes.get(path, routes['/missing'])
+            if path in ('/limited', '/slow'):
+                status, content_type, body = routes['/height']
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(path)
+        self.server.posts.append((path, json.loads(body)))
+        routes = self.server.routes
+        status, content_type, body = routes.get(path, routes['/missing'])
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *params):
+        pass
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    server.posts = []
+    server.get_bodies = []
+    server.routes = dict(ROUTES)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+@pytest.fixture
+def server():
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+def test_peer(server):
+    peer = Peer(url(server), retries = 0, requests_per_period = None)
+    assert peer.info()['height'] == 5
+    assert peer.height() == 5
+    assert peer.tx_offset('abc') == {'offset': 1000, 'size': 10}
+    assert peer.chunk2(1000) == b'\x00\x00\x04data'
+    with pytest.raises(ArweaveNetworkException):
+        peer._get('missing')
+
+def test_peer_ratelimited(server):
+    peer = Peer(url(server), retries = 0, requests_per_period = None)
+    assert int(peer._get('limited').text) == 5
+    assert server.requests.count('/limited') == 3
+
+def test_peer_token_bucket(server):
+    limiter = TokenBucketLimiter(600, 60, burst = 2)
+    peer = Peer(url(server), retries = 0, limiter = limiter)
+    assert int(peer._get('limited').text) == 5
+    state = peer.ratelimit_state()
+    assert state['kind'] == 'token_bucket'
+    assert state['rate_per_sec'] < state['max_rate_per_sec']
+
+def test_peer_coalesce_gets(server):
+    peer = Peer(url(server), retries = 0, requests_per_period = None, coalesce_gets = True)
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda idx: peer._get('slow'), range(8)))
+    assert [response.text for response in responses] == ['5'] * 8
+    assert server.requests.count('/slow') == 1
+    # different headers are different requests
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda packing: peer.chunk2(1000, packing), ['unpacked', 'any']))
+    assert server.requests.count('/chunk2/1000') == 2
+
+def chunk2_bytes(data):
+    # a chunk2 reply for a block holding one tx of one chunk
+    note = int_to_buffer(len(data))
+    data_path = hash_raw(data) + note
+    tx_path = hash_raw([hash_raw(hash_raw(data)), hash_raw(note)]) + note
+    return arbinenc(data, 24) + arbinenc(tx_path, 24) + arbinenc(data_path, 24) + arbinenc(b'unpacked', 8)
+
+def test_peer_cache(server, tmp_path):
+    height = 1904186
+    chunk = chunk2_bytes(b'data' * 100)
+    server.routes['/height'] = (200, 'text/plain', str(height + CHECKPOINT_DEPTH).encode())
+    server.routes[f'/block2/height/{height}'] = (200, 'application/octet-stream', BLOCK_1904186_bytes)
+    server.routes[f'/block2/height/{height + 1}'] = (200, 'application/octet-stream', b'recent block')
+    server.routes['/chunk2/1000'] = (200, 'application/octet-stream', chunk)
+
+    peer = Peer(url(server), retries = 0, requests_per_period = None, cache = ResponseCache(tmp_path))
+    for repeat in range(2):
+        assert peer.block2_height(height) == BLOCK_1904186_bytes
+        assert peer.tx_offset('abc') == {'offset': 1000, 'size': 10}
+        assert peer.chunk2(1000) == chunk
+        assert peer.block2_height(height + 1) == b'recent block'
+    assert server.requests.count('/chunk2/1000') == 1
+    assert server.requests.count(f'/block2/height/{height + 1}') == 2
+    # an offset cannot be checked against the txid, so it is not kept
+    assert server.requests.count('/tx/abc/offset') == 2
+
+    # a new process reads the disk tier
+    server.requests.clear()
+    peer = Peer(url(server), retries = 0, requests_per_period = None, cache = ResponseCache(tmp_path, memory_bytes = 0))
+    assert peer.block2_height(height) == BLOCK_1904186_bytes
+    assert peer.chunk2(1000) == chunk
+    assert server.requests == []
+
+def test_peer_cache_deep_checks(server, tmp_path):
+    height = 1904186
+    server.routes['/height'] = (200, 'text/plain', str(height + CHECKPOINT_DEPTH).encode())
+    server.routes[f'/block2/height/{height}'] = (200, 'application/octet-stream', BLOCK_1904186_bytes)
+    # a block from another height, and a chunk whose proof does not hold
+    server.routes[f'/block2/height/{height - 1}'] = (200, 'application/octet-stream', BLOCK_1904186_bytes)
+    chunk = chunk2_bytes(b'data' * 100)
+    forged = arbinenc(b'atad' * 100, 24) + chunk[3 + 400:]
+    server.routes['/chunk2/900'] = (200, 'application/octet-stream', forged)
+
+    peer = Peer(url(server), retries = 0, requests_per_period = None, cache = ResponseCache(tmp_path))
+    for repeat in range(2):
+        peer.block2_height(height - 1)
+        peer.chunk2(900)
+    assert server.requests.count(f'/block2/height/{height - 1}') == 2
+    assert server.requests.count('/chunk2/900') == 2
+
+def test_peer_cache_checks(server, tmp_path):
+    block = Block.frombytes(BLOCK_1904186_bytes)
+    tx, other = fake_tx(1), fake_tx(2)
+    server.routes['/block2/hash/' + block.indep_hash] = (200, 'application/octet-stream', BLOCK_1904186_bytes)
+    server.routes['/block2/hash/' + block.previous_block] = (200, 'application/octet-stream', BLOCK_1904186_bytes)
+    server.routes['/tx2/' + tx.id] = (200, 'application/octet-stream', tx.tobytes())
+    server.routes['/tx2/' + other.id] = (200, 'application/octet-stream', tx.tobytes())
+    server.routes['/tx2/pending'] = (202, 'text/plain', b'Pending')
+
+    peer = Peer(url(server), retries = 0, requests_per_period = None, cache = ResponseCache(tmp_path))
+    for repeat in range(2):
+        peer.block2_hash(block.indep_hash)
+        peer.block2_hash(block.previous_block)
+        peer.tx2(tx.id)
+        peer.tx2(other.id)
+        peer.tx2('pending')
+    # only replies that are what was asked for are kept
+    assert server.requests.count('/block2/hash/' + block.indep_hash) == 1
+    assert server.requests.count('/tx2/' + tx.id) == 1
+    assert server.requests.count('/block2/hash/' + block.previous_block) == 2
+    assert server.requests.count('/tx2/' + other.id) == 2
+    assert server.requests.count('/tx2/pending') == 2
+
+def test_chunk_uploader(server, tmp_path):
+    import io, os
+    from ar import Transaction, DATA_CHUNK_SIZE
+    from ar.utils.transaction_uploader import ChunkUploader, UploadJournal, TransactionUploaderException
+
+    data = os.urandom(DATA_CHUNK_SIZE * 5 + 1234)
+    tx = Transaction(file_handler = io.BytesIO(data), owner = 'owner', last_tx = 'anchor', reward = 1)
+    other = start_server()
+    try:
+        peers = [Peer(url(server), retries = 0, requests_per_period = None), Peer(url(other), retries = 0, requests_per_period = None)]
+        journal_path = str(tmp_path / 'journal')
+        states = []
+        with UploadJournal(journal_path) as journal:
+            state = ChunkUploader(tx, peers, journal, window = 3, progress = states.append).upload()
+        assert state['chunks_acked'] == 6 * 2
+        assert state['bytes_sent'] == len(data) * 2
+        assert len(states) == 12
+        for node in (server, other):
+            chunks = [body for path, body in node.posts if path == '/chunk']
+            assert sorted(int(chunk['offset']) for chunk in chunks) == [proof.offset for proof in tx.chunks['proofs']]
+            assert node.requests.count('/tx') == 1
+
+        # resuming sends only what was not acknowledged
+        server.posts.clear()
+        other.posts.clear()
+        with open(journal_path) as journal:
+            lines = journal.readlines()
+        with open(journal_path, 'w') as journal:
+            journal.writelines(lines[:-1] + ['{"torn'])
+        state = ChunkUploader(tx, peers, journal_path).upload()
+        assert state['chunks_acked'] == 1
+        assert state['chunks_skipped'] == 11
+        assert len(server.posts + other.posts) == 1
+        assert ChunkUploader(tx, peers, journal_path).upload()['chunks_skipped'] == 12
+
+        # a chunk another peer took is not a failed upload, but one that
+        # reached no peer is
+        server.routes['/chunk'] = (400, 'application/json', b'{"error":"timeout"}')
+        state = ChunkUploader(tx, peers, retries = 1, post_tx = False).upload()
+        assert state['failures'] == {peers[0].api_url: 6}
+        with pytest.raises(TransactionUploaderException):
+            ChunkUploader(tx, peers[:1], retries = 1, post_tx = False).upload()
+
+        # fatal replies are not retried
+        server.routes['/chunk'] = (400, 'application/json', b'{"error":"invalid_proof"}')
+        with pytest.raises(TransactionUploaderException):
+            ChunkUploader(tx, peers[:1], post_tx = False).upload()
+    finally:
+        other.shutdown()
+        other.server_close()
+
+def fake_tx(idx):
+    signature = b'signature %d' % idx
+    return TxHeader(
+        2, hashlib.sha256(signature).digest(), b'', b'', b'', b'',
+        (idx * 1000).to_bytes(8, 'big'), hashlib.sha256(b'root %d' % idx).digest(),
+        signature, b'', b'', ((b'index', str(idx).encode()),)
+    )
+
+def test_fetch_full_block():
+    txs = [fake_tx(idx) for idx in range(6)]
+    block = Block.frombytes(BLOCK_1904186_bytes)
+    block.txs = list(txs)
+    block.tx_root_raw = block.compute_tx_root_raw()
+    # the node had only the even txs cached
+    block.txs = [tx if idx % 2 == 0 else tx.id for idx, tx in enumerate(txs)]
+    block.indep_hash_raw = block.compute_indep_hash_raw()
+    servers = [start_server() for idx in range(2)]
+    try:
+        for server in servers:
+            server.routes['/block2/height/1904186'] = (200, 'application/octet-stream', block.tobytes())
+            server.routes['/block2/hash/' + block.indep_hash] = server.routes['/block2/height/1904186']
+            for tx in txs[1::2]:
+                server.routes['/tx2/' + tx.id] = (200, 'application/octet-stream', tx.tobytes())
+        peers = [Peer(url(server), retries = 0, requests_per_period = None) for server in servers]
+
+        full = peers[0].fetch_full_block(1904186)
+        assert [tx.tobytes() for tx in full.txs] == [tx.tobytes() for tx in txs]
+        assert servers[0].get_bodies == [('/block2/height/1904186', b'\xff' * 125)]
+        assert sorted(servers[0].requests[1:]) == sorted('/tx2/' + tx.id for tx in txs[1::2])
+
+        # the missing txs are spread across the peers
+        fetcher = StripedChunkFetcher(peers)
+        full = fetcher.fetch_full_block(block.indep_hash, workers = 3)
+        assert [tx.id for tx in full.txs] == [tx.id for tx in txs]
+        assert sum(len(server.requests) for server in servers) == 4 + 1 + 3
+
+        # a block at another height is refused
+        servers[0].routes['/block2/height/5'] = servers[0].routes['/block2/height/1904186']
+        with pytest.raises(ArweaveException):
+            peers[0].fetch_full_block(5)
+
+        # a tx with its id but other data is refused by the tx_root
+        tampered = fake_tx(1)
+        tampered.data_root_raw = hashlib.sha256(b'other root').digest()
+        assert tampered.compute_id_raw() == tampered.id_raw
+        servers[0].routes['/tx2/' + txs[1].id] = (200, 'application/octet-stream', tampered.tobytes())
+        with pytest.raises(ArweaveException):
+            peers[0].fetch_full_block(1904186)
+
+        # a tx that is not the one asked for is refused
+        servers[0].routes['/tx2/' + txs[1].id] = servers[0].routes['/tx2/' + txs[3].id]
+        with pytest.raises(ArweaveException):
+            peers[0].fetch_full_block(1904186)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+def test_fetch_full_block_before_2_0(server):
+    # blocks before FORK_2_0 have no tx_root to check the txs against
+    tx = fake_tx(1)
+    block = Block.frombytes(BLOCK_1904186_bytes)
+    block.height = FORK_2_0 - 1
+    block.tx_root_raw = b''
+    block.txs = [tx.id]
+    server.routes['/block2/height/%d' % block.height] = (200, 'application/octet-stream', block.tobytes())
+    server.routes['/tx2/' + tx.id] = (200, 'application/octet-stream', tx.tobytes())
+    peer = Peer(url(server), retries = 0, requests_per_period = None)
+    full = peer.fetch_full_block(block.height)
+    assert [full_tx.tobytes() for full_tx in full.txs] == [tx.tobytes()]
+
+def test_response_cache_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, memory_bytes = 10, disk_bytes = 20)
+    for idx in range(4):
+        cache.put('chunk2', idx, bytes([idx]) * 8)
+    assert cache.state()['memory_entries'] == 1
+    assert cache.state()['disk_entries'] == 2
+    assert cache.get('chunk2', 0) is None
+    assert cache.get('chunk2', 2) == bytes([2]) * 8
+    assert ResponseCache(tmp_path, disk_bytes = 20).get('chunk2', 3) == bytes([3]) * 8
+
+def test_response_cache_tmp_files(tmp_path):
+    # a put in progress in another process is left alone; a stale one is removed
+    (tmp_path / 'ab').mkdir()
+    writing, stale = tmp_path / 'ab' / 'writing.tmp', tmp_path / 'ab' / 'stale.tmp'
+    writing.write_bytes(b'part')
+    stale.write_bytes(b'part')
+    old = time.time() - ResponseCache.STALE_TMP_SEC - 1
+    os.utime(stale, (old, old))
+    cache = ResponseCache(tmp_path)
+    assert writing.exists() and not stale.exists()
+    assert cache.state()['disk_entries'] == 0
+
+def test_sliding_window_limiter():
+    limiter = SlidingWindowLimiter(3, 60)
+    assert [limiter.try_acquire() for idx in range(3)] == [None, None, None]
+    wait = limiter.try_acquire()
+    assert 59 < wait <= 60
+    assert limiter.ratelimited()
+    limiter.release(False)
+    assert limiter.state()['requests_per_period'] == 2
+    assert limiter.state()['available'] == 0
+
+def test_token_bucket_limiter():
+    limiter = TokenBucketLimiter(60, 60, burst = 2)
+    assert limiter.try_acquire() is None
+    assert limiter.try_acquire() is None
+    assert 0 < limiter.try_acquire() <= 1
+    limiter.release(False)
+    assert limiter.state()['rate_per_sec'] == 0.5
+    for idx in range(4):
+        limiter.release(True)
+    assert limiter.state()['rate_per_sec'] == 1
+
+def test_peer_set_rate():
+    with pytest.raises(TypeError):
+        RateLimiter(1, 1)
+    peer = Peer('127.0.0.1:1', requests_per_period = None)
+    assert peer.limiter is None and peer.period_sec == 60
+    peer.requests_per_period = 2
+    assert isinstance(peer.limiter, SlidingWindowLimiter)
+    assert (peer.requests_per_period, peer.period_sec) == (2, 60)
+    peer.period_sec = 10
+    assert peer.limiter.state()['period_sec'] == 10
+    peer.requests_per_period = None
+    assert peer.limiter is None and not peer.ratelimited()
+
+    peer = Peer('127.0.0.1:1', limiter = TokenBucketLimiter(60, 60))
+    peer.requests_per_period = 120
+    assert peer.limiter.state()['max_rate_per_sec'] == 2
+    assert peer.limiter.state()['capacity'] == 120
+
+def test_async_peer(server):
+    pytest.importorskip('aiohttp')
+    from ar.asyncpeer import AsyncPeer
+    async def run():
+        async with AsyncPeer(url(server), retries = 0, requests_per_period = None) as peer:
+            info, height, offset, chunk = await asyncio.gather(
+                peer.info(),
+                peer.height(),
+                peer.tx_offset('abc'),
+                peer.chunk2(1000),
+            )
+            assert info['height'] == 5
+            assert height == 5
+            assert offset == {'offset': 1000, 'size': 10}
+            assert chunk == b'\x00\x00\x04data'
+            with pytest.raises(ArweaveNetworkException):
+                await peer._get('missing')
+            assert int((await peer._get('limited')).text) == 5
+    asyncio.run(run())
+    assert server.requests.count('/limited') == 3
+
+def test_async_peer_coalesce_gets(server):
+    pytest.importorskip('aiohttp')
+    from ar.asyncpeer import AsyncPeer
+    async def run():
+        async with AsyncPeer(url(server), retries = 0, requests_per_period = None, coalesce_gets = True) as peer:
+            heights = await asyncio.gather(*[peer._get('slow') for idx in range(8)])
+            assert [height.text for height in heights] == ['5'] * 8
+    asyncio.run(run())
+    assert server.requests.count('/slow') == 1
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,145 @@
+# This file is part of PyArweave.
+#
+# PyArweave is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 2 of the License, or (at your option) any later
+# version.
+#
+# PyArweave is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PyArweave. If not, see <https://www.gnu.org/licenses/>.
+
+import io, os, threading, time
+
+from ar import PeerStream, Chunk, DATA_CHUNK_SIZE
+from ar.multipeer import StripedChunkFetcher
+from ar.utils import arbinenc, b64dec
+from ar.utils.merkle import generate_transaction_chunks, hash_raw, int_to_buffer
+
+TX_START = 1000000
+
+class FakeWeave:
+    '''Serves chunk2 replies for a single transaction starting at TX_START.'''
+    def __init__(self, data):
+        self.data = data
+        result = generate_transaction_chunks(io.BytesIO(data))
+        self.data_root = b64dec(result['data_root'])
+        note = int_to_buffer(len(data))
+        tx_path = self.data_root + note
+        self.tx_root = hash_raw([hash_raw(self.data_root), hash_raw(note)])
+        self.chunks = [
+            (chunk.min_byte_range, chunk.max_byte_range, b''.join((
+                arbinenc(data[chunk.min_byte_range:chunk.max_byte_range], 24),
+                arbinenc(tx_path, 24),
+                arbinenc(proof.proof, 24),
+                arbinenc(b'unpacked', 8),
+            )))
+            for chunk, proof in zip(result['chunks'], result['proofs'])
+        ]
+        self.requests = []
+        self.lock = threading.Lock()
+    def chunk2(self, offset):
+        offset -= TX_START
+        with self.lock:
+            self.requests.append(offset)
+        for first, end, chunk_bytes in self.chunks:
+            if first <= offset < end:
+                return chunk_bytes
+        raise KeyError(offset)
+    def stream(self, **kwparams):
+        return PeerStream(self.chunk2, TX_START, 0, len(self.data), self.tx_root, self.data_root, **kwparams)
+
+def read_exactly(stream, size):
+    data = b''
+    while len(data) < size:
+        part = stream.read(size - len(data))
+        if not part:
+            break
+        data += part
+    return data
+
+def test_stream_read():
+    weave = FakeWeave(os.urandom(DATA_CHUNK_SIZE * 5 + 1234))
+    with weave.stream() as stream:
+        assert stream.read() == weave.data
+    assert len(weave.requests) == len(weave.chunks)
+
+def test_stream_readahead():
+    weave = FakeWeave(os.urandom(DATA_CHUNK_SIZE * 9 + 1234))
+    with weave.stream(readahead = 4) as stream:
+        assert stream.read(100) == weave.data[:100]
+        assert read_exactly(stream, len(weave.data)) == weave.data[100:]
+        assert stream.window == 4
+        # every chunk was fetched once
+        assert sorted(weave.requests) == [first for first, end, chunk_bytes in weave.chunks]
+
+        # seeking shrinks the window and drops the readahead
+        stream.seek(DATA_CHUNK_SIZE * 2 + 5)
+        assert stream.read(10) == weave.data[DATA_CHUNK_SIZE * 2 + 5 : DATA_CHUNK_SIZE * 2 + 15]
+        assert stream.window == 1
+        stream.seek(7)
+        assert read_exactly(stream, DATA_CHUNK_SIZE * 3) == weave.data[7 : DATA_CHUNK_SIZE * 3 + 7]
+
+class FakePeer:
+    def __init__(self, weave, api_url, delay = 0, broken = False, held = None):
+        self.weave = weave
+        self.api_url = api_url
+        self.delay = delay
+        self.broken = broken
+        self.held = held
+        self.served = 0
+    def has_range(self, first, last):
+        return self.held is None or self.held[0] <= first - TX_START and last - TX_START < self.held[1]
+    def chunk2(self, offset):
+        time.sleep(self.delay)
+        if self.broken:
+            raise ConnectionError(self.api_url)
+        self.served += 1
+        return self.weave.chunk2(offset)
+
+def test_striped_stream():
+    weave = FakeWeave(os.urandom(DATA_CHUNK_SIZE * 16 + 1234))
+    fast = FakePeer(weave, 'fast', delay = 0.001)
+    slow = FakePeer(weave, 'slow', delay = 0.02)
+    broken = FakePeer(weave, 'broken', broken = True)
+    partial = FakePeer(weave, 'partial', held = (DATA_CHUNK_SIZE * 8, len(weave.data)))
+    fetcher = StripedChunkFetcher([broken, slow, fast, partial])
+    stream = PeerStream(fetcher.chunk2, TX_START, 0, len(weave.data), weave.tx_root, weave.data_root, readahead = 8)
+    assert read_exactly(stream, len(weave.data)) == weave.data
+    stream.close()
+    # the load followed the throughput, the broken peer was retried around,
+    # and the partial peer was only asked for what it holds
+    assert fast.served > slow.served
+    assert partial.served > 0
+    assert fast.served + slow.served + partial.served == len(set(weave.requests))
+    assert fetcher.state()['broken']['failures'] > 0
+
+class CorruptPeer(FakePeer):
+    def chunk2(self, offset):
+        chunk_bytes = super().chunk2(offset)
+        return chunk_bytes[:3] + bytes([chunk_bytes[3] ^ 1]) + chunk_bytes[4:]
+
+def test_striped_stream_validated(monkeypatch):
+    weave = FakeWeave(os.urandom(DATA_CHUNK_SIZE * 6 + 1234))
+    corrupt = CorruptPeer(weave, 'corrupt')
+    good = FakePeer(weave, 'good', delay = 0.01)
+    parsed = []
+    frombytes = Chunk.frombytes
+    monkeypatch.setattr(Chunk, 'frombytes', lambda *params, **kwparams: parsed.append(1) or frombytes(*params, **kwparams))
+    fetcher = StripedChunkFetcher([corrupt, good])
+    stream = PeerStream(fetcher.chunk2, TX_START, 0, len(weave.data), weave.tx_root, weave.data_root, readahead = 4)
+    fetcher.validate = lambda chunk_bytes: Chunk.frombytes(chunk_bytes, stream.tx_root_raw, stream.data_root_raw)
+    assert read_exactly(stream, len(weave.data)) == weave.data
+    stream.close()
+    # corrupt chunks were retried on the good peer, and each was parsed
+    # once per reply rather than again by the stream
+    assert good.served == len(weave.chunks)
+    assert len(parsed) == corrupt.served + good.served
+
+if __name__ == '__main__':
+    test_stream_read()
+    test_stream_readahead()
+    test_striped_stream()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+# times decoding a block and computing its indep_hash
+#   python3 -m toys.bench_block [count]
+
+import sys, time
+
+from ar import Block
+from ar._block_testdata2 import BLOCK_1904186_bytes
+
+def main(count = 1000):
+    count = int(count)
+    start = time.perf_counter()
+    for idx in range(count):
+        Block.frombytes(BLOCK_1904186_bytes)
+    decode = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for idx in range(count):
+        block = Block.frombytes(BLOCK_1904186_bytes)
+        assert block.compute_indep_hash_raw() == block.indep_hash_raw
+    both = (time.perf_counter() - start) / count
+    block = Block.frombytes(BLOCK_1904186_bytes)
+    start = time.perf_counter()
+    for idx in range(count):
+        block.tojson()
+    tojson = (time.perf_counter() - start) / count
+    print(f'frombytes                        {decode * 1e6:8.1f} us')
+    print(f'frombytes + compute_indep_hash   {both * 1e6:8.1f} us')
+    print(f'tojson                           {tojson * 1e6:8.1f} us')
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
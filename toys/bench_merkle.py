@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# times data_root computation with differing numbers of hashing threads
+#   python3 -m toys.bench_merkle [path] [workers ...]
+# with no path, a temporary 256 MiB file of random data is used.
+
+import os, sys, tempfile, time
+
+from ar.utils.merkle import compute_root_hash
+
+def bench(path, workers):
+    with open(path, 'rb') as file_handler:
+        start = time.perf_counter()
+        root = compute_root_hash(file_handler, workers=workers)
+        return time.perf_counter() - start, root
+
+def main(path = None, *worker_counts):
+    worker_counts = [int(workers) for workers in worker_counts] or [0, 2, 4, os.cpu_count()]
+    tmp = None
+    if path is None:
+        tmp = tempfile.NamedTemporaryFile()
+        for idx in range(256):
+            tmp.write(os.urandom(1024 * 1024))
+        tmp.flush()
+        path = tmp.name
+    size = os.path.getsize(path)
+    # warm the page cache so disk speed does not count
+    bench(path, None)
+    baseline = None
+    roots = set()
+    for workers in worker_counts:
+        duration, root = bench(path, workers or None)
+        roots.add(root)
+        baseline = baseline or duration
+        print(f'workers={workers or 0:<3} {duration:8.3f}s {size / duration / 1024 / 1024:8.1f} MiB/s {baseline / duration:5.2f}x')
+    assert len(roots) == 1
+    if tmp is not None:
+        tmp.close()
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
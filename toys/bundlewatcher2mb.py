@@ -91,9 +91,11 @@ class BundleWatcher2MB:
                 height = blk.height,
                 previous = blk.previous_block,
             )
+            # one request for the block's txs, rather than one per tx
+            txs = {tx.id: tx for tx in self._peer().fetch_full_block(blk.indep_hash).txs}
             for txid in blk.txs[::step]:
                 self._fsck(self._minheight, self._maxheight, self._blocks, self._blocks)
-                tx = self._fetch_txid(txid)
+                tx = txs[txid]
                 self._fsck(self._minheight, self._maxheight, self._blocks, self._blocks)
                 response_data_type = [
                     tag['value']
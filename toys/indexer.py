@@ -913,14 +913,17 @@ class BundleIndexer:
         assert block.indep_hash not in self.debug_blocks
         self.debug_blocks.add(block.indep_hash)
 
-        # fetch missing tx tags
+        # fetch missing tx tags; block2 sends the txs it has in full as
+        # TxHeaders, and the rest as ids
         ar.logger.info(f'{block.indep_hash}: fetching txs_tags')
         txs_tags = WorkerPool(
-            action = lambda tx: tx.tags if type(tx) is ar.Transaction else loader.tags(tx),
+            action = lambda tx: loader.tags(tx) if type(tx) is str else tx.tags,
             max_jobs = 32,#loader.gateway.max_outgoing_connections,
         ).process(block.txs)
 
         for idx, (tx_tags, tx) in enumerate(zip(txs_tags, block.txs)):
+            if type(tx) is not str:
+                tx = tx.id
             if type(tx_tags) is str:
                 import pdb; pdb.set_trace()
             if not get_tags(tx_tags, b'Bundle-Format'):